@@ -1,45 +1,186 @@
+"""
+Builds each character's sprite sheet from its animation folders.
+
+Source frames are hashed, and characters whose frames have not changed
+since the last build are skipped; within a changed character, rows of
+unchanged animations are copied from the existing sheet instead of being
+decoded again. Changed frames are decoded in a process pool. Every frame
+of a character must have the same size. The frame count of each animation
+is written back into the character manifest (../characters.json), which is
+where the game reads it from, and each sheet is written to the manifest's
+"sheet" path. The sheet rows follow characters.ACTION_NAMES, so the
+manifest has to load: a new character needs an animations table, whose
+counts are then filled in here.
+
+    python combine_sprite_sheet.py           # Rebuild what changed
+    python combine_sprite_sheet.py --force   # Rebuild everything
+"""
+
 from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
 import os
+import re
+import sys
 
 # Base path (directory where this script is located)
 base_path = os.path.dirname(os.path.abspath(__file__))
+assets_path = os.path.dirname(base_path)  # Manifest "sheet" paths are relative to it
+manifest_path = os.path.join(assets_path, "characters.json")
+cache_path = os.path.join(base_path, ".sprite_sheet_cache.json")  # Source hashes of the last build
+
+# Animation folder order: the sprite sheet rows the game reads
+sys.path.insert(0, os.path.dirname(assets_path))
+from characters import ACTION_NAMES
 
-# List of character folders
-character_folders = ["zippy", "flash"]
+class BuildError(Exception):
+    """Raised when source frames are missing or inconsistent"""
 
-# Animation folder order
-animation_order = ["idle", "run", "jump", "attack1", "attack2", "take_hit", "dead"]
+def natural_key(name):
+    """Sort image_2.png before image_10.png"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
 
-for character in character_folders:
-    animation_base_folder = os.path.join(base_path, character)
-    output_path = os.path.join(base_path, f"{character}/{character}.png")
+def frame_files(character):
+    """Return the frame paths of each animation, in sheet row order"""
+    files = []
+    for anim in ACTION_NAMES:
+        folder_path = os.path.join(base_path, character, anim)
+        if not os.path.isdir(folder_path):
+            raise BuildError(f"{character}: missing animation folder {anim}")
+        image_files = sorted((f for f in os.listdir(folder_path) if f.endswith(('.png', '.jpg'))), key=natural_key)
+        if not image_files:
+            raise BuildError(f"{character}: animation {anim} has no frames")
+        files.append([os.path.join(folder_path, f) for f in image_files])
+    return files
 
-    animation_images = []
-    max_frame_count = 0
+def hash_animation(paths):
+    """Hash an animation's frame names and contents"""
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
 
-    for anim in animation_order:
-        folder_path = os.path.join(animation_base_folder, anim)
-        image_files = sorted([f for f in os.listdir(folder_path) if f.endswith(('.png', '.jpg'))])
-        images = [Image.open(os.path.join(folder_path, f)) for f in image_files]
-        animation_images.append(images)
-        max_frame_count = max(max_frame_count, len(images))
+def load_frame(path):
+    """Decode one frame (runs in a worker process)"""
+    with Image.open(path) as image:
+        image = image.convert("RGBA")
+        return image.size, image.tobytes()
 
-    # Assume all frames are the same size
-    frame_width, frame_height = animation_images[0][0].size
+def build_character(character, output_path, files, hashes, cached, pool):
+    """Write one character's sheet, decoding only animations whose hash changed"""
+    old_sheet = None
+    if os.path.exists(output_path) and cached.get("frame_size"):
+        old_sheet = Image.open(output_path).convert("RGBA")
+    old_hashes = cached.get("animations", [])
+
+    # Reuse rows of unchanged animations; decode the rest in the pool
+    reuse = [old_sheet is not None and row < len(old_hashes) and old_hashes[row] == hashes[row]
+             for row in range(len(files))]
+    to_decode = [path for row, paths in enumerate(files) if not reuse[row] for path in paths]
+    decoded = dict(zip(to_decode, pool.map(load_frame, to_decode, chunksize=4)))
+
+    # Validate frame sizes rather than assuming them
+    if decoded:
+        sizes = {path: size for path, (size, _) in decoded.items()}
+        frame_size = sizes[to_decode[0]]
+        if cached.get("frame_size") and any(reuse) and tuple(cached["frame_size"]) != frame_size:
+            raise BuildError(f"{character}: changed frames are {frame_size}, unchanged ones {tuple(cached['frame_size'])}")
+    else:
+        sizes = {}
+        frame_size = tuple(cached["frame_size"])
+    wrong = [f"{os.path.relpath(path, base_path)} is {size[0]}x{size[1]}"
+             for path, size in sizes.items() if size != frame_size]
+    if wrong:
+        raise BuildError(f"{character}: frames must all be {frame_size[0]}x{frame_size[1]}: " + ", ".join(wrong))
+    frame_width, frame_height = frame_size
 
     # Determine sprite sheet size
-    sheet_width = max(len(anim) for anim in animation_images) * frame_width
-    sheet_height = len(animation_images) * frame_height
+    sheet_width = max(len(paths) for paths in files) * frame_width
+    sheet_height = len(files) * frame_height
 
     # Create the sprite sheet
     sprite_sheet = Image.new("RGBA", (sheet_width, sheet_height))
 
-    for row, anim_frames in enumerate(animation_images):
-        for col, img in enumerate(anim_frames):
-            x = col * frame_width
-            y = row * frame_height
-            sprite_sheet.paste(img, (x, y))
+    for row, paths in enumerate(files):
+        y = row * frame_height
+        if reuse[row]:
+            sprite_sheet.paste(old_sheet.crop((0, y, len(paths) * frame_width, y + frame_height)), (0, y))
+            continue
+        for col, path in enumerate(paths):
+            size, pixels = decoded[path]
+            sprite_sheet.paste(Image.frombytes("RGBA", size, pixels), (col * frame_width, y))
 
     # Save the result
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
     sprite_sheet.save(output_path)
-    print(f"Saved sprite sheet as {output_path}")
\ No newline at end of file
+    print(f"Saved sprite sheet as {output_path} ({len(to_decode)} frames decoded, "
+          f"{sum(reuse)} animations reused)")
+    return frame_size
+
+def format_json(value, indent=0):
+    """Like json.dumps(indent=2), but short lists and objects stay on one line"""
+    compact = json.dumps(value)
+    if len(compact) + indent <= 100 or not isinstance(value, (dict, list)) or not value:
+        return compact
+    pad = " " * (indent + 2)
+    if isinstance(value, dict):
+        items = [f"{pad}{json.dumps(key)}: {format_json(item, indent + 2)}" for key, item in value.items()]
+        return "{\n" + ",\n".join(items) + "\n" + " " * indent + "}"
+    items = [pad + format_json(item, indent + 2) for item in value]
+    return "[\n" + ",\n".join(items) + "\n" + " " * indent + "]"
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the character sprite sheets from their animation frames")
+    parser.add_argument("--force", action="store_true", help="rebuild every sheet even if no frame changed")
+    args = parser.parse_args()
+
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    cache = {}
+    if os.path.exists(cache_path) and not args.force:
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+
+    manifest_changed = False
+    try:
+        with ProcessPoolExecutor() as pool:
+            for entry in manifest["characters"]:
+                # The character folders are named after the characters in the manifest
+                character = entry["name"]
+                files = frame_files(character)
+                hashes = [hash_animation(paths) for paths in files]
+                cached = cache.get(character, {})
+                output_path = os.path.join(assets_path, entry["sheet"])
+
+                if cached.get("animations") == hashes and os.path.exists(output_path):
+                    print(f"{character}: up to date")
+                else:
+                    frame_size = build_character(character, output_path, files, hashes, cached, pool)
+                    cache[character] = {"animations": hashes, "frame_size": list(frame_size)}
+                    if entry.get("frame_size") != frame_size[0] or frame_size[0] != frame_size[1]:
+                        print(f"Warning: {character} frames are {frame_size[0]}x{frame_size[1]} "
+                              f"but the manifest says frame_size {entry.get('frame_size')}")
+
+                # Emit the frame count table the game uses
+                counts = {anim: len(paths) for anim, paths in zip(ACTION_NAMES, files)}
+                if entry.get("animations") != counts:
+                    print(f"{character}: frame counts {entry.get('animations')} -> {counts}")
+                    entry["animations"] = counts
+                    manifest_changed = True
+    except BuildError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if manifest_changed:
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            f.write(format_json(manifest) + "\n")
+        print(f"Updated frame counts in {os.path.normpath(manifest_path)}")
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+if __name__ == "__main__":
+    main()
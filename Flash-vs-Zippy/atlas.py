@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Flash vs Zippy sprite atlas bundles
+Frames cut from a character's sprite sheet, already scaled and trimmed to
+their visible pixels, packed into one raw RGBA image. A bundle is a single
+file: a small header, a JSON index of animation names, frame counts and
+frame rects, then the pixels. Loading one is a single mmap with no PNG
+decode and no scaling, so new fighters and round resets cost nothing.
+
+    python atlas.py            # Rebuild every character's .atlas next to its sheet
+
+The game falls back to the PNG sheets when a bundle is missing or was built
+for different frame sizes, scales or animation steps.
+"""
+
+import json
+import mmap
+import os
+import struct
+import pygame
+from characters import ACTION_NAMES
+
+MAGIC = b"FVZA"
+VERSION = 1
+HEADER = struct.Struct("!4sHI")  # magic, version, index size in bytes
+PIXEL_ALIGNMENT = 16  # Pixels start on this boundary so the mapped buffer is aligned
+ATLAS_WIDTH = 2048  # Width of the packed image; frames are packed in shelves
+
+class AtlasError(Exception):
+    """Raised when an atlas bundle is missing, malformed or out of date"""
+
+class SpriteAtlas:
+    """A loaded bundle: one surface plus the rect and offset of every frame.
+
+    Frame offsets are where the trimmed frame sits inside the full
+    size * scale square, so frames draw exactly where untrimmed ones would.
+    """
+
+    def __init__(self, surface, index, buffer=None):
+        self.surface = surface
+        self.flipped_surface = None  # The whole atlas mirrored, made on first use
+        self.index = index
+        self.size = index["size"]
+        self.scale = index["scale"]
+        self.animation_steps = [len(animation["frames"]) for animation in index["animations"]]
+        self._buffer = buffer  # Keeps the mapped file alive while the surface reads from it
+
+    def matches(self, size, scale, animation_steps):
+        """Whether the bundle was built for these fighter settings"""
+        return (self.size == size and self.scale == scale
+                and self.animation_steps == list(animation_steps))
+
+    def frames(self, flip=False):
+        """Return (frames, offsets), one list per animation, as subsurfaces of the atlas
+
+        Flipped frames come from one mirrored copy of the whole atlas, which
+        is much cheaper than flipping every frame.
+        """
+        surface = self.surface
+        full_width = self.size * self.scale
+        if flip:
+            if self.flipped_surface is None:
+                self.flipped_surface = pygame.transform.flip(self.surface, True, False)
+            surface = self.flipped_surface
+        width = surface.get_width()
+        frames = []
+        offsets = []
+        for animation in self.index["animations"]:
+            row = []
+            row_offsets = []
+            for x, y, w, h, offset_x, offset_y in animation["frames"]:
+                if flip:
+                    x, offset_x = width - x - w, full_width - offset_x - w
+                row.append(surface.subsurface(x, y, w, h))
+                row_offsets.append((offset_x, offset_y))
+            frames.append(row)
+            offsets.append(row_offsets)
+        return frames, offsets
+
+def _align(n):
+    return (n + PIXEL_ALIGNMENT - 1) // PIXEL_ALIGNMENT * PIXEL_ALIGNMENT
+
+def cut_frames(sprite_sheet, size, scale, animation_steps):
+    """Scale every frame of a sprite sheet and trim it to its visible pixels
+
+    Returns one list of (surface, (x, y)) per animation row, where (x, y) is
+    the trimmed frame's position inside the scaled frame.
+    """
+    rows = []
+    for y, steps in enumerate(animation_steps):
+        row = []
+        for x in range(steps):
+            frame = sprite_sheet.subsurface(x * size, y * size, size, size)
+            frame = pygame.transform.scale(frame, (size * scale, size * scale))
+            bounds = frame.get_bounding_rect()
+            if bounds.width == 0 or bounds.height == 0:
+                bounds = pygame.Rect(0, 0, 1, 1)  # Fully transparent frame
+            row.append((frame.subsurface(bounds), bounds.topleft))
+        rows.append(row)
+    return rows
+
+def pack(rows, width=ATLAS_WIDTH):
+    """Place frames in shelves, tallest first; returns (atlas height, rects in row order)"""
+    order = sorted(((r, c) for r, row in enumerate(rows) for c in range(len(row))),
+                   key=lambda rc: -rows[rc[0]][rc[1]][0].get_height())
+    rects = [[None] * len(row) for row in rows]
+    x = y = shelf_height = 0
+    for r, c in order:
+        w, h = rows[r][c][0].get_size()
+        if x + w > width:
+            x, y = 0, y + shelf_height
+            shelf_height = 0
+        rects[r][c] = (x, y, w, h)
+        x += w
+        shelf_height = max(shelf_height, h)
+    return y + shelf_height, rects
+
+def build_atlas(sprite_sheet, size, scale, animation_steps, path, names=ACTION_NAMES):
+    """Write a bundle for a sprite sheet to path"""
+    rows = cut_frames(sprite_sheet, size, scale, animation_steps)
+    height, rects = pack(rows)
+    image = pygame.Surface((ATLAS_WIDTH, height), pygame.SRCALPHA, 32)
+    image.fill((0, 0, 0, 0))
+    animations = []
+    for name, row, row_rects in zip(names, rows, rects):
+        frames = []
+        for (frame, offset), rect in zip(row, row_rects):
+            image.blit(frame, rect[:2])
+            frames.append([*rect, *offset])
+        animations.append({"name": name, "frames": frames})
+
+    index = json.dumps({
+        "width": ATLAS_WIDTH,
+        "height": height,
+        "format": "RGBA",
+        "size": size,
+        "scale": scale,
+        "animations": animations,
+    }, separators=(",", ":")).encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, len(index)) + index
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(bytes(_align(len(header)) - len(header)))
+        f.write(pygame.image.tostring(image, "RGBA"))
+
+def load_atlas(path):
+    """Map a bundle into memory and wrap its pixels in a surface without copying"""
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise AtlasError(f"Cannot read {path}: {e}")
+
+    try:
+        magic, version, index_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise AtlasError(f"{path} is not a version {VERSION} atlas bundle")
+        index = json.loads(data[HEADER.size:HEADER.size + index_size].decode("utf-8"))
+        width, height = index["width"], index["height"]
+        start = _align(HEADER.size + index_size)
+        if index.get("format") != "RGBA" or len(data) < start + width * height * 4:
+            raise AtlasError(f"{path} is truncated or has an unknown pixel format")
+    except (struct.error, ValueError, KeyError) as e:
+        data.close()
+        raise AtlasError(f"{path} is malformed: {e}")
+    except AtlasError:
+        data.close()
+        raise
+
+    surface = pygame.image.frombuffer(memoryview(data)[start:start + width * height * 4], (width, height), "RGBA")
+    if pygame.display.get_surface() is not None:
+        # One format conversion for the whole atlas makes every frame blit fast
+        return SpriteAtlas(surface.convert_alpha(), index)
+    return SpriteAtlas(surface, index, data)
+
+def main():
+    from game_resources import GameResources
+
+    game_res = GameResources(headless=True)  # Only for the character registry and paths
+    for character in game_res.characters:
+        sheet = pygame.image.load(os.path.join(game_res.base_path, "assets", character.sheet))
+        path = game_res.atlas_path(character)
+        build_atlas(sheet, character.frame_size, character.scale, character.animation_steps, path)
+        print(f"Saved atlas bundle as {path} ({os.path.getsize(path) // 1024} KiB)")
+
+if __name__ == "__main__":
+    main()
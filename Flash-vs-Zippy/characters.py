@@ -0,0 +1,101 @@
+"""
+Character registry.
+
+Every fighter's frame counts, sprite scale, hitbox, attack and projectile
+parameters and sounds come from assets/characters.json, along with the
+characters players 1 and 2 use and their key bindings. The manifest is
+compiled once at import into tuples indexed by integer character id, so
+the simulation reads a fighter's numbers with one attribute lookup instead
+of branching on who it is. Adding a character only takes a manifest entry
+and its sprite sheet.
+"""
+
+import json
+import os
+import pygame
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "characters.json")
+
+# Sprite sheet rows, in the order of the action constants in simulation
+ACTION_NAMES = ["idle", "run", "jump", "attack1", "attack2", "take_hit", "dead"]
+
+# Inputs a control scheme binds, in the order get_input reports them
+INPUT_NAMES = ["left", "right", "jump", "attack1", "attack2"]
+
+class ManifestError(Exception):
+    """Raised when the character manifest is missing fields or inconsistent"""
+
+class Character:
+    """One compiled manifest entry; shared by every fighter using the character"""
+
+    __slots__ = ("id", "name", "sheet", "frame_size", "scale", "offset", "data", "animation_steps",
+                 "hitbox", "flip_when_level", "melee_damage", "melee_reach", "projectile_speed",
+                 "projectile_damage", "projectile_size", "ranged_cooldown", "sounds")
+
+    def __init__(self, character_id, entry):
+        try:
+            self.id = character_id
+            self.name = entry["name"]
+            self.sheet = entry["sheet"]  # Relative to the assets folder
+            self.frame_size = int(entry["frame_size"])
+            self.scale = int(entry["scale"])
+            self.offset = list(entry.get("offset", [0, 0]))
+            self.data = [self.frame_size, self.scale, self.offset]  # What Fighter takes as data
+            animations = entry["animations"]
+            self.animation_steps = tuple(int(animations[name]) for name in ACTION_NAMES)
+            self.hitbox = tuple(entry["hitbox"])
+            # Facing when level with the opponent: True faces right (flipped)
+            self.flip_when_level = bool(entry.get("flip_when_level", False))
+            self.melee_damage = entry["melee"]["damage"]
+            self.melee_reach = entry["melee"]["reach"]  # Hitbox width, in hitbox widths
+            projectile = entry["projectile"]
+            self.projectile_speed = projectile["speed"]
+            self.projectile_damage = projectile["damage"]
+            self.projectile_size = tuple(projectile["size"])
+            self.ranged_cooldown = int(projectile["cooldown_frames"])
+            self.sounds = tuple((sound["file"], sound.get("volume", 1.0)) for sound in entry.get("sounds", []))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ManifestError(f"Character {entry.get('name', character_id)!r} is missing or has a bad field: {e}")
+        if len(self.hitbox) != 2 or len(self.projectile_size) != 2:
+            raise ManifestError(f"Character {self.name!r}: hitbox and projectile size need a width and height")
+        if min(self.animation_steps) < 1:
+            raise ManifestError(f"Character {self.name!r}: every animation needs at least one frame")
+
+    def __repr__(self):
+        return f"Character({self.id}, {self.name!r})"
+
+def compile_controls(bindings):
+    """Turn {input: "K_..."} into ((input, key code), ...) in INPUT_NAMES order"""
+    try:
+        return tuple((name, getattr(pygame, bindings[name])) for name in INPUT_NAMES)
+    except (KeyError, AttributeError, TypeError) as e:
+        raise ManifestError(f"Bad key binding: {e}")
+
+def load_manifest(path=MANIFEST_PATH):
+    """Read and compile a manifest; returns (characters, roster, controls)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"Cannot read character manifest {path}: {e}")
+
+    characters = tuple(Character(i, entry) for i, entry in enumerate(manifest.get("characters", [])))
+    by_name = {character.name: character.id for character in characters}
+    if len(by_name) != len(characters):
+        raise ManifestError("Character names must be unique")
+    try:
+        roster = tuple(by_name[name] for name in manifest["roster"])
+    except KeyError as e:
+        raise ManifestError(f"Roster names an unknown character: {e}")
+    controls = tuple(compile_controls(bindings) for bindings in manifest.get("controls", []))
+    if len(roster) != 2 or len(controls) != 2:
+        raise ManifestError("The manifest needs a roster and controls for players 1 and 2")
+    return characters, roster, controls
+
+# Compiled once per process
+CHARACTERS, ROSTER, CONTROLS = load_manifest()  # Characters by id; character id and key bindings per player - 1
+BY_NAME = {character.name: character.id for character in CHARACTERS}
+
+def for_player(player):
+    """The character player 1 or 2 fights as"""
+    return CHARACTERS[ROSTER[player - 1]]
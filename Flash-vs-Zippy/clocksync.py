@@ -0,0 +1,105 @@
+"""
+Round trip time and clock offset estimation from ping/pong messages.
+
+The client stamps each ping with its send time t0. The server's pong adds
+the time it received the ping (t1) and sent the pong (t2), and the client
+notes when the pong arrived (t3). As in NTP:
+
+    rtt = (t3 - t0) - (t2 - t1)
+    offset = ((t1 - t0) + (t2 - t3)) / 2    # server clock minus local clock
+
+Queueing delay inflates a sample's RTT, and it skews the offset whenever
+the two directions are delayed unequally. So, like NTP's clock filter, the
+offset comes from the lowest-RTT sample among the last few. The RTT shown
+to players is smoothed as TCP does (RFC 6298), with its mean deviation as
+jitter. Both ends use their own monotonic clock in seconds; only their
+difference matters.
+"""
+
+import time
+from collections import deque
+
+PING_INTERVAL = 1.0  # Seconds between pings once synchronized
+FAST_PING_INTERVAL = 0.1  # Seconds between the first pings, to fill the filter quickly
+FILTER_SAMPLES = 8  # Samples the offset filter picks from
+RTT_GAIN = 1 / 8  # Weight of a new sample in the smoothed RTT
+JITTER_GAIN = 1 / 4  # Weight of a new sample in the jitter
+
+def now():
+    """The clock pings and pongs are stamped with"""
+    return time.monotonic()
+
+def pong(ping, received, clock=now):
+    """Build the server's answer to a ping received at the given time"""
+    message = {"type": "pong", "t1": received, "t2": clock()}
+    for key in ("seq", "t0"):
+        if isinstance(ping.get(key), (int, float)):
+            message[key] = ping[key]
+    return message
+
+class ClockSync:
+    """The client side: sends pings and turns pongs into RTT and clock offset estimates"""
+
+    def __init__(self, clock=now):
+        self.clock = clock
+        self.samples = deque(maxlen=FILTER_SAMPLES)  # (rtt, offset) of the latest pongs
+        self.rtt = None  # Smoothed round trip time in seconds, None until the first pong
+        self.jitter = 0.0  # Mean deviation of the round trip time
+        self.min_rtt = None  # RTT of the sample the offset comes from
+        self.offset = 0.0  # Server clock minus local clock
+        self.seq = 0  # Sequence number of the last ping sent
+        self.last_pong_seq = 0
+        self.last_ping = None  # Local time the last ping was sent
+
+    @property
+    def synced(self):
+        """Whether at least one pong has come back"""
+        return self.rtt is not None
+
+    def ping_due(self):
+        """Whether it is time to send another ping"""
+        if self.last_ping is None:
+            return True
+        interval = PING_INTERVAL if len(self.samples) >= FILTER_SAMPLES else FAST_PING_INTERVAL
+        return self.clock() - self.last_ping >= interval
+
+    def ping(self):
+        """Return the fields of a new ping message, with our RTT estimate for the server's stats"""
+        self.seq += 1
+        self.last_ping = self.clock()
+        fields = {"seq": self.seq, "t0": self.last_ping}
+        if self.rtt is not None:
+            fields["rtt"] = round(self.rtt, 6)
+        return fields
+
+    def on_pong(self, message, received=None):
+        """Add a pong's sample to the estimates; returns False if it was stale or malformed"""
+        t3 = self.clock() if received is None else received
+        try:
+            seq, t0, t1, t2 = message["seq"], message["t0"], message["t1"], message["t2"]
+            rtt = (t3 - t0) - (t2 - t1)
+            offset = ((t1 - t0) + (t2 - t3)) / 2
+        except (KeyError, TypeError):
+            return False
+        if not self.last_pong_seq < seq <= self.seq or rtt < 0:
+            return False  # Duplicate, reordered, not ours or from before a clock jump
+        self.last_pong_seq = seq
+
+        if self.rtt is None:
+            self.rtt = rtt
+            self.jitter = rtt / 2
+        else:
+            self.jitter += JITTER_GAIN * (abs(rtt - self.rtt) - self.jitter)
+            self.rtt += RTT_GAIN * (rtt - self.rtt)
+
+        self.samples.append((rtt, offset))
+        self.min_rtt, self.offset = min(self.samples)
+        return True
+
+    def server_time(self, local_time=None):
+        """Convert a local clock reading (now by default) to the server's clock"""
+        return (self.clock() if local_time is None else local_time) + self.offset
+
+    def local_time(self, server_time):
+        """Convert a server clock reading to the local clock"""
+        return server_time - self.offset
@@ -0,0 +1,44 @@
+"""
+Collision checks for the simulation.
+
+Hitboxes (projectile paths, melee boxes) are tested against fighters'
+hurtboxes with Rect.collidelistall, which scans a whole list in C, so a
+frame costs one call per target instead of a Python loop over every
+projectile and fighter pair. Projectiles are tested along the path they
+covered this frame (a swept box), so one moving faster than a fighter is
+wide cannot pass through it between two frames.
+"""
+
+import pygame
+
+NO_BOX = pygame.Rect(0, 0, 0, 0)  # Collides with nothing; stands in for inactive hitboxes
+
+def swept_box(rect, dx):
+    """The area newly covered by rect moving dx along x: rect plus any gap it jumped over
+
+    The previous position was tested last frame, so it is left out; when
+    the move is no wider than rect this is just rect.
+    """
+    gap = abs(dx) - rect.width
+    if gap <= 0:
+        return rect
+    if dx > 0:
+        return pygame.Rect(rect.x - gap, rect.y, rect.width + gap, rect.height)
+    return pygame.Rect(rect.x, rect.y, rect.width + gap, rect.height)
+
+def projectile_hits(projectiles, paths, targets):
+    """Yield (projectile, target) for every path crossing a target's hurtbox
+
+    paths[i] is the swept box of projectiles[i]. Hits come target by target,
+    in projectile order, and skip projectiles the caller has deactivated
+    in the meantime.
+    """
+    for target in targets:
+        for index in target.rect.collidelistall(paths):
+            projectile = projectiles[index]
+            if projectile.active:
+                yield projectile, target
+
+def melee_hits(box, targets):
+    """Return the targets whose hurtbox overlaps a melee box, in order"""
+    return [targets[index] for index in box.collidelistall([target.rect for target in targets])]
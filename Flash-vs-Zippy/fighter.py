@@ -1,119 +1,79 @@
 import pygame
+from atlas import SpriteAtlas
+import characters
+import interpolation
+import logs
+from simulation import FighterState, HIT_COOLDOWN, projectile_pool
 
-class Projectile:
-    def __init__(self, x, y, direction, speed, damage, owner):
-        self.rect = pygame.Rect(x, y, 30, 10)  # Small projectile rectangle
-        self.direction = direction  # 1 for right, -1 for left
-        self.speed = speed
-        self.damage = damage
-        self.active = True
-        self.owner = owner  # Reference to the fighter who fired it
-        
-    def update(self, target, screen_width):
-        # Move the projectile
-        self.rect.x += self.speed * self.direction
-        
-        # Check if out of screen bounds
-        if self.rect.x < 0 or self.rect.x > screen_width:
-            self.active = False
-            
-        # Check for collision with target (only if from local player)
-        if self.active and self.owner.is_local and self.rect.colliderect(target.rect):
-            if target.hit_cooldown <= 0:
-                prev_health = target.health
-                target.health -= self.damage
-                target.hit = True
-                target.hit_cooldown = 45
-                self.active = False
-                print(f"RANGED HIT! {self.owner.player} hit {target.player}! Health: {prev_health} → {target.health}")
-                
-    def draw(self, surface):
-        # Draw the projectile - blue energy ball
-        if self.active:
-            pygame.draw.ellipse(surface, (30, 144, 255), self.rect)  # Light blue
-            pygame.draw.ellipse(surface, (0, 191, 255), (self.rect.x + 2, self.rect.y + 2, 
-                                                        self.rect.width - 4, self.rect.height - 4))  # Inner glow
+sync_log = logs.get_logger("sync")
+
+# Scaled animation frames shared by every Fighter in the process, so round
+# resets and new fighters reuse them: (sheet, size, scale, flip, steps) -> (frames, offsets) per action
+_sprite_cache = {}
+
+def load_animation_frames(sprite_sheet, size, scale, animation_steps, flip=False):
+    """Return the scaled frames of a sprite sheet or atlas bundle, one list per animation row
 
-class Fighter():
-    def __init__(self, player, x, y, flip, data, sprite_sheet, animation_steps, sounds, is_local=True, font=None):
-        self.player = player
+    Also returns where each frame sits inside the size * scale square; atlas
+    frames are trimmed to their visible pixels, sheet frames are not.
+    """
+    steps = tuple(animation_steps)
+    key = (sprite_sheet, size, scale, flip, steps)
+    if key not in _sprite_cache:
+        # Build both orientations at once; fighters turn around all the time
+        if isinstance(sprite_sheet, SpriteAtlas):
+            # Already scaled and trimmed offline, see atlas.py
+            _sprite_cache[(sprite_sheet, size, scale, False, steps)] = sprite_sheet.frames()
+            _sprite_cache[(sprite_sheet, size, scale, True, steps)] = sprite_sheet.frames(flip=True)
+        else:
+            frames = []
+            for y, animation in enumerate(steps):
+                temp_img_list = []
+                for x in range(animation):
+                    temp_img = sprite_sheet.subsurface(x * size, y * size, size, size)
+                    temp_img_list.append(pygame.transform.scale(temp_img, (size * scale, size * scale)))
+                frames.append(temp_img_list)
+            flipped = [[pygame.transform.flip(img, True, False) for img in row] for row in frames]
+            offsets = [[(0, 0)] * animation for animation in steps]  # Sheet frames are not trimmed
+            _sprite_cache[(sprite_sheet, size, scale, False, steps)] = (frames, offsets)
+            _sprite_cache[(sprite_sheet, size, scale, True, steps)] = (flipped, offsets)
+    return _sprite_cache[key]
+
+class Fighter(FighterState):
+    """A FighterState with sprites, sounds and local keyboard input"""
+
+    def __init__(self, player, x, y, flip, data, sprite_sheet, animation_steps, sounds, is_local=True, font=None,
+                 character=None):
+        super().__init__(player, x, y, flip, animation_steps, is_local, character)
         self.size = data[0]
         self.image_scale = data[1]
         self.offset = data[2]
-        self.flip = flip  # Initial flip state
-        self.animation_list = self.load_images(sprite_sheet, animation_steps)
-        self.action = 0  # 0:idle #1:run #2:jump #3:attack1 #4: attack2 #5:hit #6:death
-        self.frame_index = 0
-        self.image = self.animation_list[self.action][self.frame_index]
-        self.update_time = pygame.time.get_ticks()
-        self.rect = pygame.Rect((x, y, 80, 180))
-        self.vel_y = 0
-        self.running = False
-        self.jump = False
-        self.attacking = False
-        self.attack_type = 0
-        self.attack_cooldown = 0
+        # Headless fighters (sprite_sheet None) hold no surfaces and draw nothing
+        self.animation_list = None
+        self.flipped_animation_list = None
+        self.image = None
+        self.flipped_image = None
+        if sprite_sheet is not None:
+            self.animation_list, self.animation_offsets = self.load_images(sprite_sheet, animation_steps)
+            self.flipped_animation_list, self.flipped_animation_offsets = self.load_images(sprite_sheet, animation_steps, flip=True)
+            self.update_image()
         self.attack_sounds = sounds  # Now a list/tuple of sounds for different attacks
-        self.hit = False
-        self.hit_cooldown = 0  # New: cooldown for hit state to ensure animation plays
-        self.health = 100
-        self.alive = True
-        self.is_local = is_local  # Whether this fighter is controlled locally
         self.remote_input = {}  # Store remote input for network play
+        # Remote positions are shown from this buffer (see interpolate). It is made for the first
+        # remote state, as is_local may change after construction, and never when the delay is 0
+        self.snapshots = None
         self.font = font  # Store the font for drawing text
-        # Track if this fighter is currently displaying a remote attack animation
-        self.remote_attacking = False
-        self.remote_attack_action = 0
-        self.attack_has_hit = False
-        
-        # Add projectiles list for ranged attacks
-        self.projectiles = []
-        
-        # Add ranged attack cooldown tracking
-        self.ranged_cooldown = 0
-        self.last_ranged_time = 0
-        self.ranged_attack_used = False
 
-    def load_images(self, sprite_sheet, animation_steps):
-        # extract images from spritesheet
-        animation_list = []
-        for y, animation in enumerate(animation_steps):
-            temp_img_list = []
-            for x in range(animation):
-                temp_img = sprite_sheet.subsurface(x * self.size, y * self.size, self.size, self.size)
-                temp_img_list.append(pygame.transform.scale(temp_img, (self.size * self.image_scale, self.size * self.image_scale)))
-            animation_list.append(temp_img_list)
-        return animation_list
+    def load_images(self, sprite_sheet, animation_steps, flip=False):
+        # extract images and their offsets from spritesheet (scaled once per process, see load_animation_frames)
+        return load_animation_frames(sprite_sheet, self.size, self.image_scale, animation_steps, flip)
 
-    def get_state(self):
-        """Return the current state of the fighter for network synchronization"""
-        state = {
-            "x": self.rect.x,
-            "y": self.rect.y,
-            "vel_y": self.vel_y,
-            "running": self.running,
-            "jump": self.jump,
-            "attacking": self.attacking,
-            "attack_type": self.attack_type,
-            "attack_cooldown": self.attack_cooldown,
-            "hit": self.hit,
-            "hit_cooldown": self.hit_cooldown,  # Include hit cooldown in state
-            "health": self.health,
-            "alive": self.alive,
-            "action": self.action,
-            "frame_index": self.frame_index,
-            "flip": self.flip,
-            # Add ranged cooldown data
-            "ranged_cooldown": self.ranged_cooldown,
-            "last_ranged_time": self.last_ranged_time,
-            "ranged_attack_used": self.ranged_attack_used,
-            # Add projectiles data for network sync
-            "projectiles": [
-                {"x": p.rect.x, "y": p.rect.y, "direction": p.direction, "active": p.active} 
-                for p in self.projectiles
-            ]
-        }
-        return state
+    def update_image(self):
+        """Pick the frame (and its trim offset) for the current action and frame index"""
+        self.image = self.animation_list[self.action][self.frame_index]
+        self.flipped_image = self.flipped_animation_list[self.action][self.frame_index]
+        self.image_offset = self.animation_offsets[self.action][self.frame_index]
+        self.flipped_image_offset = self.flipped_animation_offsets[self.action][self.frame_index]
 
     def set_state(self, state):
         """Set the state of the fighter from network data"""
@@ -125,17 +85,25 @@ class Fighter():
         if remote_health != self.health:
             old_health = self.health
             self.health = remote_health
-            print(f"❤️‍🔥 Health sync: {old_health} → {remote_health} (Local: {self.is_local})")
+            sync_log.debug("Health sync: %s -> %s (local: %s)", old_health, remote_health, self.is_local)
 
             # Trigger hit animation for local victim
             if remote_health < old_health and self.is_local and not self.hit:
                 self.hit = True
-                self.hit_cooldown = 45
+                self.hit_cooldown = HIT_COOLDOWN
 
         if not self.is_local:
-            # Apply full state for remote players
-            self.rect.x = state.get("x", self.rect.x)
-            self.rect.y = state.get("y", self.rect.y)
+            # Apply full state for remote players; position and projectiles go
+            # through the snapshot buffer when interpolating
+            if interpolation.INTERPOLATION_DELAY <= 0:
+                self.rect.x = state.get("x", self.rect.x)
+                self.rect.y = state.get("y", self.rect.y)
+            elif "x" in state:  # Health-only reports carry no position
+                if self.snapshots is None:
+                    self.snapshots = interpolation.SnapshotBuffer()
+                # Fields a delta leaves out are unchanged, so they keep their last values
+                self.snapshots.push(state["x"], state.get("y", self.rect.y), state.get("projectiles"),
+                                    state.get("running", self.running) or state.get("jump", self.jump))
             self.vel_y = state.get("vel_y", self.vel_y)
             self.running = state.get("running", self.running)
             self.jump = state.get("jump", self.jump)
@@ -150,27 +118,9 @@ class Fighter():
             self.last_ranged_time = state.get("last_ranged_time", self.last_ranged_time)
             self.ranged_attack_used = state.get("ranged_attack_used", self.ranged_attack_used)
 
-            # Sync projectiles for remote players
-            remote_projectiles = state.get("projectiles", [])
-            if remote_projectiles and not self.is_local:
-                # If we have fewer projectiles than remote state, add new ones
-                while len(self.projectiles) < len(remote_projectiles):
-                    proj_data = remote_projectiles[len(self.projectiles)]
-                    new_proj = Projectile(
-                        proj_data["x"], 
-                        proj_data["y"], 
-                        proj_data["direction"], 
-                        15, 10, self
-                    )
-                    new_proj.active = proj_data["active"]
-                    self.projectiles.append(new_proj)
-                
-                # Update existing projectiles
-                for i, proj_data in enumerate(remote_projectiles):
-                    if i < len(self.projectiles):
-                        self.projectiles[i].rect.x = proj_data["x"]
-                        self.projectiles[i].rect.y = proj_data["y"]
-                        self.projectiles[i].active = proj_data["active"]
+            remote_projectiles = state.get("projectiles")
+            if remote_projectiles is not None and interpolation.INTERPOLATION_DELAY <= 0:
+                self.sync_projectiles(remote_projectiles)
 
             # Remote animation handling
             remote_action = state.get("action", 0)
@@ -198,10 +148,41 @@ class Fighter():
             new_hit = state.get("hit", self.hit)
             if new_hit and not self.hit:
                 self.hit = True
-                self.hit_cooldown = 45
+                self.hit_cooldown = HIT_COOLDOWN
             elif not new_hit:
                 self.hit = False
 
+    def sync_projectiles(self, remote_projectiles):
+        """Match our projectiles to a remote list of them by id (by position in the list for peers that send no ids)"""
+        current = {p.id: p for p in self.projectiles}
+        synced = []
+        for i, proj_data in enumerate(remote_projectiles):
+            projectile = current.pop(proj_data.get("id", i), None)
+            if projectile is None:
+                projectile = projectile_pool.acquire(proj_data["x"], proj_data["y"], proj_data["direction"],
+                                                     self.stats.projectile_speed, self.stats.projectile_damage,
+                                                     self, proj_data.get("id", i))
+            projectile.rect.x = proj_data["x"]
+            projectile.rect.y = proj_data["y"]
+            projectile.active = proj_data["active"]
+            synced.append(projectile)
+        self.projectiles = synced
+        # Projectiles the remote side no longer has go back to the pool
+        for projectile in current.values():
+            projectile_pool.release(projectile)
+
+    def interpolate(self, at=None):
+        """Place a remote fighter and its projectiles where its snapshots had them a moment ago"""
+        if self.is_local or self.snapshots is None:
+            return
+        sample = self.snapshots.sample(at)
+        if sample is None:
+            return
+        x, y, projectiles = sample
+        self.rect.x = round(x)
+        self.rect.y = round(y)
+        self.sync_projectiles(projectiles)
+
     def set_remote_input(self, input_data):
         """Set the remote input data for network play"""
         self.remote_input = input_data
@@ -210,317 +191,53 @@ class Fighter():
         """Get the current input state for network synchronization"""
         key = pygame.key.get_pressed()
         
-        # Get relevant keys based on player number
-        if self.player == 1:
-            return {
-                "left": key[pygame.K_a],
-                "right": key[pygame.K_d],
-                "jump": key[pygame.K_w],
-                "attack1": key[pygame.K_r],
-                "attack2": key[pygame.K_t]
-            }
-        else:  # player 2
-            return {
-                "left": key[pygame.K_LEFT],
-                "right": key[pygame.K_RIGHT],
-                "jump": key[pygame.K_UP],
-                "attack1": key[pygame.K_k],
-                "attack2": key[pygame.K_l]
-            }
+        # Get relevant keys based on player number (bindings from the character manifest)
+        return {name: key[code] for name, code in characters.CONTROLS[self.player - 1]}
 
     def move(self, screen_width, screen_height, surface, target, round_over):
-        SPEED = 10
-        GRAVITY = 2
-        dx = 0
-        dy = 0
-        self.running = False
-        self.attack_type = 0
-
-        # Only process input if the fighter is alive and round is not over
-        if self.alive and not round_over:
-            # Process input either locally or from network
-            if self.is_local:
-                # Get local key presses
-                key = pygame.key.get_pressed()
-                
-                # Check if not currently attacking
-                if not self.attacking:
-                    # Process movement and attacks based on player number
-                    if self.player == 1:
-                        # Movement
-                        if key[pygame.K_a]:
-                            dx = -SPEED
-                            self.running = True
-                        if key[pygame.K_d]:
-                            dx = SPEED
-                            self.running = True
-                        # Jump
-                        if key[pygame.K_w] and not self.jump:
-                            self.vel_y = -30
-                            self.jump = True
-                        # Attack
-                        if not self.attacking:
-                            if key[pygame.K_r]:
-                                self.attack_type = 1
-                                self.attack(target)
-                            elif key[pygame.K_t]:
-                                # Only allow ranged attack if not on cooldown
-                                if self.ranged_cooldown == 0:
-                                    self.attack_type = 2
-                                    self.attack(target)
-                                    
-                    elif self.player == 2:
-                        # Movement
-                        if key[pygame.K_LEFT]:
-                            dx = -SPEED
-                            self.running = True
-                        if key[pygame.K_RIGHT]:
-                            dx = SPEED
-                            self.running = True
-                        # Jump
-                        if key[pygame.K_UP] and not self.jump:
-                            self.vel_y = -30
-                            self.jump = True
-                        # Attack
-                        if key[pygame.K_k] or key[pygame.K_l]:
-                            
-                            # Determine attack type
-                            if not self.attacking:
-                                if key[pygame.K_k]:
-                                    self.attack_type = 1
-                                    self.attack(target)
-                                elif key[pygame.K_l]:
-                                    # Only allow ranged attack if not on cooldown
-                                    if self.ranged_cooldown == 0:
-                                        self.attack_type = 2
-                                        self.attack(target)
-            
-            else:
-                # Process remote input from network
-                if self.remote_input:
-                    # Only process if not attacking
-                    if not self.attacking:
-                        # Movement
-                        if self.remote_input.get("left", False):
-                            dx = -SPEED
-                            self.running = True
-                        if self.remote_input.get("right", False):
-                            dx = SPEED
-                            self.running = True
-                        # Jump
-                        if self.remote_input.get("jump", False) and not self.jump:
-                            self.vel_y = -30
-                            self.jump = True
-                        # Attack
-                        if self.remote_input.get("attack1", False) or self.remote_input.get("attack2", False):
-                            # Determine attack type
-                            if self.remote_input.get("attack1", False):
-                                self.attack_type = 1
-                                self.attack(target)
-                            # Only allow ranged attack if not on cooldown
-                            if self.remote_input.get("attack2", False) and self.ranged_cooldown == 0:
-                                self.attack_type = 2
-                                self.attack(target)
-
-        # Update projectiles
-        self.update_projectiles(target, screen_width)
-
-        # Apply gravity
-        self.vel_y += GRAVITY
-        dy += self.vel_y
-
-        # Ensure player stays on screen
-        if self.rect.left + dx < 0:
-            dx = -self.rect.left
-        if self.rect.right + dx > screen_width:
-            dx = screen_width - self.rect.right
-        if self.rect.bottom + dy > screen_height - 110:
-            self.vel_y = 0
-            self.jump = False
-            dy = screen_height - 110 - self.rect.bottom
-
-        # Update player position
-        self.rect.x += dx
-        self.rect.y += dy
-
-        # Adjust facing direction based on relative positions
-        # For player 1 (Zippy), normal flip orientation is True (facing right)
-        # For player 2 (Flash), normal flip orientation is False (facing left)
-        if self.player == 1:  # Zippy
-            if target.rect.centerx < self.rect.centerx:
-                # Target is to the left, so Zippy should face left
-                self.flip = False  # Flip to face left
-            else:
-                # Target is to the right, so Zippy should face right
-                self.flip = True   # Normal orientation for Zippy
-        else:  # Flash (player 2)
-            if target.rect.centerx > self.rect.centerx:
-                # Target is to the right, so Flash should face right
-                self.flip = True   # Flip to face right
-            else:
-                # Target is to the left, so Flash should face left
-                self.flip = False  # Normal orientation for Flash
-
-        # Apply attack cooldown
-        if self.attack_cooldown > 0:
-            self.attack_cooldown -= 1
-
-    def update_projectiles(self, target, screen_width):
-        """Update all active projectiles"""
-        # Update active projectiles
-        for projectile in self.projectiles:
-            projectile.update(target, screen_width)
-        
-        # Remove inactive projectiles
-        self.projectiles = [p for p in self.projectiles if p.active]
+        """Advance one frame using the keyboard for local fighters and network input otherwise"""
+        inputs = self.get_input() if self.is_local else self.remote_input
+        self.apply_input(inputs, target, round_over, screen_width, screen_height)
 
     def draw_projectiles(self, surface):
-        """Draw all active projectiles"""
+        """Draw all active projectiles and return the areas drawn"""
+        drawn = []
         for projectile in self.projectiles:
-            projectile.draw(surface)
+            if projectile.active:
+                # Draw the projectile - blue energy ball
+                rect = projectile.rect
+                drawn.append(pygame.draw.ellipse(surface, (30, 144, 255), rect))  # Light blue
+                pygame.draw.ellipse(surface, (0, 191, 255), (rect.x + 2, rect.y + 2,
+                                                            rect.width - 4, rect.height - 4))  # Inner glow
+        return drawn
 
     def update(self):
-        # Updated action priorities to handle remote attacks differently
-        if self.health <= 0:
-            self.health = 0
-            self.alive = False
-            self.update_action(6)  # 6:death
-        elif not self.is_local and self.remote_attacking:
-            # For non-local (remote) fighters, prioritize showing attack animations
-            # even if being hit, to ensure attacks are visible to the opponent
-            if self.attack_type == 1:
-                self.update_action(3)  # 3:attack1
-            elif self.attack_type == 2:
-                self.update_action(4)  # 4:attack2
-        elif self.hit == True:
-            self.update_action(5)  # 5:hit
-        elif self.attacking == True:
-            if self.attack_type == 1:
-                self.update_action(3)  # 3:attack1
-            elif self.attack_type == 2:
-                self.update_action(4)  # 4:attack2
-        elif self.jump == True:
-            self.update_action(2)  # 2:jump
-        elif self.running == True:
-            self.update_action(1)  # 1:run
-        else:
-            self.update_action(0)  # 0:idle
+        super().update()
+        if self.animation_list is not None:
+            self.update_image()
 
-        animation_cooldown = 50
-        
-        # Get the correct animation image
-        current_image = self.animation_list[self.action][self.frame_index]
-        
-        # We no longer need to scale attack2 differently since it's a ranged attack now
-        # but we'll keep the image as is
-        self.image = current_image
-        
-        # Check if enough time has passed since the last update
-        if pygame.time.get_ticks() - self.update_time > animation_cooldown:
-            self.frame_index += 1
-            self.update_time = pygame.time.get_ticks()
-        # Check if the animation has finished
-        if self.frame_index >= len(self.animation_list[self.action]):
-            # If the player is dead then end the animation
-            if self.alive == False:
-                self.frame_index = len(self.animation_list[self.action]) - 1
-            else:
-                self.frame_index = 0
-                # Check if an attack was executed
-                if self.action == 3 or self.action == 4:
-                    self.attacking = False
-                    self.attack_cooldown = 20
-                    self.attack_has_hit = False
-                    
-                    # Clean up remote attack state when animation finishes
-                    if not self.is_local:
-                        self.remote_attacking = False
-                        self.remote_attack_action = 0
-                        
-                # Check if damage was taken
-                if self.action == 5:
-                    self.hit = False
-                    # If the player was in the middle of an attack, then the attack is stopped
-                    # Only cancel attack animation for local fighters
-                    # This allows remote fighters to complete their attack animation
-                    if self.is_local:
-                        self.attacking = False
-                        self.attack_cooldown = 20
-        
-        # Update hit cooldown if active
-        if self.hit_cooldown > 0:
-            self.hit_cooldown -= 1
-
-    def attack(self, target):
-        hit_successful = False
-        
-        if self.attack_cooldown == 0 and not self.attack_has_hit:
-            self.attacking = True
-            
-            # Play attack sound
-            if self.attack_type == 1:
-                self.attack_sounds[0].play()
-            elif self.attack_type == 2:
-                self.attack_sounds[1].play()
-            
-            # Handle attack based on type
-            if self.attack_type == 1:
-                # Melee attack - Keep original logic for attack1
-                attack_width = 2.5 * self.rect.width
-                
-                if self.flip:
-                    attacking_rect = pygame.Rect(self.rect.centerx, self.rect.y, attack_width, self.rect.height)
-                else:
-                    attacking_rect = pygame.Rect(self.rect.centerx - attack_width, self.rect.y, attack_width, self.rect.height)
-                
-                if self.is_local and attacking_rect.colliderect(target.rect):
-                    if target.hit_cooldown <= 0:
-                        prev_health = target.health
-                        target.health -= 10
-                        target.hit = True
-                        target.hit_cooldown = 45
-                        hit_successful = True
-                        self.attack_has_hit = True  # ✅ Prevent multiple hits
-                        print(f"HIT! {self.player} hit {target.player}! Health: {prev_health} → {target.health}")
-            
-            elif self.attack_type == 2:
-                # Check if ranged attack is on cooldown
-                current_time = pygame.time.get_ticks()
-                if self.ranged_cooldown == 0:
-                    # Ranged attack - Create a projectile when animation is halfway through
-                    if self.frame_index == len(self.animation_list[4]) // 2 and self.is_local:
-                        # Calculate projectile starting position
-                        proj_x = self.rect.centerx + (50 if self.flip else -50)
-                        proj_y = self.rect.centery - 30  # Slightly above center
-                        
-                        # Create projectile with direction based on player facing
-                        direction = 1 if self.flip else -1
-                        new_projectile = Projectile(proj_x, proj_y, direction, 15, 10, self)
-                        self.projectiles.append(new_projectile)
-                        print(f"Projectile fired by Player {self.player}!")
-                        
-                        # Mark that ranged attack was used - will be processed in main loop
-                        self.ranged_attack_used = True
-        
-        return hit_successful
-
-    def update_action(self, new_action):
-        # Check if the new action is different to the previous one
-        if new_action != self.action:
-            self.action = new_action
-            # Update the animation settings
-            self.frame_index = 0
-            self.update_time = pygame.time.get_ticks()
+    def on_attack(self, attack_type):
+        if self.muted:
+            return
+        # Play attack sound
+        if attack_type == 1:
+            self.attack_sounds[0].play()
+        elif attack_type == 2:
+            self.attack_sounds[1].play()
 
     def draw(self, surface):
-        img = pygame.transform.flip(self.image, self.flip, False)
+        """Draw the fighter and its projectiles, returning the rects drawn"""
+        if self.image is None:
+            return []
+        img = self.flipped_image if self.flip else self.image
+        trim_x, trim_y = self.flipped_image_offset if self.flip else self.image_offset
         
         # Normal drawing logic (we don't need special handling for attack2 now)
-        surface.blit(img, (self.rect.x - (self.offset[0] * self.image_scale), 
-                        self.rect.y - (self.offset[1] * self.image_scale)))
+        drawn = surface.blit(img, (self.rect.x - (self.offset[0] * self.image_scale) + trim_x, 
+                                   self.rect.y - (self.offset[1] * self.image_scale) + trim_y))
         
-        # Draw projectiles
-        self.draw_projectiles(surface)
+        # Draw projectiles; return every area drawn for dirty-rect updates
+        return [drawn] + self.draw_projectiles(surface)
                             
     def draw_floating_text(self, surface, game_res):
         """Draw floating player name text above the fighter"""
@@ -533,9 +250,11 @@ class Fighter():
         # Use the font passed during initialization, or get it if not available
         font = self.font
         if font is None:
-            # For backwards compatibility, load the font from game_res
+            # For backwards compatibility, use the font from game_res (loaded once)
             _, font, _, _ = game_res.load_fonts()
+            self.font = font
         
-        # Draw white text with a black outline for better visibility
+        # Draw white text with a black outline for better visibility; both come
+        # from game_res's text cache, so nothing is re-rendered per frame
         game_res.draw_text(surface, player_text, font, game_res.BLACK, text_x + 2, text_y + 2)  # Shadow
         game_res.draw_text(surface, player_text, font, game_res.WHITE, text_x, text_y)  # Main text
\ No newline at end of file
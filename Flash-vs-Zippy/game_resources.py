@@ -1,14 +1,35 @@
 import pygame
 from pygame import mixer
 import os
+from collections import OrderedDict
+import atlas
+import characters
+import logs
+
+# Run without a display, audio device or sprite decoding (servers, bots, CI)
+HEADLESS = os.environ.get("FVZ_HEADLESS", "").lower() in ("1", "true", "yes")
+
+assets_log = logs.get_logger("assets")
+
+class SilentSound:
+    """Stands in for a mixer Sound when running headless"""
+    
+    def play(self, *args, **kwargs):
+        pass
+    
+    def set_volume(self, volume):
+        pass
 
 class GameResources:
     """Class to centralize game resources, assets, and constants"""
     
-    def __init__(self):
+    def __init__(self, headless=None):
         # Get the base directory of the game
         self.base_path = os.path.dirname(os.path.abspath(__file__))
         
+        # Headless mode skips the mixer, image and font loading, and all drawing
+        self.headless = HEADLESS if headless is None else headless
+        
         # Screen dimensions
         self.SCREEN_WIDTH = 1000
         self.SCREEN_HEIGHT = 600
@@ -23,82 +44,201 @@ class GameResources:
         self.FPS = 60
         self.ROUND_OVER_COOLDOWN = 2000
         
-        # Fighter variables - Zippy (previously Warrior)
-        self.ZIPPY_SIZE = 128
-        self.ZIPPY_SCALE = 2
-        self.ZIPPY_OFFSET = [0, 0]
-        self.ZIPPY_DATA = [self.ZIPPY_SIZE, self.ZIPPY_SCALE, self.ZIPPY_OFFSET]
-        self.ZIPPY_ANIMATION_STEPS = [6, 6, 3, 6, 3, 4, 6]
+        # Fighters - sprite, hitbox, attack and sound data per character, from assets/characters.json
+        self.characters = characters.CHARACTERS
         
-        # Fighter variables - Flash (previously Wizard)
-        self.FLASH_SIZE = 128
-        self.FLASH_SCALE = 2
-        self.FLASH_OFFSET = [0, 0]
-        self.FLASH_DATA = [self.FLASH_SIZE, self.FLASH_SCALE, self.FLASH_OFFSET]
-        self.FLASH_ANIMATION_STEPS = [6, 6, 1, 6, 3, 6, 6]
+        # Rendering state: backgrounds scaled to the screen once, and the rects
+        # drawn this frame and last frame for dirty-rect display updates
+        self.scaled_backgrounds = {}
+        self.dirty_rects = []
+        self.previous_dirty_rects = []
+        self.full_redraw = True
+        
+        # Rendered text surfaces, least recently used first: (font, text, color) -> surface
+        self.TEXT_CACHE_SIZE = 256
+        self.text_cache = OrderedDict()
+        self.text_cache_hits = 0
+        self.text_cache_misses = 0
+        self.fonts = None  # Loaded once by load_fonts
+        self.images = {}  # Loaded once by load_image: path -> surface
         
         # Initialize audio
-        mixer.init()
+        if not self.headless:
+            mixer.init()
     
     def initialize_audio(self):
-        """Initialize game audio"""
+        """Start the music and return the attack sounds of every character (see load_character_sounds)"""
+        if self.headless:
+            return self.load_character_sounds()
+        
         pygame.mixer.music.load(os.path.join(self.base_path, "assets/audio/bgm.mp3"))
         pygame.mixer.music.set_volume(0.35)
         pygame.mixer.music.play(-1, 0.0, 5000)
         
-        # Load sound effects for Zippy
-        zippy_attack1_fx = pygame.mixer.Sound(os.path.join(self.base_path, "assets/audio/zippy_punch.wav"))
-        zippy_attack1_fx.set_volume(0.3)
-        
-        zippy_attack2_fx = pygame.mixer.Sound(os.path.join(self.base_path, "assets/audio/dust_tornado.wav"))
-        zippy_attack2_fx.set_volume(0.3)
-        
-        # Load sound effects for Flash
-        flash_attack1_fx = pygame.mixer.Sound(os.path.join(self.base_path, "assets/audio/flash_punch.mp3"))
-        flash_attack1_fx.set_volume(0.3)
-        
-        flash_attack2_fx = pygame.mixer.Sound(os.path.join(self.base_path, "assets/audio/tornado.wav"))
-        flash_attack2_fx.set_volume(0.15)
+        return self.load_character_sounds()
+    
+    def load_character_sounds(self):
+        """Load each character's attack sounds; returns a tuple of sounds per character id"""
+        if self.headless:
+            return [tuple(SilentSound() for _ in character.sounds) for character in self.characters]
         
-        return zippy_attack1_fx, zippy_attack2_fx, flash_attack1_fx, flash_attack2_fx
+        sounds = []
+        for character in self.characters:
+            character_sounds = []
+            for path, volume in character.sounds:
+                sound = pygame.mixer.Sound(os.path.join(self.base_path, "assets", path))
+                sound.set_volume(volume)
+                character_sounds.append(sound)
+            sounds.append(tuple(character_sounds))
+        return sounds
     
     def load_images(self):
-        """Load and return game images"""
-        # Background
-        bg_image = pygame.image.load(os.path.join(self.base_path, "assets/images/background/background.png")).convert_alpha()
-        
-        # Spritesheets
-        zippy_sheet = pygame.image.load(os.path.join(self.base_path, "assets/images/zippy/zippy.png")).convert_alpha()
-        flash_sheet = pygame.image.load(os.path.join(self.base_path, "assets/images/flash/flash.png")).convert_alpha()
-        
-        # Victory image
-        victory_img = pygame.image.load(os.path.join(self.base_path, "assets/images/icons/victory.png")).convert_alpha()
-        
-        return bg_image, zippy_sheet, flash_sheet, victory_img
+        """Load and return the background, sprite sheets by character id and victory image"""
+        return self.load_background(), self.load_sprite_sheets(), self.load_victory_image()
+    
+    def load_image(self, path):
+        """Load one image from the assets folder; headless mode loads nothing"""
+        if self.headless:
+            # Fighters built from a None sheet hold no surfaces
+            return None
+        if path not in self.images:
+            self.images[path] = pygame.image.load(os.path.join(self.base_path, path)).convert_alpha()
+        return self.images[path]
+    
+    def load_background(self):
+        """Load and return the background image"""
+        return self.load_image("assets/images/background/background.png")
+    
+    def load_sprite_sheets(self):
+        """Load and return every character's sprite sheet (atlas bundles when built), by character id"""
+        return [self.load_sprite_sheet(character) for character in self.characters]
+    
+    def atlas_path(self, character):
+        """Path of a character's prebuilt atlas bundle (see atlas.py), next to its sheet"""
+        return os.path.join(self.base_path, "assets", os.path.splitext(character.sheet)[0] + ".atlas")
+    
+    def load_sprite_sheet(self, character):
+        """Load a character's atlas bundle, or its PNG sheet if there is no usable bundle"""
+        if self.headless:
+            return None
+        path = self.atlas_path(character)
+        if path not in self.images and os.path.exists(path):
+            try:
+                sprite_atlas = atlas.load_atlas(path)
+                if sprite_atlas.matches(character.frame_size, character.scale, character.animation_steps):
+                    self.images[path] = sprite_atlas
+                else:
+                    assets_log.warning("Ignoring out of date atlas bundle %s; run atlas.py to rebuild it", path)
+            except atlas.AtlasError as e:
+                assets_log.warning("Ignoring atlas bundle: %s", e)
+        if path in self.images:
+            return self.images[path]
+        return self.load_image(os.path.join("assets", character.sheet))
+    
+    def load_victory_image(self):
+        """Load and return the victory image"""
+        return self.load_image("assets/images/icons/victory.png")
     
     def load_fonts(self):
         """Load and return game fonts"""
+        if self.fonts is not None:
+            return self.fonts
+        if self.headless:
+            self.fonts = (None, None, None, None)
+            return self.fonts
         count_font = pygame.font.Font(os.path.join(self.base_path, "assets/fonts/turok.ttf"), 80)
         score_font = pygame.font.Font(os.path.join(self.base_path, "assets/fonts/turok.ttf"), 30)
         menu_font = pygame.font.Font(os.path.join(self.base_path, "assets/fonts/turok.ttf"), 40)
         title_font = pygame.font.Font(os.path.join(self.base_path, "assets/fonts/turok.ttf"), 60)
         
-        
-        return count_font, score_font, menu_font, title_font
+        self.fonts = (count_font, score_font, menu_font, title_font)
+        return self.fonts
+    
+    def render_text(self, text, font, text_col):
+        """Return the rendered text surface, reusing it while the same text is drawn"""
+        key = (font, text, tuple(text_col))
+        img = self.text_cache.get(key)
+        if img is None:
+            self.text_cache_misses += 1
+            img = font.render(text, True, text_col)
+            self.text_cache[key] = img
+            if len(self.text_cache) > self.TEXT_CACHE_SIZE:
+                self.text_cache.popitem(last=False)
+        else:
+            self.text_cache_hits += 1
+            self.text_cache.move_to_end(key)
+        return img
     
     def draw_text(self, screen, text, font, text_col, x, y):
         """Helper function to draw text on the screen"""
-        img = font.render(text, True, text_col)
-        screen.blit(img, (x, y))
+        if self.headless:
+            return None
+        img = self.render_text(text, font, text_col)
+        return self.blit(screen, img, (x, y))
+    
+    def blit(self, screen, image, pos):
+        """Blit an image and remember the area for the next display update"""
+        if self.headless:
+            return None
+        rect = screen.blit(image, pos)
+        self.dirty_rects.append(rect)
+        return rect
+    
+    def draw_box(self, screen, color, rect, width=0):
+        """Draw a filled or outlined rectangle and remember the area for the next display update"""
+        if self.headless:
+            return None
+        rect = pygame.draw.rect(screen, color, rect, width)
+        self.dirty_rects.append(rect)
+        return rect
+    
+    def mark_dirty(self, *rects):
+        """Remember areas drawn outside these helpers for the next display update"""
+        self.dirty_rects.extend(rects)
+    
+    def get_scaled_bg(self, bg_image):
+        """Return bg_image scaled to the screen and converted to the display format, built once"""
+        scaled_bg = self.scaled_backgrounds.get(bg_image)
+        if scaled_bg is None:
+            scaled_bg = pygame.transform.scale(bg_image, (self.SCREEN_WIDTH, self.SCREEN_HEIGHT)).convert()
+            self.scaled_backgrounds[bg_image] = scaled_bg
+        return scaled_bg
     
     def draw_bg(self, screen, bg_image):
-        """Helper function to draw background"""
-        scaled_bg = pygame.transform.scale(bg_image, (self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
-        screen.blit(scaled_bg, (0, 0))
+        """Helper function to draw background.
+        
+        Starts a frame: only the areas drawn last frame are repainted, unless
+        a full redraw was requested.
+        """
+        if self.headless:
+            return
+        scaled_bg = self.get_scaled_bg(bg_image)
+        if self.full_redraw:
+            screen.blit(scaled_bg, (0, 0))
+        else:
+            for rect in self.previous_dirty_rects:
+                screen.blit(scaled_bg, rect, rect)
+    
+    def update_display(self):
+        """Push this frame's dirty rects (and last frame's, now erased) to the display"""
+        if self.headless:
+            return
+        if pygame.event.peek(pygame.VIDEOEXPOSE):
+            # The window was uncovered; our picture of the screen is stale
+            self.full_redraw = True
+        if self.full_redraw:
+            pygame.display.update()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.previous_dirty_rects + self.dirty_rects)
+        self.previous_dirty_rects = self.dirty_rects
+        self.dirty_rects = []
     
     def draw_health_bar(self, screen, health, x, y):
         """Helper function to draw fighter health bars"""
+        if self.headless:
+            return
         ratio = health / 100
-        pygame.draw.rect(screen, self.WHITE, (x - 2, y - 2, 404, 34))
+        self.draw_box(screen, self.WHITE, (x - 2, y - 2, 404, 34))
         pygame.draw.rect(screen, self.RED, (x, y, 400, 30))
         pygame.draw.rect(screen, self.YELLOW, (x, y, 400 * ratio, 30))
\ No newline at end of file
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Flash vs Zippy headless bot matches
+Runs fighter matches with no window, audio device or sprite decoding, as fast
+as the simulation allows. Useful for bot matches, load tests and CI boxes.
+
+    python headless_match.py --matches 10 --seed 1
+"""
+
+import argparse
+import random
+import time
+import characters
+from fighter import Fighter
+from game_resources import GameResources
+import simulation
+
+def random_bot(seed, change_chance=0.1):
+    """Return a bot that holds random keys, changing them now and then"""
+    rng = random.Random(seed)
+    keys = ["left", "right", "jump", "attack1", "attack2"]
+    held = {}
+
+    def bot(frame, me, opponent):
+        nonlocal held
+        if rng.random() < change_chance:
+            held = {key: rng.random() < 0.3 for key in keys}
+        return held
+
+    return bot
+
+def chase_bot(frame, me, opponent):
+    """Return inputs that walk toward the opponent and punch when close"""
+    distance = opponent.rect.centerx - me.rect.centerx
+    return {
+        "left": distance < -150,
+        "right": distance > 150,
+        "jump": False,
+        "attack1": abs(distance) <= 150,
+        "attack2": abs(distance) > 400,
+    }
+
+def run_match(game_res, bot_1, bot_2, max_frames=60 * 60):
+    """Play one round between two bots and return (winner, frames); winner 0 means a draw"""
+    character_1, character_2 = characters.for_player(1), characters.for_player(2)
+    sounds = game_res.initialize_audio()
+    fighter_1 = Fighter(1, 200, 310, True, character_1.data, None, character_1.animation_steps,
+                        sounds[character_1.id], True)
+    fighter_2 = Fighter(2, 700, 310, False, character_2.data, None, character_2.animation_steps,
+                        sounds[character_2.id], True)
+    state = simulation.MatchState.with_fighters(fighter_1, fighter_2, 0, game_res.SCREEN_WIDTH, game_res.SCREEN_HEIGHT)
+
+    while not state.round_over and state.frame < max_frames:
+        simulation.advance(state, bot_1(state.frame, fighter_1, fighter_2), bot_2(state.frame, fighter_2, fighter_1))
+    fighter_1.release_projectiles()
+    fighter_2.release_projectiles()
+
+    if fighter_1.alive and not fighter_2.alive:
+        return 1, state.frame
+    if fighter_2.alive and not fighter_1.alive:
+        return 2, state.frame
+    return 0, state.frame
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless Flash vs Zippy bot matches")
+    parser.add_argument("--matches", type=int, default=10, help="number of matches to play")
+    parser.add_argument("--max-frames", type=int, default=60 * 60, help="frames before a match is a draw")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random bots")
+    args = parser.parse_args()
+
+    game_res = GameResources(headless=True)
+    wins = [0, 0, 0]  # draws, P1 wins, P2 wins
+    total_frames = 0
+    start = time.perf_counter()
+
+    for match in range(args.matches):
+        winner, frames = run_match(game_res, chase_bot, random_bot(args.seed + match), args.max_frames)
+        wins[winner] += 1
+        total_frames += frames
+
+    elapsed = time.perf_counter() - start
+    print(f"{args.matches} matches: P1 (chase) {wins[1]}, P2 (random) {wins[2]}, draws {wins[0]}")
+    print(f"{total_frames} frames in {elapsed:.2f}s ({total_frames / max(elapsed, 1e-9):.0f} frames/s)")
+
+if __name__ == "__main__":
+    main()
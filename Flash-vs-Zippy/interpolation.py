@@ -0,0 +1,118 @@
+"""
+Snapshot interpolation for remote fighters.
+
+Remote fighter states arrive at the server's tick rate, with jitter.
+Instead of snapping the fighter to each one as it lands, the positions are
+stamped with their arrival time and buffered. The fighter is then shown
+INTERPOLATION_DELAY in the past, between the two snapshots around that
+moment, and its projectiles are matched by id. When the next snapshot is
+late and the fighter was moving, motion carries on along the last two for
+at most MAX_EXTRAPOLATION, then holds. A fighter that stopped holds at
+once: senders go quiet while nothing changes, so a missing snapshot then
+means no motion rather than a lost packet.
+
+FVZ_INTERP_DELAY sets the delay in milliseconds, and 0 applies snapshots
+as they arrive. It should cover a send interval plus typical jitter; the
+default spans three ticks at 30 Hz. Too short and the buffer runs dry;
+too long and the opponent trails further behind.
+"""
+
+import os
+import time
+from collections import deque
+
+INTERPOLATION_DELAY = int(os.environ.get("FVZ_INTERP_DELAY", "100")) / 1000  # Seconds
+MAX_EXTRAPOLATION = 0.1  # Seconds to keep moving past the newest snapshot
+SNAPSHOT_BUFFER_SIZE = 32
+
+def now():
+    """The clock snapshots are stamped with"""
+    return time.monotonic()
+
+class Snapshot:
+    """Where a remote fighter and its projectiles were at one moment"""
+
+    __slots__ = ("time", "x", "y", "projectiles", "moving")
+
+    def __init__(self, time, x, y, projectiles, moving):
+        self.time = time
+        self.x = x
+        self.y = y
+        self.projectiles = projectiles  # Projectile dicts as in FighterState.get_state
+        self.moving = moving  # Running or airborne; only then is a late snapshot extrapolated
+
+def _projectiles_by_id(projectiles):
+    # Peers that send no ids are matched by position in the list, as in Fighter.sync_projectiles
+    return {proj.get("id", i): proj for i, proj in enumerate(projectiles)}
+
+def blend(a, b, fraction):
+    """Return (x, y, projectiles) a fraction of the way from snapshot a to b (past b when above 1)
+
+    Projectiles are the ones a has, or b's when past b; those missing
+    from the other snapshot stay where they are.
+    """
+    x = a.x + (b.x - a.x) * fraction
+    y = a.y + (b.y - a.y) * fraction
+    if fraction >= 1:
+        base, other, other_is_b = b, a, False
+    else:
+        base, other, other_is_b = a, b, True
+    others = _projectiles_by_id(other.projectiles)
+    projectiles = []
+    for i, proj in enumerate(base.projectiles):
+        proj_id = proj.get("id", i)
+        match = others.get(proj_id)
+        if match is not None:
+            start, end = (proj, match) if other_is_b else (match, proj)
+            proj = dict(proj, x=round(start["x"] + (end["x"] - start["x"]) * fraction),
+                        y=round(start["y"] + (end["y"] - start["y"]) * fraction))
+        projectiles.append(proj)
+    return x, y, projectiles
+
+class SnapshotBuffer:
+    """Arrival-stamped positions of one remote fighter, sampled a fixed delay behind
+
+    push() may run on the network thread while sample() runs on the game
+    loop; each only touches the deque through atomic operations.
+    """
+
+    def __init__(self, delay=INTERPOLATION_DELAY, max_extrapolation=MAX_EXTRAPOLATION, clock=now):
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.clock = clock
+        self.snapshots = deque(maxlen=SNAPSHOT_BUFFER_SIZE)
+
+    def push(self, x, y, projectiles=None, moving=True, received=None):
+        """Add a snapshot; projectiles None keeps the previous snapshot's"""
+        if projectiles is None:
+            projectiles = self.snapshots[-1].projectiles if self.snapshots else []
+        received = self.clock() if received is None else received
+        if self.snapshots and received <= self.snapshots[-1].time:
+            self.snapshots.pop()  # Same instant (several messages read at once): the newer wins
+        self.snapshots.append(Snapshot(received, x, y, projectiles, moving))
+
+    def sample(self, at=None):
+        """Return (x, y, projectiles) as of delay before at (now by default), or None if empty"""
+        snapshots = list(self.snapshots)
+        if not snapshots:
+            return None
+        render_time = (self.clock() if at is None else at) - self.delay
+
+        newest = snapshots[-1]
+        if render_time >= newest.time:
+            # Late snapshot: keep going the way the last two were heading, for a while
+            if len(snapshots) < 2 or not newest.moving:
+                return newest.x, newest.y, newest.projectiles
+            previous = snapshots[-2]
+            render_time = min(render_time, newest.time + self.max_extrapolation)
+            return blend(previous, newest, (render_time - previous.time) / (newest.time - previous.time))
+
+        for i in range(len(snapshots) - 1, 0, -1):
+            a = snapshots[i - 1]
+            if a.time <= render_time:
+                b = snapshots[i]
+                return blend(a, b, (render_time - a.time) / (b.time - a.time))
+
+        # Older than anything buffered (just started): hold the oldest
+        oldest = snapshots[0]
+        return oldest.x, oldest.y, oldest.projectiles
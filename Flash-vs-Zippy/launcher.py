@@ -5,11 +5,9 @@ This script serves as the main entry point for the game, allowing users to choos
 between local 2-player mode or network play.
 """
 
-import os
 import sys
 import pygame
 from game_resources import GameResources
-import subprocess
 
 def main():
     # Initialize pygame
@@ -26,7 +24,7 @@ def main():
     clock = pygame.time.Clock()
     
     # Load game assets
-    bg_image, _, _, _ = game_res.load_images()
+    bg_image = game_res.load_background()
     _, _, menu_font, title_font = game_res.load_fonts()
     
     menu_running = True
@@ -40,17 +38,17 @@ def main():
         game_res.draw_text(screen, "Flash vs Zippy", title_font, game_res.YELLOW, 300, 130)
         
         # Draw menu options
-        pygame.draw.rect(screen, game_res.WHITE if selected_option == 0 else game_res.BLACK, (300, 220, 400, 50), 0)
-        pygame.draw.rect(screen, game_res.YELLOW if selected_option == 0 else game_res.BLACK, (300, 220, 400, 50), 2)
+        game_res.draw_box(screen, game_res.WHITE if selected_option == 0 else game_res.BLACK, (300, 220, 400, 50), 0)
+        game_res.draw_box(screen, game_res.YELLOW if selected_option == 0 else game_res.BLACK, (300, 220, 400, 50), 2)
         game_res.draw_text(screen, "Local 2-Player", menu_font, game_res.BLACK if selected_option == 0 else game_res.WHITE, 350, 230)
         
-        pygame.draw.rect(screen, game_res.WHITE if selected_option == 1 else game_res.BLACK, (300, 300, 400, 50), 0)
-        pygame.draw.rect(screen, game_res.YELLOW if selected_option == 1 else game_res.BLACK, (300, 300, 400, 50), 2)
+        game_res.draw_box(screen, game_res.WHITE if selected_option == 1 else game_res.BLACK, (300, 300, 400, 50), 0)
+        game_res.draw_box(screen, game_res.YELLOW if selected_option == 1 else game_res.BLACK, (300, 300, 400, 50), 2)
         game_res.draw_text(screen, "Network Play", menu_font, game_res.BLACK if selected_option == 1 else game_res.WHITE, 370, 310)
         
         # Start button
-        pygame.draw.rect(screen, game_res.RED, (400, 400, 200, 60))
-        pygame.draw.rect(screen, game_res.YELLOW, (400, 400, 200, 60), 2)
+        game_res.draw_box(screen, game_res.RED, (400, 400, 200, 60))
+        game_res.draw_box(screen, game_res.YELLOW, (400, 400, 200, 60), 2)
         game_res.draw_text(screen, "START", menu_font, game_res.WHITE, 440, 415)
         
         # Handle events
@@ -81,19 +79,20 @@ def main():
                 elif event.key == pygame.K_RETURN:
                     menu_running = False
         
-        pygame.display.update()
+        game_res.update_display()
         clock.tick(game_res.FPS)
     
-    # Start the selected game mode
+    # Start the selected game mode in this process, reusing the window,
+    # mixer and loaded assets instead of starting a new interpreter
     if selected_option == 0:  # Local 2-player
-        # Launch the original game
-        subprocess.Popen([sys.executable, os.path.join(game_res.base_path, "main.py")])
+        # The original game
+        from main import GameClient
     else:  # Network play
-        # Launch the network version
-        subprocess.Popen([sys.executable, os.path.join(game_res.base_path, "main_socket.py")])
+        # The network version
+        from main_socket import GameClient
     
-    # Exit pygame
-    pygame.quit()
+    # run() shuts pygame down when the game ends
+    GameClient(game_res, screen).run()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
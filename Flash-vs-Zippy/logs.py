@@ -0,0 +1,117 @@
+"""
+Logging shared by the client, server and simulation.
+
+Every subsystem logs to its own category, a logger under "fvz":
+
+    net     connections, messages sent and received
+    sync    remote inputs and states applied to the fighters
+    game    game loop and round events
+    sim     hits and projectiles in the simulation
+    assets  loading sprites, atlases and sounds
+    server  the game server
+
+Levels come from FVZ_LOG, a comma-separated list of a default level and
+category=level overrides, e.g. FVZ_LOG="warning,net=debug". "off"
+silences a category, and console=LEVEL shows only records at or above
+LEVEL on stderr. Records that pass their category's level also go to an
+in-memory ring buffer of the latest RING_BUFFER_SIZE records, which can
+be dumped after a desync or crash.
+
+Log calls take %-style arguments, so a disabled call costs one cached level
+check, with no string formatting.
+"""
+
+import logging
+import os
+import sys
+from collections import deque
+
+ROOT_NAME = "fvz"
+CATEGORIES = ("net", "sync", "game", "sim", "assets", "server")
+DEFAULT_LEVEL = logging.INFO
+RING_BUFFER_SIZE = 2000
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+OFF = logging.CRITICAL + 1
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the latest records in memory; they are only formatted when read"""
+
+    def __init__(self, capacity=RING_BUFFER_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        # Freeze the message now; its arguments may be mutated after the call
+        record.msg = record.getMessage()
+        record.args = None
+        self.records.append(record)
+
+    def lines(self):
+        """Return the buffered records, oldest first, formatted"""
+        return [self.format(record) for record in list(self.records)]
+
+    def dump(self, stream=None):
+        """Write the buffered records to stream (stderr by default)"""
+        stream = stream or sys.stderr
+        for line in self.lines():
+            stream.write(line + "\n")
+        stream.flush()
+
+ring_buffer = RingBufferHandler()
+console = logging.StreamHandler()
+
+def parse_level(name):
+    """Turn "debug", "INFO", "off" or a number into a logging level"""
+    name = name.strip()
+    if name.lower() == "off":
+        return OFF
+    if name.isdigit():
+        return int(name)
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {name!r}")
+    return level
+
+def configure(spec=None):
+    """Set category and console levels from spec (FVZ_LOG when None); safe to call again"""
+    if spec is None:
+        spec = os.environ.get("FVZ_LOG", "")
+    default = DEFAULT_LEVEL
+    levels = {}
+    console_level = logging.NOTSET
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        try:
+            if "=" in part:
+                name, level = part.split("=", 1)
+                if name.strip() == "console":
+                    console_level = parse_level(level)
+                else:
+                    levels[name.strip()] = parse_level(level)
+            else:
+                default = parse_level(part)
+        except ValueError as e:
+            sys.stderr.write(f"Ignoring FVZ_LOG entry {part!r}: {e}\n")
+
+    root = logging.getLogger(ROOT_NAME)
+    root.setLevel(default)
+    root.propagate = False  # Don't repeat records through handlers set up with logging.basicConfig
+    if console not in root.handlers:
+        console.setFormatter(logging.Formatter(LOG_FORMAT))
+        ring_buffer.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(console)
+        root.addHandler(ring_buffer)
+    console.setLevel(console_level)
+    for category in CATEGORIES:
+        get_logger(category).setLevel(levels.get(category, logging.NOTSET))  # NOTSET follows the default
+    for category in set(levels) - set(CATEGORIES):
+        get_logger(category).setLevel(levels[category])
+
+def get_logger(category):
+    """Return the logger for a category"""
+    return logging.getLogger(f"{ROOT_NAME}.{category}")
+
+def set_level(category, level):
+    """Change one category's level at run time, e.g. set_level("net", "debug")"""
+    get_logger(category).setLevel(parse_level(level) if isinstance(level, str) else level)
+
+configure()
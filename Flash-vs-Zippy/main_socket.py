@@ -1,784 +1,1097 @@
 import pygame
-from pygame import mixer
 import os
-import sys
-import json
 import socket
 import threading
 import time
+from collections import deque
 from fighter import Fighter
 from game_resources import GameResources
+import protocol
+import characters
+import clocksync
+import logs
+from profiler import FrameProfiler
+import rollback
+import simulation
+import socket_server
 
-# Initialize pygame
-pygame.init()
-
-# Initialize game resources
-game_res = GameResources()
-
-# Create game window
-screen = pygame.display.set_mode((game_res.SCREEN_WIDTH, game_res.SCREEN_HEIGHT))
-pygame.display.set_caption("Flash vs Zippy - Network Edition")
-
-# Set framerate
-clock = pygame.time.Clock()
-
-# Define game variables
-intro_count = 3
-last_count_update = pygame.time.get_ticks()
-score = [0, 0]  # player scores: [P1, P2]
-round_over = False
-
-# Load game assets
-zippy_attack1_fx, zippy_attack2_fx, flash_attack1_fx, flash_attack2_fx = game_res.initialize_audio()
-bg_image, zippy_sheet, flash_sheet, victory_img = game_res.load_images()
-count_font, score_font, menu_font, title_font = game_res.load_fonts()
-
-# Network variables
-client_socket = None
-player_id = None
-opponent_id = None
-game_started = False
-connection_status = "Not Connected"
-server_addr = "localhost"  # Default server address
-server_port = 5678         # Default server port
-BUFFER_SIZE = 4096
-HEADER_SIZE = 10  # Size of message length header
-
-# Flag to indicate if we need to stop network thread
-stop_network_thread = False
-
-# FPS tracking variables
-fps_font = pygame.font.Font(None, 36)
-fps_update_time = 0
-current_fps = 0
-
-# Function to connect to the server
-def connect_to_server():
-    global client_socket, player_id, connection_status, opponent_id
-    
-    try:
-        # Create a socket
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.settimeout(5)  # Set timeout for connection
-        
-        # Connect to the server
-        print(f"Attempting to connect to {server_addr}:{server_port}")
-        client_socket.connect((server_addr, server_port))
-        connection_status = "Connected, waiting for registration..."
-        
-        # Wait for registration message from server
-        message = receive_message()
-        print(f"Received registration message: {message}")
-        
-        if message and message.get("type") == "registration":
-            player_id = message.get("player_id")
-            connection_status = f"Connected as Player {player_id}"
-            
-            # If we're player 2, the other player is player 1
-            opponent_id = "1" if player_id == "2" else "2"
-            
+# Network settings
+DEFAULT_SERVER_ADDR = "localhost"
+DEFAULT_SERVER_PORT = 5678
+CREATE_ROOM_CODE = "NEW"  # Room code that opens a private room
+HEADER_SIZE = protocol.HEADER_SIZE  # Size of message length header
+KEYFRAME_INTERVAL = protocol.KEYFRAME_INTERVAL  # Full state at least every N updates
+USE_UDP = os.environ.get("FVZ_TRANSPORT", "tcp").lower() == "udp"  # Opt in to the UDP fast path
+UDP_REDUNDANCY = protocol.UDP_REDUNDANCY  # Copies of each input carried by later datagrams
+USE_ROLLBACK = os.environ.get("FVZ_NETCODE", "snapshot").lower() == "rollback"  # Opt in to rollback netcode
+ROLLBACK_RESEND_INTERVAL = 1 / socket_server.TICK_RATE  # Seconds between input resends while stalled on UDP
+
+net_log = logs.get_logger("net")
+sync_log = logs.get_logger("sync")
+game_log = logs.get_logger("game")
+
+class GameClient:
+    """The networked game: main menu, waiting screen and match.
+
+    Constructing a client does nothing; start() initializes pygame and opens
+    the window, run() shows the menu and plays until the player quits, and
+    shutdown() stops the network threads and pygame. Assets are loaded the
+    first time a screen needs them, so the menu appears before the sprite
+    sheets and music are loaded.
+    """
+
+    def __init__(self, game_res=None, screen=None):
+        self.game_res = game_res
+        self.screen = screen  # Window to draw in; start() opens one if not given
+        self.clock = None
+
+        # Assets, loaded on first use
+        self.bg_image = None
+        self.fonts = None  # count_font, score_font, menu_font, title_font
+        self.fps_font = None
+        self.sprite_sheets = None  # Sprite sheet (or atlas bundle) by character id
+        self.sounds = None  # Attack sounds by character id
+        self.victory_img = None
+
+        # Game variables
+        self.intro_count = 3
+        self.last_count_update = 0
+        self.score = [0, 0]  # player scores: [P1, P2]
+        self.round_over = False
+        self.round_over_time = 0
+        self.fighter_1 = None
+        self.fighter_2 = None
+
+        # Network variables
+        self.client_socket = None
+        self.player_id = None
+        self.opponent_id = None
+        self.game_started = False
+        self.connection_status = "Not Connected"
+        self.server_addr = DEFAULT_SERVER_ADDR
+        self.server_port = DEFAULT_SERVER_PORT
+        self.room_code = None  # Room to join; None quick-matches, CREATE_ROOM_CODE opens a private room
+        self.frame_reader = protocol.FrameReader()  # Reusable receive buffer for the server stream
+        self.pending_messages = deque()  # Decoded messages from the last read not yet handed out
+        self.codec = protocol.CODEC_JSON  # Wire codec, upgraded during registration
+        self.delta_enabled = False  # Whether the server accepts delta-compressed state updates
+        self.state_encoder = protocol.DeltaEncoder(KEYFRAME_INTERVAL)
+        self.remote_states = {}  # Full player states rebuilt from the server's game_state stream
+        self.udp_socket = None  # Connected UDP socket once the server accepts the udp feature
+        self.udp_token = None
+        self.udp_send_seq = 0
+        self.udp_recv_seq = 0
+        self.input_frame = 0  # Sequence number of the last input we sent
+        self.input_history = deque(maxlen=UDP_REDUNDANCY)  # Our most recent inputs, newest first
+        self.rollback_enabled = False  # Whether the server relays frame-numbered inputs for rollback
+        self.session = None  # RollbackSession driving both fighters once the match starts
+        self.remote_input_queue = deque()  # (frame, input, history) from the network thread, applied by the game loop
+        # Our inputs for the frames before the current one, newest first. Inputs carry the first
+        # MAX_ROLLBACK_FRAMES; resends while stalled carry all of them (see resend_rollback_inputs)
+        self.rollback_history = deque(maxlen=2 * rollback.MAX_ROLLBACK_FRAMES)
+        self.rollback_resend_time = 0.0  # When resend_rollback_inputs last sent
+        self.clock_sync_enabled = False  # Whether the server answers clock pings
+        self.clock_sync = clocksync.ClockSync()  # RTT and server clock offset, updated from pongs
+
+        self.server = None  # Embedded GameServer while this client is hosting
+
+        # Network thread control
+        self.stop_network_thread = False
+        self.network_thread = None
+
+        # FPS tracking variables
+        self.fps_update_time = 0
+        self.current_fps = 0
+        self.current_ping = None  # Smoothed RTT in ms, refreshed with the FPS counter
+        self.profiler = FrameProfiler.from_env()  # Stage timings, see profiler.py
+        self.profile_font = None
+
+    # Lifecycle
+
+    def start(self):
+        """Initialize pygame and open the game window"""
+        pygame.init()
+        if self.game_res is None:
+            self.game_res = GameResources()
+        if self.screen is None:
+            self.screen = pygame.display.set_mode((self.game_res.SCREEN_WIDTH, self.game_res.SCREEN_HEIGHT))
+        pygame.display.set_caption("Flash vs Zippy - Network Edition")
+        self.clock = pygame.time.Clock()
+
+    def run(self):
+        """Show the main menu, connect, and play until the player quits"""
+        if self.clock is None:
+            self.start()
+        try:
+            if self.main_menu() is None:
+                return
+            self.create_fighters()
+            self.connect_and_listen()
+            if self.wait_for_opponent():
+                self.play()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop the network threads, the embedded server and close the window"""
+        self.stop_network()
+        if self.server:
+            self.server.stop()
+            self.server = None
+        trace_path = self.profiler.export()
+        if trace_path:
+            game_log.info("Wrote frame profile to %s", trace_path)
+        pygame.quit()
+        self.screen = None
+
+    # Assets
+
+    def load_menu_assets(self):
+        """Load the background and fonts every screen uses"""
+        if self.bg_image is None:
+            self.bg_image = self.game_res.load_background()
+            self.fonts = self.game_res.load_fonts()
+            self.fps_font = pygame.font.Font(None, 36)
+            self.profile_font = pygame.font.Font(None, 22)
+
+    def load_game_assets(self):
+        """Load the sprite sheets, sounds (starting the music) and victory image a match needs"""
+        if self.sprite_sheets is None:
+            self.sprite_sheets = self.game_res.load_sprite_sheets()
+            self.sounds = self.game_res.initialize_audio()
+            self.victory_img = self.game_res.load_victory_image()
+
+    # Network
+
+    def connect_to_server(self):
+        """Connect, ask for a room and negotiate codec and features"""
+        self.frame_reader = protocol.FrameReader()
+        self.pending_messages.clear()
+        self.codec = protocol.CODEC_JSON
+        self.delta_enabled = False
+        self.state_encoder.reset()
+        self.remote_states = {}
+        if self.udp_socket:
+            self.udp_socket.close()
+        self.udp_socket = None
+        self.udp_token = None
+        self.udp_send_seq = 0
+        self.udp_recv_seq = 0
+        self.input_frame = 0
+        self.input_history.clear()
+        self.rollback_enabled = False
+        self.remote_input_queue.clear()
+        self.rollback_history.clear()
+        self.clock_sync_enabled = False
+        self.clock_sync = clocksync.ClockSync()
+        try:
+            # Create a socket
+            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.client_socket.settimeout(5)  # Set timeout for connection
+
+            # Connect to the server
+            net_log.info("Attempting to connect to %s:%s", self.server_addr, self.server_port)
+            self.client_socket.connect((self.server_addr, self.server_port))
+            self.connection_status = "Connected, waiting for registration..."
+
+            # Ask the server's lobby for a room (older servers ignore this)
+            if self.room_code == CREATE_ROOM_CODE:
+                self.send_message("create_room", {})
+            elif self.room_code:
+                self.send_message("join_room", {"room": self.room_code})
+            else:
+                self.send_message("join_room", {})
+
+            # Wait for registration message from server
+            message = self.receive_message()
+            net_log.debug("Received registration message: %s", message)
+
+            if message and message.get("type") == "registration":
+                self.player_id = message.get("player_id")
+                self.connection_status = f"Connected as Player {self.player_id}"
+                if message.get("room"):
+                    self.connection_status += f" in room {message.get('room')}"
+
+                # If we're player 2, the other player is player 1
+                self.opponent_id = "1" if self.player_id == "2" else "2"
+
+                # Switch to the best codec and features the server offers (old servers offer none)
+                if message.get("codecs"):
+                    chosen_codec = protocol.choose_codec(message.get("codecs"))
+                    features = protocol.choose_features(message.get("features"))
+                    if not (USE_UDP and message.get("udp_token") is not None):
+                        features = [f for f in features if f != protocol.FEATURE_UDP]
+                    if not USE_ROLLBACK:
+                        features = [f for f in features if f != protocol.FEATURE_ROLLBACK]
+                    if self.send_message("codec", {"codec": chosen_codec, "features": features}):
+                        self.codec = chosen_codec
+                        self.delta_enabled = protocol.FEATURE_DELTA in features
+                        self.rollback_enabled = protocol.FEATURE_ROLLBACK in features
+                        self.clock_sync_enabled = protocol.FEATURE_CLOCK in features
+                        net_log.info("Using %s codec, features: %s", self.codec, features)
+                        if protocol.FEATURE_UDP in features:
+                            self.open_udp_socket(message.get("udp_token"), message.get("udp_port", self.server_port))
+
+                return True
+            elif message and message.get("type") == "error":
+                self.connection_status = f"Server error: {message.get('message', 'Unknown error')}"
+                return False
+            else:
+                self.connection_status = "Connection error: Registration failed"
+                return False
+
+        except socket.timeout:
+            self.connection_status = "Connection timed out"
+            if self.client_socket:
+                self.client_socket.close()
+                self.client_socket = None
+            return False
+
+        except Exception as e:
+            self.connection_status = f"Connection error: {str(e)}"
+            if self.client_socket:
+                self.client_socket.close()
+                self.client_socket = None
+            return False
+
+    def connect_and_listen(self):
+        """Connect to the server and start the network thread; returns whether it worked"""
+        connected = self.connect_to_server()
+        if connected:
+            self.stop_network_thread = False
+            self.network_thread = threading.Thread(target=self.network_thread_function)
+            self.network_thread.daemon = True
+            self.network_thread.start()
+        return connected
+
+    def stop_network(self):
+        """Stop the network thread and close the connection"""
+        self.stop_network_thread = True
+        if self.network_thread and self.network_thread.is_alive():
+            self.network_thread.join(1)  # Wait for thread to end with timeout
+        if self.client_socket:
+            try:
+                self.client_socket.close()
+                self.client_socket = None
+            except:
+                pass
+
+    def host_server(self):
+        """Start an embedded server on a background thread; returns once it accepts connections"""
+        if self.server:
             return True
-        else:
-            connection_status = "Connection error: Registration failed"
+        server = socket_server.GameServer(port=DEFAULT_SERVER_PORT)
+        try:
+            server.start_in_thread()
+        except (OSError, TimeoutError) as e:
+            # Usually a server is already running on this port; join that one instead
+            net_log.error("Could not start embedded server: %s", e)
             return False
-            
-    except socket.timeout:
-        connection_status = "Connection timed out"
-        if client_socket:
-            client_socket.close()
-            client_socket = None
-        return False
-        
-    except Exception as e:
-        connection_status = f"Connection error: {str(e)}"
-        if client_socket:
-            client_socket.close()
-            client_socket = None
-        return False
-
-# Function to send a message to the server
-def send_message(message_type, data):
-    global client_socket
-    
-    if not client_socket:
-        print(f"Cannot send {message_type} message: socket not connected")
-        return False
-    
-    try:
-        # Create the message
-        message = {
-            "type": message_type,
-            **data
-        }
-        
-        # Convert to JSON
-        json_data = json.dumps(message)
-        
-        # Add header with message length
-        msg_length = len(json_data)
-        header = f"{msg_length:<{HEADER_SIZE}}"
-        full_message = header + json_data
-        
-        # Send the message
-        client_socket.sendall(full_message.encode('utf-8'))
+        self.server = server
         return True
-        
-    except ConnectionResetError:
-        print(f"Connection reset while sending {message_type} message")
-        return False
-    except ConnectionAbortedError:
-        print(f"Connection aborted while sending {message_type} message")
-        return False
-    except BrokenPipeError:
-        print(f"Broken pipe while sending {message_type} message")
-        return False
-    except Exception as e:
-        print(f"Error sending {message_type} message: {str(e)}")
-        return False
-
-# Function to receive a message from the server
-def receive_message():
-    global client_socket
-    
-    if not client_socket:
-        return None
-    
-    try:
-        # Receive the header (message length)
-        header = client_socket.recv(HEADER_SIZE)
-        if not header:
-            print("No header received")
-            return None
-        
+
+    def open_udp_socket(self, token, port):
+        """Set up the UDP fast path for inputs and state"""
+        try:
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.connect((self.server_addr, port))
+            self.udp_socket.settimeout(0.5)
+            self.udp_token = token
+            # The server learns our address from this; send a few in case some are lost
+            for _ in range(UDP_REDUNDANCY):
+                self.send_datagram({"type": "udp_hello"})
+            net_log.info("UDP transport enabled on port %s", port)
+        except OSError as e:
+            net_log.warning("UDP unavailable, staying on TCP: %s", e)
+            self.udp_socket = None
+
+    def send_datagram(self, message, copies=1):
+        """Send an unreliable message over UDP"""
+        for _ in range(copies):
+            self.udp_send_seq += 1
+            self.udp_socket.send(protocol.encode_datagram(self.udp_token, self.udp_send_seq, message, self.codec))
+        return True
+
+    def send_message(self, message_type, data):
+        """Send a message to the server"""
+        if not self.client_socket:
+            net_log.warning("Cannot send %s message: socket not connected", message_type)
+            return False
+
         try:
-            # Parse the message length
-            message_length = int(header.decode('utf-8').strip())
-            print(f"Receiving message of length {message_length}")
-        except ValueError:
-            print(f"Invalid header received: {header}")
+            # Create the message
+            message = {
+                "type": message_type,
+                **data
+            }
+
+            # Inputs and state go over UDP when enabled; everything else stays on TCP
+            if self.udp_socket and message_type in protocol.UDP_MESSAGE_TYPES:
+                copies = 1
+                if message_type == "input" and "frame" not in message:
+                    # Carry the last few inputs so one lost datagram loses nothing
+                    self.input_frame += 1
+                    message["frame"] = self.input_frame
+                    message["history"] = list(self.input_history)
+                    self.input_history.appendleft(message["input"])
+                elif message.get("priority") == "high":
+                    copies = UDP_REDUNDANCY
+                return self.send_datagram(message, copies)
+
+            # Encode with the negotiated codec and add the length header
+            self.client_socket.sendall(protocol.encode_message(message, self.codec))
+            return True
+
+        except ConnectionResetError:
+            net_log.error("Connection reset while sending %s message", message_type)
+            return False
+        except ConnectionAbortedError:
+            net_log.error("Connection aborted while sending %s message", message_type)
+            return False
+        except BrokenPipeError:
+            net_log.error("Broken pipe while sending %s message", message_type)
+            return False
+        except Exception as e:
+            net_log.error("Error sending %s message: %s", message_type, e)
+            return False
+
+    def send_state_update(self, state, priority=None):
+        """Send our fighter's state, delta-compressed when the server supports it"""
+        data = {"state": state}
+        # Deltas need in-order delivery, so UDP always sends full states
+        if self.delta_enabled and not self.udp_socket:
+            data["state"], is_delta = self.state_encoder.encode(state)
+            if is_delta:
+                if not data["state"] and priority is None:
+                    return True  # Nothing changed since the last update
+                data["delta"] = True
+        if priority:
+            data["priority"] = priority
+        return self.send_message("state_update", data)
+
+    def receive_message(self):
+        """Receive the next message from the server"""
+        if not self.client_socket:
             return None
-        
-        # Receive the actual message
-        full_message = b""
-        bytes_received = 0
-        
-        while bytes_received < message_length:
-            chunk = client_socket.recv(min(BUFFER_SIZE, message_length - bytes_received))
-            if not chunk:
-                print("Connection closed while receiving message")
-                return None
-            
-            full_message += chunk
-            bytes_received += len(chunk)
-        
-        # Parse the message as JSON
+
         try:
-            message = json.loads(full_message.decode('utf-8'))
-            print(f"Received message: {message}")
+            # Read until at least one complete frame is buffered; partial headers
+            # and payloads stay in the frame reader until the rest arrives
+            while not self.pending_messages:
+                if self.frame_reader.recv_into(self.client_socket) == 0:
+                    net_log.info("Connection closed by server")
+                    return None
+
+                for payload in self.frame_reader.frames():
+                    # Decode the message (binary or JSON, detected per payload)
+                    try:
+                        self.pending_messages.append(protocol.decode_payload(payload))
+                    except protocol.ProtocolError as e:
+                        net_log.warning("Invalid message received: %r (%s)", bytes(payload), e)
+
+            message = self.pending_messages.popleft()
+            net_log.debug("Received message: %s", message)
             return message
-        except json.JSONDecodeError as e:
-            print(f"Invalid JSON received: {full_message}")
-            print(f"JSON error: {e}")
+
+        except protocol.ProtocolError as e:
+            # A bad length header means the stream can no longer be framed
+            net_log.error("%s", e)
             return None
-        
-    except Exception as e:
-        print(f"Error receiving message: {str(e)}")
-        return None
-
-# Function to listen for messages from the server
-def network_thread_function():
-    global client_socket, game_started, round_over, fighter_1, fighter_2, stop_network_thread, connection_status, round_over_time
-    
-    while not stop_network_thread:
-        try:
-            if not client_socket:
-                print("Socket disconnected")
-                connection_status = "Disconnected from server"
-                break
-                
-            # Receive message from server
-            message = receive_message()
-            
-            if not message:
-                # No message received or connection closed
-                time.sleep(0.1)  # Small delay to prevent CPU spinning
-                continue
-            
-            # Process message based on type
-            msg_type = message.get("type", "")
-            
-            if msg_type == "game_start":
-                print("Game start message received")
-                game_started = True
-                
-            elif msg_type == "opponent_input":
-                # Update opponent's input
-                input_data = message.get("input", {})
-                
-                # Make sure we apply the input to the non-local fighter
-                if player_id == "1":
-                    # We're player 1, so opponent is player 2 (fighter_2)
-                    if not fighter_2.is_local:  # Double-check that fighter_2 is indeed non-local
-                        fighter_2.set_remote_input(input_data)
-                        print(f"Received remote input for fighter_2: {input_data}")
-                else:
-                    # We're player 2, so opponent is player 1 (fighter_1)
-                    if not fighter_1.is_local:  # Double-check that fighter_1 is indeed non-local
-                        fighter_1.set_remote_input(input_data)
-                        print(f"Received remote input for fighter_1: {input_data}")
-                
-                # Debug log the remote input to check if attack signals are coming through
-                if input_data.get("attack1") or input_data.get("attack2"):
-                    print(f"Remote attack input received: {input_data}")
-                    
-            elif msg_type == "game_state":
-                # Update game state from server
-                states = message.get("player_states", {})
-                print(f'🙉 {states}')
-                
-                # Update round_over state from server
-                server_round_over = message.get("round_over", False)
-                if server_round_over != round_over:
-                    round_over = server_round_over
-                    print(f"Round over state updated from server: {round_over}")
-                    if round_over:
-                        # Set round_over_time when we first receive the round_over flag
-                        round_over_time = pygame.time.get_ticks()
-                
-                # Update fighter states
-                if "1" in states and "2" in states:
-                    fighter_1.set_state(states.get("1", {}))
-                    fighter_2.set_state(states.get("2", {}))
-                    print(f"❄️ Sync update: P1 = {fighter_1.health}, P2 = {fighter_2.health}")
-            elif msg_type == "state_update":
-                # Process individual state update
-                state = message.get("state", {})
-                target_player_id = message.get("player_id")
-                
-                # Only apply the update if it's for a specific fighter
-                if target_player_id == "1":
-                    old_health = fighter_1.health
-                    fighter_1.set_state(state)
-                    if fighter_1.health < old_health:
-                        print(f"🦅🚀Direct health update: Player 1 health changed from {old_health} to {fighter_1.health}")
-                elif target_player_id == "2":
-                    old_health = fighter_2.health
-                    fighter_2.set_state(state)
-                    if fighter_2.health < old_health:
-                        print(f"🐿️🚀Direct health update: Player 2 health changed from {old_health} to {fighter_2.health}")
-            
-            elif msg_type == "error":
-                connection_status = f"Server error: {message.get('message', 'Unknown error')}"
-                print(f"Received error from server: {connection_status}")
-            
         except Exception as e:
-            print(f"Network thread error: {str(e)}")
-            connection_status = f"Connection error: {str(e)}"
-            time.sleep(0.5)  # Small delay before potentially retrying
-    
-    # Clean up if thread is stopping
-    if client_socket:
-        try:
-            client_socket.close()
-            client_socket = None
-        except:
-            pass
-        finally:
-            print("Network thread stopped, socket closed")
-
-# Main menu screen for host/join options
-def main_menu():
-    global server_addr, server_port
-    
-    menu_running = True
-    host_option = True  # True = Host, False = Join
-    input_active = False
-    input_text = f"{server_addr}:{server_port}"
-    
-    while menu_running:
-        # Draw background
-        game_res.draw_bg(screen, bg_image)
-        
-        # Draw menu options
-        game_res.draw_text(screen, "Flash vs Zippy", title_font, game_res.YELLOW, 300, 130)
-        
-        # Host/Join options
-        pygame.draw.rect(screen, game_res.WHITE if host_option else game_res.BLACK, (300, 220, 400, 50), 0)
-        pygame.draw.rect(screen, game_res.YELLOW if host_option else game_res.BLACK, (300, 220, 400, 50), 2)
-        game_res.draw_text(screen, "HOST GAME (SERVER)", menu_font, game_res.BLACK if host_option else game_res.WHITE, 310, 230)
-        
-        pygame.draw.rect(screen, game_res.WHITE if not host_option else game_res.BLACK, (300, 300, 400, 50), 0)
-        pygame.draw.rect(screen, game_res.YELLOW if not host_option else game_res.BLACK, (300, 300, 400, 50), 2)
-        game_res.draw_text(screen, "JOIN GAME (CLIENT)", menu_font, game_res.BLACK if not host_option else game_res.WHITE, 310, 310)
-        
-        # Server address input
-        if not host_option:
-            pygame.draw.rect(screen, game_res.WHITE, (250, 370, 500, 40))
-            
-            if input_active:
-                pygame.draw.rect(screen, game_res.YELLOW, (250, 370, 500, 40), 3)
+            net_log.error("Error receiving message: %s", e)
+            return None
+
+    def handle_server_message(self, message):
+        """Apply one message from the server, whichever transport it came on"""
+        fighter_1, fighter_2 = self.fighter_1, self.fighter_2
+
+        # Process message based on type
+        msg_type = message.get("type", "")
+
+        if msg_type == "game_start":
+            game_log.info("Game start message received")
+            self.game_started = True
+
+        elif msg_type == "opponent_input" and self.rollback_enabled and "frame" in message:
+            # Rollback inputs are applied by the game loop, which owns the simulation
+            self.remote_input_queue.append((message["frame"], message.get("input", {}), message.get("history", [])))
+
+        elif msg_type == "opponent_input":
+            # Update opponent's input
+            input_data = message.get("input", {})
+
+            # Make sure we apply the input to the non-local fighter
+            if self.player_id == "1":
+                # We're player 1, so opponent is player 2 (fighter_2)
+                if not fighter_2.is_local:  # Double-check that fighter_2 is indeed non-local
+                    fighter_2.set_remote_input(input_data)
+                    sync_log.debug("Received remote input for fighter_2: %s", input_data)
             else:
-                pygame.draw.rect(screen, game_res.BLACK, (250, 370, 500, 40), 3)
-                
-            game_res.draw_text(screen, input_text, menu_font, game_res.BLACK, 260, 375)
-            game_res.draw_text(screen, "Server Address:", menu_font, game_res.WHITE, 260, 340)
-        
-        # Start button
-        pygame.draw.rect(screen, game_res.RED, (400, 450, 200, 60))
-        pygame.draw.rect(screen, game_res.YELLOW, (400, 450, 200, 60), 2)
-        game_res.draw_text(screen, "START", menu_font, game_res.WHITE, 440, 465)
-        
-        # Handle events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-                
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                # Check if Host/Join options were clicked
-                mx, my = pygame.mouse.get_pos()
-                
-                # Host option
-                if 300 <= mx <= 700 and 220 <= my <= 270:
-                    host_option = True
-                    
-                # Join option
-                elif 300 <= mx <= 700 and 300 <= my <= 350:
-                    host_option = False
-                    
-                # Server address input field
-                elif not host_option and 250 <= mx <= 750 and 370 <= my <= 410:
-                    input_active = True
+                # We're player 2, so opponent is player 1 (fighter_1)
+                if not fighter_1.is_local:  # Double-check that fighter_1 is indeed non-local
+                    fighter_1.set_remote_input(input_data)
+                    sync_log.debug("Received remote input for fighter_1: %s", input_data)
+
+            # Debug log the remote input to check if attack signals are coming through
+            if input_data.get("attack1") or input_data.get("attack2"):
+                sync_log.debug("Remote attack input received: %s", input_data)
+
+        elif msg_type in ("game_state", "state_update") and self.rollback_enabled:
+            # Both fighters are simulated locally from inputs; snapshots would fight the rollback
+            pass
+
+        elif msg_type == "game_state":
+            # Update game state from server
+            states = message.get("player_states", {})
+            if message.get("delta"):
+                # Merge changed fields into the last full states we received
+                states = protocol.apply_player_states_delta(self.remote_states, states)
+            self.remote_states = states
+            sync_log.debug("Player states: %s", states)
+
+            # Update round_over state from server
+            server_round_over = message.get("round_over", False)
+            if server_round_over != self.round_over:
+                self.round_over = server_round_over
+                game_log.info("Round over state updated from server: %s", self.round_over)
+                if self.round_over:
+                    # Set round_over_time when we first receive the round_over flag
+                    self.round_over_time = pygame.time.get_ticks()
+
+            # Update fighter states
+            if "1" in states and "2" in states:
+                fighter_1.set_state(states.get("1", {}))
+                fighter_2.set_state(states.get("2", {}))
+                sync_log.debug("Sync update: P1 = %s, P2 = %s", fighter_1.health, fighter_2.health)
+        elif msg_type == "state_update":
+            # Process individual state update
+            state = message.get("state", {})
+            target_player_id = message.get("player_id")
+
+            # Only apply the update if it's for a specific fighter
+            if target_player_id == "1":
+                old_health = fighter_1.health
+                fighter_1.set_state(state)
+                if fighter_1.health < old_health:
+                    sync_log.info("Direct health update: Player 1 health changed from %s to %s", old_health, fighter_1.health)
+            elif target_player_id == "2":
+                old_health = fighter_2.health
+                fighter_2.set_state(state)
+                if fighter_2.health < old_health:
+                    sync_log.info("Direct health update: Player 2 health changed from %s to %s", old_health, fighter_2.health)
+
+        elif msg_type == "pong":
+            self.clock_sync.on_pong(message)
+
+        elif msg_type == "error":
+            self.connection_status = f"Server error: {message.get('message', 'Unknown error')}"
+            net_log.error("Received error from server: %s", self.connection_status)
+
+    def udp_thread_function(self):
+        """Receive datagrams from the server while UDP is enabled"""
+        while not self.stop_network_thread and self.udp_socket:
+            try:
+                data = self.udp_socket.recv(protocol.MAX_DATAGRAM_SIZE)
+                token, seq, message = protocol.decode_datagram(data)
+                if token != self.udp_token or seq <= self.udp_recv_seq:
+                    continue  # Not ours, duplicate or arrived out of order
+                self.udp_recv_seq = seq
+                self.handle_server_message(message)
+            except socket.timeout:
+                continue
+            except protocol.ProtocolError as e:
+                net_log.warning("Invalid datagram received: %s", e)
+            except Exception as e:
+                net_log.error("UDP thread error: %s", e)
+                time.sleep(0.5)
+
+    def network_thread_function(self):
+        """Listen for messages from the server"""
+        if self.udp_socket:
+            threading.Thread(target=self.udp_thread_function, daemon=True).start()
+
+        while not self.stop_network_thread:
+            try:
+                if not self.client_socket:
+                    net_log.info("Socket disconnected")
+                    self.connection_status = "Disconnected from server"
+                    break
+
+                # Receive message from server
+                message = self.receive_message()
+
+                if not message:
+                    # No message received or connection closed
+                    time.sleep(0.1)  # Small delay to prevent CPU spinning
+                    continue
+
+                self.handle_server_message(message)
+
+            except Exception as e:
+                net_log.error("Network thread error: %s", e)
+                self.connection_status = f"Connection error: {str(e)}"
+                time.sleep(0.5)  # Small delay before potentially retrying
+
+        # Clean up if thread is stopping
+        if self.udp_socket:
+            self.udp_socket.close()
+            self.udp_socket = None
+        if self.client_socket:
+            try:
+                self.client_socket.close()
+                self.client_socket = None
+            except:
+                pass
+            finally:
+                net_log.info("Network thread stopped, socket closed")
+
+    # Screens
+
+    def main_menu(self):
+        """Main menu screen for host/join options; returns host_option, or None if the window was closed"""
+        game_res, screen = self.game_res, self.screen
+        self.load_menu_assets()
+        _, _, menu_font, title_font = self.fonts
+
+        menu_running = True
+        host_option = True  # True = Host, False = Join
+        input_active = False
+        input_text = f"{self.server_addr}:{self.server_port}"
+
+        while menu_running:
+            # Draw background
+            game_res.draw_bg(screen, self.bg_image)
+
+            # Draw menu options
+            game_res.draw_text(screen, "Flash vs Zippy", title_font, game_res.YELLOW, 300, 130)
+
+            # Host/Join options
+            game_res.draw_box(screen, game_res.WHITE if host_option else game_res.BLACK, (300, 220, 400, 50), 0)
+            game_res.draw_box(screen, game_res.YELLOW if host_option else game_res.BLACK, (300, 220, 400, 50), 2)
+            game_res.draw_text(screen, "HOST GAME (SERVER)", menu_font, game_res.BLACK if host_option else game_res.WHITE, 310, 230)
+
+            game_res.draw_box(screen, game_res.WHITE if not host_option else game_res.BLACK, (300, 300, 400, 50), 0)
+            game_res.draw_box(screen, game_res.YELLOW if not host_option else game_res.BLACK, (300, 300, 400, 50), 2)
+            game_res.draw_text(screen, "JOIN GAME (CLIENT)", menu_font, game_res.BLACK if not host_option else game_res.WHITE, 310, 310)
+
+            # Server address input
+            if not host_option:
+                game_res.draw_box(screen, game_res.WHITE, (250, 370, 500, 40))
+
+                if input_active:
+                    game_res.draw_box(screen, game_res.YELLOW, (250, 370, 500, 40), 3)
                 else:
-                    input_active = False
-                    
-                # Start button
-                if 400 <= mx <= 600 and 450 <= my <= 510:
-                    if host_option:
-                        # Launch the server in a separate process
-                        import subprocess
-                        subprocess.Popen([sys.executable, os.path.join(game_res.base_path, "socket_server.py")])
-                        # Give the server a moment to start
-                        pygame.time.delay(1000)
-                        # Set server address to localhost
-                        server_addr = "localhost"
-                        server_port = 5678
+                    game_res.draw_box(screen, game_res.BLACK, (250, 370, 500, 40), 3)
+
+                game_res.draw_text(screen, input_text, menu_font, game_res.BLACK, 260, 375)
+                game_res.draw_text(screen, "Server Address (host:port/ROOM):", menu_font, game_res.WHITE, 260, 340)
+
+            # Start button
+            game_res.draw_box(screen, game_res.RED, (400, 450, 200, 60))
+            game_res.draw_box(screen, game_res.YELLOW, (400, 450, 200, 60), 2)
+            game_res.draw_text(screen, "START", menu_font, game_res.WHITE, 440, 465)
+
+            # Handle events
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return None
+
+                elif event.type == pygame.MOUSEBUTTONDOWN:
+                    # Check if Host/Join options were clicked
+                    mx, my = pygame.mouse.get_pos()
+
+                    # Host option
+                    if 300 <= mx <= 700 and 220 <= my <= 270:
+                        host_option = True
+
+                    # Join option
+                    elif 300 <= mx <= 700 and 300 <= my <= 350:
+                        host_option = False
+
+                    # Server address input field
+                    elif not host_option and 250 <= mx <= 750 and 370 <= my <= 410:
+                        input_active = True
                     else:
-                        # Parse the entered server address
-                        try:
-                            if ":" in input_text:
-                                parts = input_text.split(":")
-                                server_addr = parts[0]
-                                server_port = int(parts[1])
-                            else:
-                                server_addr = input_text
-                                server_port = 5678
-                        except:
-                            server_addr = "localhost"
-                            server_port = 5678
-                    
-                    # Start the game
-                    menu_running = False
-                    
-            elif event.type == pygame.KEYDOWN and input_active:
-                # Handle text input for server address
-                if event.key == pygame.K_RETURN:
-                    input_active = False
-                elif event.key == pygame.K_BACKSPACE:
-                    input_text = input_text[:-1]
-                elif event.key == pygame.K_ESCAPE:
-                    input_active = False
-                else:
-                    input_text += event.unicode
-        
-        pygame.display.update()
-        clock.tick(game_res.FPS)
-    
-    return host_option
-
-# Show the main menu
-is_host = main_menu()
-
-# Create fighters
-# The local player controls fighter_1 if they are player_id 1
-# and fighter_2 if they are player_id 2
-fighter_1 = Fighter(1, 200, 310, True, game_res.ZIPPY_DATA, zippy_sheet, game_res.ZIPPY_ANIMATION_STEPS, 
-                   (zippy_attack1_fx, zippy_attack2_fx), True, score_font)
-fighter_2 = Fighter(2, 700, 310, False, game_res.FLASH_DATA, flash_sheet, game_res.FLASH_ANIMATION_STEPS, 
-                   (flash_attack1_fx, flash_attack2_fx), False, score_font)
-
-# Connect to server and start network thread
-connected = connect_to_server()
-if connected:
-    # Start network thread
-    stop_network_thread = False
-    network_thread = threading.Thread(target=network_thread_function)
-    network_thread.daemon = True
-    network_thread.start()
-
-# Wait for network connection to complete
-waiting_for_connection = True
-waiting_start_time = pygame.time.get_ticks()
-
-while waiting_for_connection and connected:
-    # Draw background
-    game_res.draw_bg(screen, bg_image)
-    
-    # Show connection status
-    game_res.draw_text(screen, connection_status, menu_font, game_res.WHITE, 250, 250)
-    
-    # Check if game has started or if we need to timeout
-    if game_started:
-        waiting_for_connection = False
-    
-    # Check for timeout (10 seconds)
-    current_time = pygame.time.get_ticks()
-    if current_time - waiting_start_time > 10000:
-        game_res.draw_text(screen, "Waiting for opponent. Check server address.", menu_font, game_res.RED, 150, 350)
-        game_res.draw_text(screen, "Press ESC to return to menu or SPACE to continue waiting", menu_font, game_res.WHITE, 120, 400)
-        
-        # Check for input
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                stop_network_thread = True
-                if network_thread and network_thread.is_alive():
-                    network_thread.join(1)  # Wait for thread to end with timeout
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    # Return to menu
-                    stop_network_thread = True
-                    if network_thread and network_thread.is_alive():
-                        network_thread.join(1)  # Wait for thread to end with timeout
-                    if client_socket:
-                        try:
-                            client_socket.close()
-                            client_socket = None
-                        except:
-                            pass
-                    is_host = main_menu()
-                    connected = connect_to_server()
-                    if connected:
-                        stop_network_thread = False
-                        network_thread = threading.Thread(target=network_thread_function)
-                        network_thread.daemon = True
-                        network_thread.start()
-                    waiting_start_time = pygame.time.get_ticks()
-                elif event.key == pygame.K_SPACE:
-                    # Continue waiting
-                    waiting_start_time = pygame.time.get_ticks()
-    
-    # Update display and handle events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            stop_network_thread = True
-            if network_thread and network_thread.is_alive():
-                network_thread.join(1)  # Wait for thread to end with timeout
-            pygame.quit()
-            sys.exit()
-    
-    pygame.display.update()
-    clock.tick(game_res.FPS)
-# Set ranged attack cooldown (in milliseconds)
-RANGED_ATTACK_COOLDOWN = 3000  # 3 seconds cooldown for ranged attack
-fighter_1.ranged_cooldown = 0
-fighter_2.ranged_cooldown = 0
-fighter_1.last_ranged_time = 0
-fighter_2.last_ranged_time = 0
-# Adjust fighter instances based on player ID
-if player_id == "2":
-    # If we're player 2, swap the is_local flags
-    fighter_1.is_local = False
-    fighter_2.is_local = True
-
-# Game loop
-run = True
-last_health_check = [100, 100]  # Store last health values for both fighters
-last_sent_update_time = 0
-force_update_health = False
-round_over_time = 0  # Initialize round_over_time variable
-
-while run:
-    clock.tick(game_res.FPS)
-    current_time = pygame.time.get_ticks()
-
-    # Draw background
-    game_res.draw_bg(screen, bg_image)
-
-    # Show connection status if not connected
-    if not connected or not client_socket:
-        game_res.draw_text(screen, "Not connected to server", menu_font, game_res.RED, 300, 200)
-        game_res.draw_text(screen, "Press ESC to return to menu", menu_font, game_res.WHITE, 300, 250)
-    else:
-        # Show player stats
-        
-        game_res.draw_health_bar(screen, fighter_1.health, 20, 20)
-        game_res.draw_health_bar(screen, fighter_2.health, 580, 20)
-           
-        game_res.draw_text(screen, "P1: " + str(score[0]), score_font, game_res.BLACK, 22, 62)
-        game_res.draw_text(screen, "P2: " + str(score[1]), score_font, game_res.BLACK, 582, 62)
-        game_res.draw_text(screen, "P1: " + str(score[0]), score_font, game_res.WHITE, 20, 60)
-        game_res.draw_text(screen, "P2: " + str(score[1]), score_font, game_res.WHITE, 580, 60)
-       
-        print(f'🐿️♻️ P1 health: {fighter_1.health} ')
-        print(f'🦅🔥 P2 health: {fighter_2.health} ')
-
-        # Show which player you are
-        if player_id:
-            game_res.draw_text(screen, f"You are Player {player_id}", score_font, game_res.WHITE, 400, 20)
-
-        # Update countdown
-         # Draw ranged attack cooldown indicators
-    # Player 1 cooldown
-        if fighter_1.last_ranged_time > 0:
-            cooldown_remaining = (RANGED_ATTACK_COOLDOWN - (current_time - fighter_1.last_ranged_time)) / 1000
-            if cooldown_remaining <= 0:
-                cooldown_text = "Ranged: READY"
-                cooldown_color = game_res.GREEN
-                fighter_1.ranged_cooldown = 0
-            else:
-                cooldown_text = f"Ranged: {cooldown_remaining:.1f}s"
-                cooldown_color = game_res.RED
-                fighter_1.ranged_cooldown = 1
+                        input_active = False
+
+                    # Start button
+                    if 400 <= mx <= 600 and 450 <= my <= 510:
+                        if host_option:
+                            # Run the server in this process and connect once it is listening
+                            self.host_server()
+                            # Set server address to localhost
+                            self.server_addr = DEFAULT_SERVER_ADDR
+                            self.server_port = DEFAULT_SERVER_PORT
+                            self.room_code = None
+                        else:
+                            # Parse the entered server address, with an optional room code after a slash
+                            address_text, _, room_text = input_text.partition("/")
+                            self.room_code = room_text.strip().upper() or None
+                            try:
+                                if ":" in address_text:
+                                    parts = address_text.split(":")
+                                    self.server_addr = parts[0]
+                                    self.server_port = int(parts[1])
+                                else:
+                                    self.server_addr = address_text
+                                    self.server_port = DEFAULT_SERVER_PORT
+                            except:
+                                self.server_addr = DEFAULT_SERVER_ADDR
+                                self.server_port = DEFAULT_SERVER_PORT
+
+                        # Start the game
+                        menu_running = False
+
+                elif event.type == pygame.KEYDOWN and input_active:
+                    # Handle text input for server address
+                    if event.key == pygame.K_RETURN:
+                        input_active = False
+                    elif event.key == pygame.K_BACKSPACE:
+                        input_text = input_text[:-1]
+                    elif event.key == pygame.K_ESCAPE:
+                        input_active = False
+                    else:
+                        input_text += event.unicode
+
+            game_res.update_display()
+            self.clock.tick(game_res.FPS)
+
+        return host_option
+
+    def wait_for_opponent(self):
+        """Waiting screen until the server starts the game; returns False if the player quit"""
+        game_res, screen = self.game_res, self.screen
+        menu_font = self.fonts[2]
+
+        waiting_start_time = pygame.time.get_ticks()
+
+        while self.client_socket or self.network_thread and self.network_thread.is_alive():
+            # Draw background
+            game_res.draw_bg(screen, self.bg_image)
+
+            # Show connection status
+            game_res.draw_text(screen, self.connection_status, menu_font, game_res.WHITE, 250, 250)
+
+            # Check if game has started or if we need to timeout
+            if self.game_started:
+                return True
+
+            # Check for timeout (10 seconds)
+            current_time = pygame.time.get_ticks()
+            if current_time - waiting_start_time > 10000:
+                game_res.draw_text(screen, "Waiting for opponent. Check server address.", menu_font, game_res.RED, 150, 350)
+                game_res.draw_text(screen, "Press ESC to return to menu or SPACE to continue waiting", menu_font, game_res.WHITE, 120, 400)
+
+                # Check for input
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        return False
+                    elif event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_ESCAPE:
+                            # Return to menu
+                            self.stop_network()
+                            if self.main_menu() is None:
+                                return False
+                            self.connect_and_listen()
+                            waiting_start_time = pygame.time.get_ticks()
+                        elif event.key == pygame.K_SPACE:
+                            # Continue waiting
+                            waiting_start_time = pygame.time.get_ticks()
+
+            # Update display and handle events
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return False
+
+            game_res.update_display()
+            self.clock.tick(game_res.FPS)
+
+        # Not connected; the game screen explains and lets the player leave
+        return True
+
+    # Match
+
+    def create_fighters(self, is_fighter1_local=True, is_fighter2_local=False):
+        """Create both fighters
+
+        The local player controls fighter_1 if they are player_id 1
+        and fighter_2 if they are player_id 2
+        """
+        self.load_game_assets()
+        # Hand the old fighters' projectiles back to the pool for the next round
+        for fighter in (self.fighter_1, self.fighter_2):
+            if fighter:
+                fighter.release_projectiles()
+        self.fighter_1 = self.new_fighter(1, 200, 310, True, is_fighter1_local)
+        self.fighter_2 = self.new_fighter(2, 700, 310, False, is_fighter2_local)
+
+    def new_fighter(self, player, x, y, flip, is_local):
+        """Create the fighter for player 1 or 2 as their character in the manifest's roster"""
+        character = characters.for_player(player)
+        return Fighter(player, x, y, flip, character.data, self.sprite_sheets[character.id], character.animation_steps,
+                       self.sounds[character.id], is_local, self.fonts[1], character.id)
+
+    def ranged_cooldown_status(self, fighter, current_time):
+        """Work out the ranged attack cooldown text for a fighter"""
+        game_res = self.game_res
+        if self.rollback_enabled:
+            # The simulation counts the cooldown down in frames
+            cooldown_remaining = fighter.ranged_cooldown / simulation.SIM_FPS
+        elif fighter.last_ranged_time > 0:
+            # The character's cooldown is in simulation frames, the shot time in ms
+            cooldown_ms = fighter.stats.ranged_cooldown * 1000 / simulation.SIM_FPS
+            cooldown_remaining = (cooldown_ms - (current_time - fighter.last_ranged_time)) / 1000
+            fighter.ranged_cooldown = 0 if cooldown_remaining <= 0 else 1
         else:
-            cooldown_text = "Ranged: READY"
-            cooldown_color = game_res.GREEN
-            fighter_1.ranged_cooldown = 0
-        
-        game_res.draw_text(screen, cooldown_text, score_font, game_res.BLACK, 22, 92)
-        game_res.draw_text(screen, cooldown_text, score_font, cooldown_color, 20, 90)
-        
-        # Player 2 cooldown
-        if fighter_2.last_ranged_time > 0:
-            cooldown_remaining = (RANGED_ATTACK_COOLDOWN - (current_time - fighter_2.last_ranged_time)) / 1000
-            if cooldown_remaining <= 0:
-                cooldown_text = "Ranged: READY"
-                cooldown_color = game_res.GREEN
-                fighter_2.ranged_cooldown = 0
+            cooldown_remaining = 0
+            fighter.ranged_cooldown = 0
+
+        if cooldown_remaining <= 0:
+            return "Ranged: READY", game_res.GREEN
+        return f"Ranged: {cooldown_remaining:.1f}s", game_res.RED
+
+    def advance_rollback(self):
+        """Run one rollback frame: apply remote inputs, repair mispredictions, step ahead"""
+        session = self.session
+        while self.remote_input_queue:
+            session.add_remote_input(*self.remote_input_queue.popleft())
+        session.resolve()
+
+        if not session.can_advance():
+            # Too far ahead of the opponent; wait for their inputs
+            self.resend_rollback_inputs(session.frame)
+            return
+
+        local_fighter = self.fighter_1 if self.player_id == "1" else self.fighter_2
+        local_input = local_fighter.get_input()
+        frame = session.frame
+        session.advance(local_input)
+        history = list(self.rollback_history)[:rollback.MAX_ROLLBACK_FRAMES]
+        self.send_message("input", {"input": local_input, "frame": frame, "history": history})
+        self.rollback_history.appendleft(local_input)
+
+    def resend_rollback_inputs(self, frame):
+        """Repeat our newest input, once per server tick, while stalled before frame
+
+        Over UDP the opponent may be stalled too, waiting for inputs whose
+        datagrams were lost; then neither side would send again. Each side
+        stops MAX_ROLLBACK_FRAMES past its last confirmed remote input, so
+        the opponent lacks at most twice that many of ours, which the
+        resend's history covers. Over TCP nothing is lost.
+        """
+        now = time.monotonic()
+        if not self.udp_socket or not self.rollback_history or now - self.rollback_resend_time < ROLLBACK_RESEND_INTERVAL:
+            return
+        self.rollback_resend_time = now
+        newest, *history = self.rollback_history
+        self.send_message("input", {"input": newest, "frame": frame - 1, "history": history})
+
+    def play(self):
+        """The match: runs rounds until the player closes the window or presses ESC"""
+        game_res, screen = self.game_res, self.screen
+        count_font, score_font, menu_font, _ = self.fonts
+        player_id = self.player_id
+
+        fighter_1, fighter_2 = self.fighter_1, self.fighter_2
+        fighter_1.ranged_cooldown = 0
+        fighter_2.ranged_cooldown = 0
+        fighter_1.last_ranged_time = 0
+        fighter_2.last_ranged_time = 0
+        # Adjust fighter instances based on player ID
+        if player_id == "2":
+            # If we're player 2, swap the is_local flags
+            fighter_1.is_local = False
+            fighter_2.is_local = True
+        if self.rollback_enabled:
+            # Both peers simulate both fighters from inputs, so each applies every hit itself
+            fighter_1.is_local = True
+            fighter_2.is_local = True
+            self.session = rollback.RollbackSession(simulation.MatchState.with_fighters(
+                fighter_1, fighter_2, 0, game_res.SCREEN_WIDTH, game_res.SCREEN_HEIGHT), int(player_id))
+        round_over_frames = game_res.ROUND_OVER_COOLDOWN * simulation.SIM_FPS // 1000  # Round reset delay for rollback
+
+        run = True
+        last_health_check = [100, 100]  # Store last health values for both fighters
+        last_sent_update_time = 0
+        force_update_health = False
+        self.last_count_update = pygame.time.get_ticks()
+        profiler = self.profiler
+
+        while run:
+            self.clock.tick(game_res.FPS)
+            profiler.begin_frame()
+            current_time = pygame.time.get_ticks()
+            fighter_1, fighter_2 = self.fighter_1, self.fighter_2
+            session = self.session
+
+            # Draw background
+            started = profiler.start()
+            game_res.draw_bg(screen, self.bg_image)
+            profiler.stop("draw", started)
+
+            # Show connection status if not connected
+            if not self.client_socket:
+                game_res.draw_text(screen, "Not connected to server", menu_font, game_res.RED, 300, 200)
+                game_res.draw_text(screen, "Press ESC to return to menu", menu_font, game_res.WHITE, 300, 250)
             else:
-                cooldown_text = f"Ranged: {cooldown_remaining:.1f}s"
-                cooldown_color = game_res.RED
-                fighter_2.ranged_cooldown = 1
-        else:
-            cooldown_text = "Ranged: READY"
-            cooldown_color = game_res.GREEN
-            fighter_2.ranged_cooldown = 0
-        
-        game_res.draw_text(screen, cooldown_text, score_font, game_res.BLACK, 582, 92)
-        game_res.draw_text(screen, cooldown_text, score_font, cooldown_color, 580, 90)
-        
-        if intro_count <= 0:
-            # Move fighters
-            fighter_1.move(game_res.SCREEN_WIDTH, game_res.SCREEN_HEIGHT, screen, fighter_2, round_over)
-            fighter_2.move(game_res.SCREEN_WIDTH, game_res.SCREEN_HEIGHT, screen, fighter_1, round_over)
-                        # Check if ranged attack was used and update cooldown
-            if fighter_1.ranged_attack_used:
-                fighter_1.last_ranged_time = current_time
-                fighter_1.ranged_attack_used = False
-                
-            if fighter_2.ranged_attack_used:
-                fighter_2.last_ranged_time = current_time
-                fighter_2.ranged_attack_used = False
-            # Check if either fighter health has changed since last update
-            # We need to track both who caused the damage and whose health changed
-            if player_id == "1":
-                # We are player 1, so we control fighter_1
-                
-                # If fighter_2's health decreased and fighter_1 was attacking, 
-                # this was a successful hit by our local fighter
-                if fighter_2.health < last_health_check[1] and fighter_1.attacking:
-                    force_update_health = True
-                    print(f"LOCAL HIT: Fighter 2 health changed from {last_health_check[1]} to {fighter_2.health}")
-                    
-                    # Send a health update specifically for the opponent
-                    opponent_state = {"health": fighter_2.health, "hit": True, "hit_cooldown": 45}
-                    send_message("state_update", {
-                        "state": opponent_state,
-                        "player_id": "2",  # Explicitly identify this is player 2's health
-                        "priority": "high"
-                    })
-                    
-                    # IMPORTANT: Also send attacker's state with attack animation info
-                    attacker_state = fighter_1.get_state()
-                    # Ensure attack animation state is preserved
-                    attacker_state["attacking"] = True
-                    attacker_state["attack_type"] = fighter_1.attack_type
-                    attacker_state["action"] = fighter_1.action  # This contains the attack animation index
-                    
-                    send_message("state_update", {
-                        "state": attacker_state,
-                        "player_id": "1",  # This is the attacker's state
-                        "priority": "high"
-                    })
-                    print("Sent high priority attack animation update for attacker (Player 1)")
-                    
-                last_health_check[1] = fighter_2.health
-                
-                # Always keep our local health check values updated
-                last_health_check[0] = fighter_1.health
-                
-            else:  # player_id == "2"
-                # We are player 2, so we control fighter_2
-                
-                # If fighter_1's health decreased and fighter_2 was attacking, 
-                # this was a successful hit by our local fighter
-                if fighter_1.health < last_health_check[0] and fighter_2.attacking:
-                    force_update_health = True
-                    print(f"LOCAL HIT: Fighter 1 health changed from {last_health_check[0]} to {fighter_1.health}")
-                    
-                    # Send a health update specifically for the opponent
-                    opponent_state = {"health": fighter_1.health, "hit": True, "hit_cooldown": 45}
-                    send_message("state_update", {
-                        "state": opponent_state,
-                        "player_id": "1",  # Explicitly identify this is player 1's health
-                        "priority": "high"
-                    })
-                    
-                    # IMPORTANT: Also send attacker's state with attack animation info
-                    attacker_state = fighter_2.get_state()
-                    # Ensure attack animation state is preserved
-                    attacker_state["attacking"] = True
-                    attacker_state["attack_type"] = fighter_2.attack_type
-                    attacker_state["action"] = fighter_2.action  # This contains the attack animation index
-                    
-                    send_message("state_update", {
-                        "state": attacker_state,
-                        "player_id": "2",  # This is the attacker's state
-                        "priority": "high"
-                    })
-                    print("Sent high priority attack animation update for attacker (Player 2)")
-                    
-                last_health_check[0] = fighter_1.health
-                
-                # Always keep our local health check values updated
-                last_health_check[1] = fighter_2.health
-
-            # Send local input and state to server regularly
-            if current_time - last_sent_update_time >= 33 or force_update_health:  # About every 2nd frame at 60fps
-                if player_id == "1":
-                    # Send input data
-                    input_data = fighter_1.get_input()
-                    send_message("input", {"input": input_data})
-                    
-                    # Send state data for our controlled fighter
-                    state_data = fighter_1.get_state()
-                    send_message("state_update", {"state": state_data})
-                    
-                else:  # player_id == "2"
-                    # Send input data
-                    input_data = fighter_2.get_input()
-                    send_message("input", {"input": input_data})
-                    
-                    # Send state data for our controlled fighter
-                    state_data = fighter_2.get_state()
-                    send_message("state_update", {"state": state_data})
-                
-                last_sent_update_time = current_time
-                force_update_health = False
-                
-        else:
-            # Display count timer
-            game_res.draw_text(screen, str(intro_count), count_font, game_res.RED, game_res.SCREEN_WIDTH / 2, game_res.SCREEN_HEIGHT / 3)
-            # Update count timer
-            if (pygame.time.get_ticks() - last_count_update) >= 1000:
-                intro_count -= 1
-                last_count_update = pygame.time.get_ticks()
-
-        # Update fighters
-        fighter_1.update()
-        fighter_2.update()
-
-        # Draw fighters
-        fighter_1.draw(screen)
-        fighter_2.draw(screen)
-        
-        # Draw floating player name text above fighters
-        fighter_1.draw_floating_text(screen, game_res)
-        fighter_2.draw_floating_text(screen, game_res)
-
-        # Check for player defeat
-        if not round_over:
-            if not fighter_1.alive:
-                # Only the local player should update the score and send round_over
-                if (player_id == "1" and fighter_1.is_local) or (player_id == "2" and not fighter_1.is_local):
-                    score[1] += 1
-                    round_over = True
-                    round_over_time = pygame.time.get_ticks()
-                    
-                    # Send round over notification to server
-                    send_message("round_over", {})
-                    print(f"Player 2 wins round - fighter_1 defeated")
-            elif not fighter_2.alive:
-                # Only the local player should update the score and send round_over
-                if (player_id == "2" and fighter_2.is_local) or (player_id == "1" and not fighter_2.is_local):
-                    score[0] += 1
-                    round_over = True
-                    round_over_time = pygame.time.get_ticks()
-                    
-                    # Send round over notification to server
-                    send_message("round_over", {})
-                    print(f"Player 1 wins round - fighter_2 defeated")
-        else:
-            # Display victory image
-            screen.blit(victory_img, (360, 150))
-            
-            # Winner text
-            if fighter_1.alive and not fighter_2.alive:
-                game_res.draw_text(screen, "Player 1 Wins!", score_font, game_res.WHITE, 400, 300)
-            elif fighter_2.alive and not fighter_1.alive:
-                game_res.draw_text(screen, "Player 2 Wins!", score_font, game_res.WHITE, 400, 300)
-            
-            # Only proceed with round reset if enough time has passed
-            if pygame.time.get_ticks() - round_over_time > game_res.ROUND_OVER_COOLDOWN:
-                # Player who detected round is over should send round reset
-                if ((player_id == "1" and fighter_1.is_local) or 
-                    (player_id == "2" and fighter_2.is_local)):
-                    # Reset for new round
-                    round_over = False
-                    intro_count = 3
-                    
-                    # Create new fighters but maintain the same is_local setting
-                    is_fighter1_local = fighter_1.is_local
-                    is_fighter2_local = fighter_2.is_local
-                    
-                    fighter_1 = Fighter(1, 200, 310, True, game_res.ZIPPY_DATA, zippy_sheet, game_res.ZIPPY_ANIMATION_STEPS, 
-                                      (zippy_attack1_fx, zippy_attack2_fx), is_fighter1_local, score_font)
-                    fighter_2 = Fighter(2, 700, 310, False, game_res.FLASH_DATA, flash_sheet, game_res.FLASH_ANIMATION_STEPS, 
-                                      (flash_attack1_fx, flash_attack2_fx), is_fighter2_local, score_font)
-                    
-                    # Reset health check values
-                    last_health_check = [100, 100]
-                    
-                    # Send round reset notification to server
-                    send_message("round_reset", {})
-                    print("Round reset - new fighters created")
-
-    # Update FPS counter once per second
-    if pygame.time.get_ticks() - fps_update_time > 1000:  # Update every second
-        current_fps = int(clock.get_fps())
-        fps_update_time = pygame.time.get_ticks()
-
-    # Display FPS
-    fps_text = f"FPS: {current_fps}"
-    fps_surf = fps_font.render(fps_text, True, game_res.WHITE)
-    screen.blit(fps_surf, (10, game_res.SCREEN_HEIGHT - 40))
-
-    # Event handler
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            run = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                run = False
-
-    # Update display
-    pygame.display.update()
-
-# Clean up before exiting
-stop_network_thread = True
-if network_thread and network_thread.is_alive():
-    network_thread.join(1)  # Wait for thread to end with timeout
-
-# Exit pygame
-pygame.quit()
\ No newline at end of file
+                # Show player stats
+                started = profiler.start()
+                game_res.draw_health_bar(screen, fighter_1.health, 20, 20)
+                game_res.draw_health_bar(screen, fighter_2.health, 580, 20)
+
+                game_res.draw_text(screen, "P1: " + str(self.score[0]), score_font, game_res.BLACK, 22, 62)
+                game_res.draw_text(screen, "P2: " + str(self.score[1]), score_font, game_res.BLACK, 582, 62)
+                game_res.draw_text(screen, "P1: " + str(self.score[0]), score_font, game_res.WHITE, 20, 60)
+                game_res.draw_text(screen, "P2: " + str(self.score[1]), score_font, game_res.WHITE, 580, 60)
+
+                # Show which player you are
+                if player_id:
+                    game_res.draw_text(screen, f"You are Player {player_id}", score_font, game_res.WHITE, 400, 20)
+
+                # Draw ranged attack cooldown indicators
+                # Player 1 cooldown
+                cooldown_text, cooldown_color = self.ranged_cooldown_status(fighter_1, current_time)
+                game_res.draw_text(screen, cooldown_text, score_font, game_res.BLACK, 22, 92)
+                game_res.draw_text(screen, cooldown_text, score_font, cooldown_color, 20, 90)
+
+                # Player 2 cooldown
+                cooldown_text, cooldown_color = self.ranged_cooldown_status(fighter_2, current_time)
+                game_res.draw_text(screen, cooldown_text, score_font, game_res.BLACK, 582, 92)
+                game_res.draw_text(screen, cooldown_text, score_font, cooldown_color, 580, 90)
+                profiler.stop("hud", started)
+
+                if self.intro_count <= 0 and self.rollback_enabled:
+                    # Input, simulation and sending the input are one step; timed as move
+                    started = profiler.start()
+                    self.advance_rollback()
+                    profiler.stop("move", started)
+                elif self.intro_count <= 0:
+                    # Move fighters
+                    started = profiler.start()
+                    fighter_1.move(game_res.SCREEN_WIDTH, game_res.SCREEN_HEIGHT, screen, fighter_2, self.round_over)
+                    fighter_2.move(game_res.SCREEN_WIDTH, game_res.SCREEN_HEIGHT, screen, fighter_1, self.round_over)
+                    profiler.stop("move", started)
+                    # Check if ranged attack was used and update cooldown
+                    if fighter_1.ranged_attack_used:
+                        fighter_1.last_ranged_time = current_time
+                        fighter_1.ranged_attack_used = False
+
+                    if fighter_2.ranged_attack_used:
+                        fighter_2.last_ranged_time = current_time
+                        fighter_2.ranged_attack_used = False
+                    # Check if either fighter health has changed since last update
+                    # We need to track both who caused the damage and whose health changed
+                    if player_id == "1":
+                        # We are player 1, so we control fighter_1
+
+                        # If fighter_2's health decreased and fighter_1 was attacking,
+                        # this was a successful hit by our local fighter
+                        if fighter_2.health < last_health_check[1] and fighter_1.attacking:
+                            force_update_health = True
+                            game_log.info("Local hit: Fighter 2 health changed from %s to %s", last_health_check[1], fighter_2.health)
+
+                            # Send a health update specifically for the opponent
+                            opponent_state = {"health": fighter_2.health, "hit": True, "hit_cooldown": 45}
+                            self.send_message("state_update", {
+                                "state": opponent_state,
+                                "player_id": "2",  # Explicitly identify this is player 2's health
+                                "priority": "high"
+                            })
+
+                            # IMPORTANT: Also send attacker's state with attack animation info
+                            attacker_state = fighter_1.get_state()
+                            # Ensure attack animation state is preserved
+                            attacker_state["attacking"] = True
+                            attacker_state["attack_type"] = fighter_1.attack_type
+                            attacker_state["action"] = fighter_1.action  # This contains the attack animation index
+
+                            self.send_state_update(attacker_state, priority="high")  # This is the attacker's state
+                            net_log.debug("Sent high priority attack animation update for attacker (Player 1)")
+
+                        last_health_check[1] = fighter_2.health
+
+                        # Always keep our local health check values updated
+                        last_health_check[0] = fighter_1.health
+
+                    else:  # player_id == "2"
+                        # We are player 2, so we control fighter_2
+
+                        # If fighter_1's health decreased and fighter_2 was attacking,
+                        # this was a successful hit by our local fighter
+                        if fighter_1.health < last_health_check[0] and fighter_2.attacking:
+                            force_update_health = True
+                            game_log.info("Local hit: Fighter 1 health changed from %s to %s", last_health_check[0], fighter_1.health)
+
+                            # Send a health update specifically for the opponent
+                            opponent_state = {"health": fighter_1.health, "hit": True, "hit_cooldown": 45}
+                            self.send_message("state_update", {
+                                "state": opponent_state,
+                                "player_id": "1",  # Explicitly identify this is player 1's health
+                                "priority": "high"
+                            })
+
+                            # IMPORTANT: Also send attacker's state with attack animation info
+                            attacker_state = fighter_2.get_state()
+                            # Ensure attack animation state is preserved
+                            attacker_state["attacking"] = True
+                            attacker_state["attack_type"] = fighter_2.attack_type
+                            attacker_state["action"] = fighter_2.action  # This contains the attack animation index
+
+                            self.send_state_update(attacker_state, priority="high")  # This is the attacker's state
+                            net_log.debug("Sent high priority attack animation update for attacker (Player 2)")
+
+                        last_health_check[0] = fighter_1.health
+
+                        # Always keep our local health check values updated
+                        last_health_check[1] = fighter_2.health
+
+                    # Send local input and state to server regularly
+                    if current_time - last_sent_update_time >= 33 or force_update_health:  # About every 2nd frame at 60fps
+                        started = profiler.start()
+                        local_fighter = fighter_1 if player_id == "1" else fighter_2
+
+                        # Send input data
+                        input_data = local_fighter.get_input()
+                        self.send_message("input", {"input": input_data})
+
+                        # Send state data for our controlled fighter
+                        state_data = local_fighter.get_state()
+                        self.send_state_update(state_data)
+
+                        last_sent_update_time = current_time
+                        force_update_health = False
+                        profiler.stop("network", started)
+
+                else:
+                    # Display count timer
+                    game_res.draw_text(screen, str(self.intro_count), count_font, game_res.RED, game_res.SCREEN_WIDTH / 2, game_res.SCREEN_HEIGHT / 3)
+                    # Update count timer
+                    if (pygame.time.get_ticks() - self.last_count_update) >= 1000:
+                        self.intro_count -= 1
+                        self.last_count_update = pygame.time.get_ticks()
+
+                # Update fighters (the rollback session already did as part of its step)
+                if not self.rollback_enabled:
+                    started = profiler.start()
+                    fighter_1.update()
+                    fighter_2.update()
+                    profiler.stop("update", started)
+
+                # Draw fighters, remote ones interpolated between their latest snapshots
+                started = profiler.start()
+                fighter_1.interpolate()
+                fighter_2.interpolate()
+                game_res.mark_dirty(*fighter_1.draw(screen))
+                game_res.mark_dirty(*fighter_2.draw(screen))
+
+                # Draw floating player name text above fighters
+                fighter_1.draw_floating_text(screen, game_res)
+                fighter_2.draw_floating_text(screen, game_res)
+                profiler.stop("draw", started)
+
+                # Check for player defeat; with rollback, wait until no late input can undo it
+                if not self.round_over:
+                    if self.rollback_enabled and session.confirmed_frame < session.state.round_over_frame:
+                        pass
+                    elif not fighter_1.alive:
+                        # Only the local player should update the score and send round_over
+                        if (player_id == "1" and fighter_1.is_local) or (player_id == "2" and not fighter_1.is_local) or self.rollback_enabled:
+                            self.score[1] += 1
+                            self.round_over = True
+                            self.round_over_time = pygame.time.get_ticks()
+
+                            # Send round over notification to server
+                            self.send_message("round_over", {})
+                            game_log.info("Player 2 wins round - fighter_1 defeated")
+                    elif not fighter_2.alive:
+                        # Only the local player should update the score and send round_over
+                        if (player_id == "2" and fighter_2.is_local) or (player_id == "1" and not fighter_2.is_local) or self.rollback_enabled:
+                            self.score[0] += 1
+                            self.round_over = True
+                            self.round_over_time = pygame.time.get_ticks()
+
+                            # Send round over notification to server
+                            self.send_message("round_over", {})
+                            game_log.info("Player 1 wins round - fighter_2 defeated")
+                else:
+                    # Display victory image
+                    game_res.blit(screen, self.victory_img, (360, 150))
+
+                    # Winner text
+                    if fighter_1.alive and not fighter_2.alive:
+                        game_res.draw_text(screen, "Player 1 Wins!", score_font, game_res.WHITE, 400, 300)
+                    elif fighter_2.alive and not fighter_1.alive:
+                        game_res.draw_text(screen, "Player 2 Wins!", score_font, game_res.WHITE, 400, 300)
+
+                    # Only proceed with round reset if enough time has passed; with rollback
+                    # both peers count simulation frames so they reset on the same frame
+                    if self.rollback_enabled:
+                        reset_due = session.frame >= session.state.round_over_frame + round_over_frames
+                    else:
+                        reset_due = pygame.time.get_ticks() - self.round_over_time > game_res.ROUND_OVER_COOLDOWN
+                    if reset_due:
+                        # Player who detected round is over should send round reset
+                        if ((player_id == "1" and fighter_1.is_local) or
+                            (player_id == "2" and fighter_2.is_local)):
+                            # Reset for new round
+                            self.round_over = False
+                            self.intro_count = 3
+
+                            # Create new fighters but maintain the same is_local setting
+                            self.create_fighters(fighter_1.is_local, fighter_2.is_local)
+
+                            # Reset health check values
+                            last_health_check = [100, 100]
+                            if self.rollback_enabled:
+                                session.reset(simulation.MatchState.with_fighters(
+                                    self.fighter_1, self.fighter_2, session.frame, game_res.SCREEN_WIDTH, game_res.SCREEN_HEIGHT))
+
+                            # Send round reset notification to server
+                            self.send_message("round_reset", {})
+                            game_log.info("Round reset - new fighters created")
+
+            # Ping the server now and then to track the RTT and clock offset
+            if self.clock_sync_enabled and self.client_socket and self.clock_sync.ping_due():
+                started = profiler.start()
+                self.send_message("ping", self.clock_sync.ping())
+                profiler.stop("network", started)
+
+            # Update FPS counter once per second
+            started = profiler.start()
+            if pygame.time.get_ticks() - self.fps_update_time > 1000:  # Update every second
+                self.current_fps = int(self.clock.get_fps())
+                if self.clock_sync.synced:
+                    self.current_ping = round(self.clock_sync.rtt * 1000)
+                self.fps_update_time = pygame.time.get_ticks()
+
+            # Display FPS (and ping once measured)
+            fps_text = f"FPS: {self.current_fps}"
+            if self.current_ping is not None:
+                fps_text += f"   Ping: {self.current_ping} ms"
+            fps_surf = game_res.render_text(fps_text, self.fps_font, game_res.WHITE)
+            game_res.blit(screen, fps_surf, (10, game_res.SCREEN_HEIGHT - 40))
+
+            # Stage timings (toggled with F3)
+            profiler.draw_overlay(screen, game_res, self.profile_font, current_time)
+            profiler.stop("hud", started)
+
+            # Event handler
+            started = profiler.start()
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    run = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        run = False
+                    elif event.key == pygame.K_F3:
+                        profiler.toggle()
+            profiler.stop("input", started)
+
+            # Update display
+            started = profiler.start()
+            game_res.update_display()
+            profiler.stop("display", started)
+            profiler.end_frame()
+
+if __name__ == "__main__":
+    GameClient().run()
@@ -0,0 +1,118 @@
+"""
+Counters, gauges and histograms rendered in the Prometheus text format.
+
+Metrics live in a Registry. Updating one is a dict update keyed by its
+label values, cheap enough for the server's per-message paths. Values that
+are cheaper to read than to track (open rooms, queued bytes) come from
+collect callbacks that run only when the registry is rendered. Nothing
+here is thread-safe: update and render from the same thread (the server's
+event loop).
+"""
+
+from bisect import bisect_left
+
+# Upper bounds in seconds, for encode / decode times and round trips
+TIME_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+RTT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Metric:
+    """A metric family: one value per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # label values tuple: value
+        self.collect = collect  # Returns {label values tuple: value}, replacing values at render time
+
+    def samples(self):
+        """Yield (name suffix, label values, extra label, value) for rendering"""
+        values = self.collect() if self.collect else self.values
+        for label_values, value in sorted(values.items()):
+            yield "", label_values, "", value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, label_values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, label_values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        values = self.values
+        values[label_values] = values.get(label_values, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=TIME_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            # Count per bucket (the last one is +Inf), then the sum of observations
+            series = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for label_values, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                yield "_bucket", label_values, f'le="{_format_value(float(bound))}"', cumulative
+            yield "_sum", label_values, "", series[-1]
+            yield "_count", label_values, "", cumulative
+
+class Registry:
+    """The metrics a process exposes"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), collect=None):
+        return self.add(Gauge(name, help_text, labels, collect))
+
+    def histogram(self, name, help_text, labels=(), buckets=TIME_BUCKETS):
+        return self.add(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
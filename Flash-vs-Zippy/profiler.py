@@ -0,0 +1,158 @@
+"""
+Per-stage timing of the game loop.
+
+The loop brackets each stage with start()/stop(); a stage may be timed
+several times in a frame and its times add up. end_frame() files the frame's
+totals into a rolling window per stage, from which p50/p95/p99 are taken,
+and, when a trace file was asked for, into a per-frame trace written as JSON
+or CSV (by file extension) on export().
+
+Profiling is off unless FVZ_PROFILE is set: "1" turns it on with the
+overlay shown, and a file name (e.g. FVZ_PROFILE=trace.csv) also records
+the trace. F3 toggles the overlay, and profiling with it, during a match;
+the switch takes effect at the next begin_frame(), so no frame is filed
+half-timed. While off, start() and stop() return right away.
+"""
+
+import csv
+import json
+import os
+import time
+from collections import deque
+
+# Loop stages, in the order the overlay and traces list them
+STAGES = ("input", "move", "update", "draw", "hud", "network", "display")
+FRAME = "total"  # Busy time of the whole frame, waiting for the clock excluded
+
+PROFILE_WINDOW = 600  # Frames the percentiles cover (10 seconds at 60 FPS)
+TRACE_FRAMES = 36000  # Frames a trace keeps, the latest ones (10 minutes at 60 FPS)
+OVERLAY_REFRESH_MS = 500  # How often the overlay recomputes its percentiles
+FRAME_BUDGET_MS = 1000 / 60
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of already sorted samples (0 when there are none)"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))
+    return sorted_samples[index]
+
+class FrameProfiler:
+    """Times the stages of each frame and keeps their recent distribution"""
+
+    def __init__(self, enabled=False, trace_path=None, window=PROFILE_WINDOW):
+        self.enabled = enabled or trace_path is not None
+        self.pending_enabled = None  # What toggle() set enabled to, applied at the next begin_frame
+        self.show_overlay = self.enabled
+        self.trace_path = trace_path
+        self.samples = {stage: deque(maxlen=window) for stage in STAGES + (FRAME,)}  # ms per frame
+        self.trace = deque(maxlen=TRACE_FRAMES) if trace_path else None  # (frame, start, ms per stage...)
+        self.frames = 0
+        self.frame_start = 0.0
+        self.current = dict.fromkeys(STAGES, 0.0)  # Seconds spent in each stage this frame
+        self.overlay_lines = []
+        self.overlay_over_budget = False  # Frame p95 above FRAME_BUDGET_MS when the overlay was refreshed
+        self.overlay_time = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a profiler configured by FVZ_PROFILE"""
+        setting = os.environ.get("FVZ_PROFILE", "")
+        if setting.lower() in ("", "0", "false", "no"):
+            return cls()
+        if setting.lower() in ("1", "true", "yes"):
+            return cls(enabled=True)
+        return cls(trace_path=setting)
+
+    def toggle(self):
+        """Show or hide the overlay, profiling from the next frame only while it shows unless a trace is recording"""
+        self.show_overlay = not self.show_overlay
+        self.pending_enabled = self.show_overlay or self.trace is not None
+        self.overlay_time = 0
+
+    def begin_frame(self):
+        if self.pending_enabled is not None:
+            # Only switch between frames: a stage started before toggle() would be timed from 0
+            self.enabled = self.pending_enabled
+            self.pending_enabled = None
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+
+    def start(self):
+        """Return the start time of a stage, for stop()"""
+        return time.perf_counter() if self.enabled else 0.0
+
+    def stop(self, stage, started):
+        """Add the time since start() to a stage of this frame"""
+        if self.enabled:
+            self.current[stage] += time.perf_counter() - started
+
+    def end_frame(self):
+        """File this frame's stage times and start counting the next frame from zero"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        current = self.current
+        times = [current[stage] * 1000 for stage in STAGES]
+        frame_ms = (now - self.frame_start) * 1000
+        samples = self.samples
+        for stage, ms in zip(STAGES, times):
+            samples[stage].append(ms)
+            current[stage] = 0.0
+        samples[FRAME].append(frame_ms)
+        if self.trace is not None:
+            self.trace.append((self.frames, self.frame_start, *times, frame_ms))
+        self.frames += 1
+
+    def percentiles(self, stage):
+        """Return (p50, p95, p99) of a stage over the window, in ms"""
+        ordered = sorted(self.samples[stage])
+        return percentile(ordered, 0.50), percentile(ordered, 0.95), percentile(ordered, 0.99)
+
+    def summary(self):
+        """Return {stage: {"p50", "p95", "p99", "max"}} over the window, in ms"""
+        result = {}
+        for stage in STAGES + (FRAME,):
+            p50, p95, p99 = self.percentiles(stage)
+            result[stage] = {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3),
+                             "max": round(max(self.samples[stage], default=0.0), 3)}
+        return result
+
+    def draw_overlay(self, screen, game_res, font, current_time):
+        """Draw the percentile table in the top-right corner while the overlay is shown"""
+        if not self.show_overlay or game_res.headless:
+            return
+        if current_time - self.overlay_time >= OVERLAY_REFRESH_MS or not self.overlay_lines:
+            self.overlay_time = current_time
+            lines = ["stage      p50   p95   p99 ms"]
+            for stage in STAGES + (FRAME,):
+                p50, p95, p99 = self.percentiles(stage)
+                lines.append(f"{stage:<8} {p50:5.2f} {p95:5.2f} {p99:5.2f}")
+            self.overlay_lines = lines
+            self.overlay_over_budget = p95 > FRAME_BUDGET_MS  # FRAME comes last
+        line_height = font.get_linesize()
+        width = 230
+        x = game_res.SCREEN_WIDTH - width - 10
+        y = 110
+        game_res.draw_box(screen, game_res.BLACK, (x - 6, y - 4, width + 12, line_height * len(self.overlay_lines) + 8))
+        for i, line in enumerate(self.overlay_lines):
+            over_budget = self.overlay_over_budget and i == len(self.overlay_lines) - 1
+            color = game_res.RED if over_budget else game_res.WHITE
+            game_res.blit(screen, game_res.render_text(line, font, color), (x, y + i * line_height))
+
+    def export(self, path=None):
+        """Write the summary and trace to path (the FVZ_PROFILE file by default); returns the path"""
+        path = path or self.trace_path
+        if path is None:
+            return None
+        trace = list(self.trace or ())
+        columns = ("frame", "start") + STAGES + (FRAME,)
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for row in trace:
+                    writer.writerow((row[0], f"{row[1]:.6f}") + tuple(f"{ms:.3f}" for ms in row[2:]))
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"columns": columns, "summary": self.summary(), "frames": trace}, f)
+        return path
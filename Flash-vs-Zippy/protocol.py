@@ -0,0 +1,530 @@
+import json
+import struct
+
+# Framing shared by the server and the client: every payload is preceded by
+# a fixed-size ASCII length header so both codecs can travel on one stream.
+HEADER_SIZE = 10  # Size of message length header
+RECV_BUFFER_SIZE = 64 * 1024  # Initial size of a FrameReader buffer
+MIN_READ_SIZE = 4096  # Free space guaranteed for each read into a FrameReader
+MAX_MESSAGE_SIZE = 1024 * 1024  # Larger frames are treated as a corrupt stream
+
+# Codec names exchanged during the registration handshake
+PROTOCOL_VERSION = 2  # 2: projectiles carry their id
+CODEC_JSON = "json"
+CODEC_BINARY = f"binary-v{PROTOCOL_VERSION}"
+SUPPORTED_CODECS = [CODEC_BINARY, CODEC_JSON]  # Ordered by preference
+
+# Optional protocol features, offered at registration next to the codecs
+FEATURE_DELTA = "delta"  # state_update / game_state may carry only changed fields
+FEATURE_UDP = "udp"  # input / state traffic over UDP, control messages stay on TCP
+FEATURE_ROLLBACK = "rollback"  # frame-numbered inputs are relayed at once for rollback netcode
+FEATURE_CLOCK = "clock"  # ping / pong messages for RTT and clock offset, see clocksync.py
+SUPPORTED_FEATURES = [FEATURE_DELTA, FEATURE_UDP, FEATURE_ROLLBACK, FEATURE_CLOCK]
+KEYFRAME_INTERVAL = 30  # Send a full snapshot at least every N state messages
+
+# UDP transport: every datagram carries the connection token handed out at
+# registration and a per-direction sequence number; older datagrams are dropped
+DATAGRAM_MAGIC = 0xD7
+UDP_REDUNDANCY = 3  # Past input frames repeated in each input datagram / resends of the latest state
+UDP_MESSAGE_TYPES = ("input", "state_update", "opponent_input", "game_state", "udp_hello", "ping", "pong")
+MAX_DATAGRAM_SIZE = 2048
+
+# First byte of every binary payload. JSON payloads always start with "{",
+# so the receiver can tell both encodings apart without extra state.
+BINARY_MAGIC = 0xB7
+
+# Binary message type ids
+MSG_INPUT = 1
+MSG_OPPONENT_INPUT = 2
+MSG_STATE_UPDATE = 3
+MSG_GAME_STATE = 4
+
+MESSAGE_TYPE_IDS = {
+    "input": MSG_INPUT,
+    "opponent_input": MSG_OPPONENT_INPUT,
+    "state_update": MSG_STATE_UPDATE,
+    "game_state": MSG_GAME_STATE,
+}
+MESSAGE_TYPE_NAMES = {type_id: name for name, type_id in MESSAGE_TYPE_IDS.items()}
+
+# Fighter state fields in wire order. "?" fields are packed into a single
+# bitfield, every other field is a fixed-size struct value. Only the fields
+# present in a state are sent, tracked by a 32-bit presence mask.
+STATE_FIELDS = [
+    ("x", "h"),
+    ("y", "h"),
+    ("vel_y", "h"),
+    ("running", "?"),
+    ("jump", "?"),
+    ("attacking", "?"),
+    ("attack_type", "B"),
+    ("attack_cooldown", "H"),
+    ("hit", "?"),
+    ("hit_cooldown", "H"),
+    ("health", "h"),
+    ("alive", "?"),
+    ("action", "B"),
+    ("frame_index", "B"),
+    ("flip", "?"),
+    ("ranged_cooldown", "B"),
+    ("last_ranged_time", "I"),
+    ("ranged_attack_used", "?"),
+    ("projectiles", None),  # Variable-length projectile array
+]
+STATE_KEYS = frozenset(name for name, _ in STATE_FIELDS)
+PROJECTILE_KEYS = frozenset(("id", "x", "y", "direction", "active"))  # id may be missing from older peers
+INPUT_KEYS = ["left", "right", "jump", "attack1", "attack2"]
+
+_HEADER = struct.Struct("!BBB")          # magic, version, message type
+_MASK = struct.Struct("!IB")             # presence mask, boolean flags
+_COUNT = struct.Struct("!B")
+_PROJECTILE = struct.Struct("!HhhbB")    # id (0: none), x, y, direction, active
+_INPUT = struct.Struct("!B")             # input key bitfield (bit 7: frame and history follow)
+_INPUT_HISTORY = struct.Struct("!IB")    # input frame number, history length
+_DATAGRAM = struct.Struct("!BII")        # magic, connection token, sequence number
+_STATE_UPDATE = struct.Struct("!BB")     # flags (has player id, has priority, high priority, delta), player id
+_GAME_STATE = struct.Struct("!BB")       # flags (round over, delta), player count
+
+_PROJECTILES_BIT = 1 << (len(STATE_FIELDS) - 1)
+_VALID_MASK = (1 << len(STATE_FIELDS)) - 1
+_value_structs = {}  # presence mask -> compiled struct for its numeric fields
+
+
+class ProtocolError(ValueError):
+    """Raised when a payload cannot be encoded or decoded"""
+
+
+def choose_codec(offered):
+    """Pick the preferred codec both peers support, falling back to JSON"""
+    for codec in SUPPORTED_CODECS:
+        if codec in (offered or []):
+            return codec
+    return CODEC_JSON
+
+
+def choose_features(offered):
+    """Return the optional features both peers support"""
+    return [feature for feature in SUPPORTED_FEATURES if feature in (offered or [])]
+
+
+_MISSING = object()
+
+
+def diff_state(baseline, state):
+    """Return the fields of state that differ from baseline.
+
+    Returns None when the change cannot be expressed as a delta (a field
+    disappeared), in which case a keyframe has to be sent.
+    """
+    if baseline.keys() - state.keys():
+        return None
+    return {key: value for key, value in state.items() if baseline.get(key, _MISSING) != value}
+
+
+def diff_player_states(baseline, player_states):
+    """Per-player diff_state for a game_state player_states dict"""
+    if baseline.keys() != player_states.keys():
+        return None
+    delta = {}
+    for player_id, state in player_states.items():
+        player_delta = diff_state(baseline[player_id], state)
+        if player_delta is None:
+            return None
+        if player_delta:
+            delta[player_id] = player_delta
+    return delta
+
+
+def apply_delta(baseline, delta):
+    """Return a new state with delta merged over baseline"""
+    merged = dict(baseline)
+    merged.update(delta)
+    return merged
+
+
+def apply_player_states_delta(baseline, delta):
+    """Merge a per-player delta into a copy of a player_states dict"""
+    merged = dict(baseline)
+    for player_id, player_delta in delta.items():
+        merged[player_id] = apply_delta(baseline.get(player_id, {}), player_delta)
+    return merged
+
+
+class DeltaEncoder:
+    """Turns successive snapshots into deltas against the previous one.
+
+    The peer rebuilds full snapshots by merging each delta into the last
+    snapshot it applied. Over TCP every frame arrives in order, so the last
+    snapshot we sent is the one the peer has. A full keyframe goes out every
+    keyframe_interval snapshots, or whenever a field disappears.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL, nested=False):
+        self.keyframe_interval = keyframe_interval
+        self.nested = nested  # True for game_state player_states, False for a single state
+        self.baseline = None
+        self.snapshots_since_keyframe = 0
+
+    def reset(self):
+        """Force the next snapshot to be a keyframe"""
+        self.baseline = None
+
+    def encode(self, snapshot):
+        """Return (payload, is_delta) for the next snapshot"""
+        if self.nested:
+            copy = {player_id: dict(state) for player_id, state in snapshot.items()}
+        else:
+            copy = dict(snapshot)
+
+        delta = None
+        if self.baseline is not None and self.snapshots_since_keyframe < self.keyframe_interval:
+            if self.nested:
+                delta = diff_player_states(self.baseline, copy)
+            else:
+                delta = diff_state(self.baseline, copy)
+
+        self.baseline = copy
+        if delta is None:
+            self.snapshots_since_keyframe = 0
+            return snapshot, False
+        self.snapshots_since_keyframe += 1
+        return delta, True
+
+
+def _get_value_struct(mask):
+    """Return the cached struct for the numeric fields selected by mask"""
+    value_struct = _value_structs.get(mask)
+    if value_struct is None:
+        fmt = "".join(fmt for bit, (_, fmt) in enumerate(STATE_FIELDS)
+                      if mask & (1 << bit) and fmt not in ("?", None))
+        value_struct = struct.Struct("!" + fmt)
+        _value_structs[mask] = value_struct
+    return value_struct
+
+
+def _pack_state(state, out):
+    """Append a (possibly partial) fighter state to out"""
+    if not state.keys() <= STATE_KEYS:
+        raise ProtocolError(f"Unknown state fields: {set(state) - STATE_KEYS}")
+
+    mask = 0
+    flags = 0
+    flag_bit = 0
+    values = []
+    for bit, (name, fmt) in enumerate(STATE_FIELDS):
+        if fmt == "?":
+            if name in state:
+                mask |= 1 << bit
+                if state[name]:
+                    flags |= 1 << flag_bit
+            flag_bit += 1
+        elif name in state and fmt is not None:
+            mask |= 1 << bit
+            values.append(state[name])
+
+    projectiles = state.get("projectiles")
+    if projectiles is not None:
+        mask |= _PROJECTILES_BIT
+
+    out += _MASK.pack(mask, flags)
+    out += _get_value_struct(mask).pack(*values)
+
+    if projectiles is not None:
+        out += _COUNT.pack(len(projectiles))
+        for proj in projectiles:
+            if not PROJECTILE_KEYS - {"id"} <= proj.keys() <= PROJECTILE_KEYS:
+                raise ProtocolError(f"Unexpected projectile fields: {set(proj)}")
+            out += _PROJECTILE.pack(proj.get("id", 0), proj["x"], proj["y"], proj["direction"], proj["active"])
+
+
+def _unpack_state(payload, offset):
+    """Read a fighter state from payload, returning (state, new offset)"""
+    mask, flags = _MASK.unpack_from(payload, offset)
+    offset += _MASK.size
+    if mask & ~_VALID_MASK:
+        raise ProtocolError(f"Invalid state presence mask {mask:#x}")
+    value_struct = _get_value_struct(mask)
+    values = iter(value_struct.unpack_from(payload, offset))
+    offset += value_struct.size
+
+    state = {}
+    flag_bit = 0
+    for bit, (name, fmt) in enumerate(STATE_FIELDS):
+        if fmt == "?":
+            if mask & (1 << bit):
+                state[name] = bool(flags & (1 << flag_bit))
+            flag_bit += 1
+        elif fmt is not None and mask & (1 << bit):
+            state[name] = next(values)
+
+    if mask & _PROJECTILES_BIT:
+        (count,) = _COUNT.unpack_from(payload, offset)
+        offset += _COUNT.size
+        projectiles = []
+        for _ in range(count):
+            projectile_id, x, y, direction, active = _PROJECTILE.unpack_from(payload, offset)
+            offset += _PROJECTILE.size
+            proj = {"x": x, "y": y, "direction": direction, "active": bool(active)}
+            if projectile_id:
+                proj["id"] = projectile_id
+            projectiles.append(proj)
+        state["projectiles"] = projectiles
+
+    return state, offset
+
+
+def _pack_input(input_data):
+    """Pack an input dict into its key bitfield"""
+    if input_data.keys() - set(INPUT_KEYS):
+        raise ProtocolError("Unexpected input fields")
+    bits = 0
+    for bit, key in enumerate(INPUT_KEYS):
+        if input_data.get(key):
+            bits |= 1 << bit
+    return bits
+
+
+def _unpack_input(bits):
+    return {key: bool(bits & (1 << bit)) for bit, key in enumerate(INPUT_KEYS)}
+
+
+def _encode_binary(message):
+    """Encode a hot-path message in the binary layout"""
+    msg_type = MESSAGE_TYPE_IDS.get(message.get("type"))
+    if msg_type is None:
+        raise ProtocolError(f"No binary layout for {message.get('type')!r}")
+
+    out = bytearray(_HEADER.pack(BINARY_MAGIC, PROTOCOL_VERSION, msg_type))
+
+    if msg_type in (MSG_INPUT, MSG_OPPONENT_INPUT):
+        if message.keys() - {"type", "input", "frame", "history"}:
+            raise ProtocolError("Unexpected input fields")
+        if "frame" not in message:
+            out += _INPUT.pack(_pack_input(message.get("input", {})))
+        else:
+            # Redundant input: the newest frame number plus the frames before it
+            history = message.get("history", [])
+            out += _INPUT.pack(_pack_input(message.get("input", {})) | 0x80)
+            out += _INPUT_HISTORY.pack(message["frame"], len(history))
+            for input_data in history:
+                out += _INPUT.pack(_pack_input(input_data))
+
+    elif msg_type == MSG_STATE_UPDATE:
+        if message.keys() - {"type", "state", "player_id", "priority", "delta"}:
+            raise ProtocolError("Unexpected state_update fields")
+        priority = message.get("priority", "normal")
+        if priority not in ("normal", "high"):
+            raise ProtocolError(f"Unknown priority {priority!r}")
+        flags = 0
+        player_id = 0
+        if "player_id" in message:
+            flags |= 1
+            player_id = int(message["player_id"])
+        if "priority" in message:
+            flags |= 2
+        if priority == "high":
+            flags |= 4
+        if message.get("delta"):
+            flags |= 8
+        out += _STATE_UPDATE.pack(flags, player_id)
+        _pack_state(message.get("state", {}), out)
+
+    elif msg_type == MSG_GAME_STATE:
+        if message.keys() - {"type", "player_states", "round_over", "delta"}:
+            raise ProtocolError("Unexpected game_state fields")
+        player_states = message.get("player_states", {})
+        flags = 1 if message.get("round_over", False) else 0
+        if message.get("delta"):
+            flags |= 2
+        out += _GAME_STATE.pack(flags, len(player_states))
+        for pid, state in player_states.items():
+            out += _COUNT.pack(int(pid))
+            _pack_state(state, out)
+
+    return bytes(out)
+
+
+def _decode_binary(payload):
+    """Decode a binary payload back into the message dict the JSON codec would produce"""
+    magic, version, msg_type = _HEADER.unpack_from(payload, 0)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported binary protocol version {version}")
+    offset = _HEADER.size
+    name = MESSAGE_TYPE_NAMES.get(msg_type)
+    if name is None:
+        raise ProtocolError(f"Unknown binary message type {msg_type}")
+
+    message = {"type": name}
+
+    if msg_type in (MSG_INPUT, MSG_OPPONENT_INPUT):
+        (bits,) = _INPUT.unpack_from(payload, offset)
+        offset += _INPUT.size
+        message["input"] = _unpack_input(bits)
+        if bits & 0x80:
+            message["frame"], count = _INPUT_HISTORY.unpack_from(payload, offset)
+            offset += _INPUT_HISTORY.size
+            message["history"] = [_unpack_input(bits) for bits in payload[offset:offset + count]]
+            if len(message["history"]) != count:
+                raise ProtocolError("Truncated input history")
+
+    elif msg_type == MSG_STATE_UPDATE:
+        flags, player_id = _STATE_UPDATE.unpack_from(payload, offset)
+        offset += _STATE_UPDATE.size
+        message["state"], offset = _unpack_state(payload, offset)
+        if flags & 1:
+            message["player_id"] = str(player_id)
+        if flags & 2:
+            message["priority"] = "high" if flags & 4 else "normal"
+        if flags & 8:
+            message["delta"] = True
+
+    elif msg_type == MSG_GAME_STATE:
+        flags, count = _GAME_STATE.unpack_from(payload, offset)
+        offset += _GAME_STATE.size
+        player_states = {}
+        for _ in range(count):
+            (pid,) = _COUNT.unpack_from(payload, offset)
+            offset += _COUNT.size
+            player_states[str(pid)], offset = _unpack_state(payload, offset)
+        message["player_states"] = player_states
+        message["round_over"] = bool(flags & 1)
+        if flags & 2:
+            message["delta"] = True
+
+    return message
+
+
+def encode_payload(message, codec=CODEC_JSON):
+    """Encode a message body with the given codec.
+
+    Messages without a binary layout (registration, round_over, ...) or with
+    fields the layout cannot represent are sent as JSON, which the receiver
+    detects on its own.
+    """
+    if codec == CODEC_BINARY:
+        try:
+            return _encode_binary(message)
+        except (ProtocolError, struct.error, TypeError, ValueError):
+            pass
+    return json.dumps(message).encode('utf-8')
+
+
+def frame(payload):
+    """Prefix a payload with its length header"""
+    return f"{len(payload):<{HEADER_SIZE}}".encode('utf-8') + payload
+
+
+def encode_message(message, codec=CODEC_JSON):
+    """Encode and frame a message ready for sendall()"""
+    return frame(encode_payload(message, codec))
+
+
+def parse_header(header):
+    """Return the payload length announced by a frame header"""
+    try:
+        length = int(str(header, 'ascii'))
+    except ValueError:
+        length = -1
+    if not 0 <= length <= MAX_MESSAGE_SIZE:
+        raise ProtocolError(f"Invalid header received: {bytes(header)!r}")
+    return length
+
+
+def encode_datagram(token, seq, message, codec=CODEC_JSON):
+    """Encode a message as one self-contained UDP datagram"""
+    return _DATAGRAM.pack(DATAGRAM_MAGIC, token, seq) + encode_payload(message, codec)
+
+
+def decode_datagram(data):
+    """Return (token, seq, message) from a datagram built by encode_datagram"""
+    if len(data) < _DATAGRAM.size:
+        raise ProtocolError("Datagram too short")
+    magic, token, seq = _DATAGRAM.unpack_from(data, 0)
+    if magic != DATAGRAM_MAGIC:
+        raise ProtocolError(f"Bad datagram magic {magic:#x}")
+    return token, seq, decode_payload(memoryview(data)[_DATAGRAM.size:])
+
+
+def decode_payload(payload):
+    """Decode a message body produced by either codec (bytes or memoryview)"""
+    if payload[:1] == bytes((BINARY_MAGIC,)):
+        try:
+            return _decode_binary(payload)
+        except struct.error as e:
+            raise ProtocolError(f"Truncated binary message: {e}")
+    try:
+        return json.loads(str(payload, 'utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ProtocolError(f"Invalid JSON received: {e}")
+
+
+class FrameReader:
+    """Splits a byte stream into frames using one reusable receive buffer.
+
+    Data is read straight into a preallocated bytearray, either with
+    recv_into() on a blocking socket or through get_buffer()/buffer_updated(),
+    which match asyncio.BufferedProtocol. frames() yields complete payloads as
+    memoryview slices of that buffer. They are only valid until the next read,
+    so decode them straight away. Partial headers and payloads stay in the
+    buffer until the rest arrives; the unread tail is moved to the front only
+    when the free space runs out.
+    """
+
+    def __init__(self, size=RECV_BUFFER_SIZE):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # First byte not yet handed out as a frame
+        self._end = 0    # End of the received data
+        self._needed = 0  # Size of the incomplete frame at _start, once its header is known
+
+    def get_buffer(self, sizehint=-1):
+        """Return a writable view of the free space after the received data"""
+        if self._start == self._end:
+            # Everything was consumed: rewind instead of copying
+            self._start = self._end = 0
+
+        wanted = max(sizehint, MIN_READ_SIZE, self._needed - (self._end - self._start))
+        if len(self._buffer) - self._end < wanted:
+            self._make_room(wanted)
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes):
+        """Record that nbytes were written into the last get_buffer() view"""
+        self._end += nbytes
+
+    def recv_into(self, sock):
+        """Read once from a socket into the buffer; returns 0 on EOF"""
+        nbytes = sock.recv_into(self.get_buffer())
+        self.buffer_updated(nbytes)
+        return nbytes
+
+    def frames(self):
+        """Yield every complete payload in the buffer as a memoryview"""
+        while True:
+            available = self._end - self._start
+            if available < HEADER_SIZE:
+                return
+            length = parse_header(self._view[self._start:self._start + HEADER_SIZE])
+            if available < HEADER_SIZE + length:
+                # Make sure the next read can hold the rest of this frame
+                self._needed = HEADER_SIZE + length
+                return
+            self._needed = 0
+            payload_start = self._start + HEADER_SIZE
+            self._start = payload_start + length
+            yield self._view[payload_start:self._start]
+
+    def _make_room(self, wanted):
+        """Move the unread tail to the front, growing the buffer if it still won't fit"""
+        pending = self._end - self._start
+        if pending + wanted > len(self._buffer):
+            new_buffer = bytearray(max(pending + wanted, 2 * len(self._buffer)))
+            new_view = memoryview(new_buffer)
+            new_view[:pending] = self._view[self._start:self._end]
+            self._buffer = new_buffer
+            self._view = new_view
+        else:
+            # memoryview assignment handles the overlapping copy
+            self._view[:pending] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = pending
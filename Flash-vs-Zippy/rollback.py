@@ -0,0 +1,140 @@
+"""
+Rollback netcode on top of the deterministic simulation.
+
+Peers exchange only frame-numbered inputs. Each frame the session saves a
+snapshot of both fighters (FighterState.snapshot, i.e. get_state plus the
+internal timers), predicts the remote input by repeating the last one it
+has, and simulates ahead without waiting. When a remote input arrives that
+differs from the prediction, the fighters are restored to the snapshot of
+that frame and the frames since are re-simulated with the real input, so
+the remote fighter never waits on the network and never snaps to a late
+state snapshot.
+"""
+
+import simulation
+
+MAX_ROLLBACK_FRAMES = 8  # How far ahead of the last confirmed remote input we may simulate
+
+def _pressed(inputs):
+    """Keys held in an input dict; inputs compare equal when the same keys are held"""
+    return frozenset(key for key, held in inputs.items() if held)
+
+class RollbackSession:
+    """Advances a MatchState with local input now and remote input when it arrives.
+
+    local_player is 1 or 2. Only the thread running the game loop may call
+    into the session.
+    """
+
+    def __init__(self, state, local_player, max_rollback=MAX_ROLLBACK_FRAMES):
+        self.state = state
+        self.local_player = local_player
+        self.max_rollback = max_rollback
+        self.local_inputs = {}  # frame: local input
+        self.remote_inputs = {}  # frame: remote input received from the opponent
+        self.predicted = {}  # frame: remote input we simulated with before it arrived
+        self.snapshots = {}  # frame: state saved before simulating that frame
+        self.start_frame = state.frame  # Nothing before this frame can be rolled back
+        self.confirmed_frame = state.frame - 1  # Every remote input up to here has arrived
+        self.last_remote_input = simulation.NO_INPUT
+        self.rollback_frame = None  # Earliest frame whose prediction turned out wrong
+        # Counters for tuning max_rollback and the input delay
+        self.rollbacks = 0
+        self.resimulated_frames = 0
+
+    @property
+    def frame(self):
+        """The next frame to simulate"""
+        return self.state.frame
+
+    def reset(self, state):
+        """Continue from a new state (e.g. fresh fighters after a round reset)"""
+        self.state = state
+        self.snapshots.clear()
+        self.predicted.clear()
+        self.rollback_frame = None
+        self.start_frame = state.frame
+        self.local_inputs = {f: i for f, i in self.local_inputs.items() if f >= state.frame}
+
+    def can_advance(self):
+        """Whether we may simulate another frame without the opponent's input.
+
+        Running more than max_rollback frames ahead would make the next
+        correction too large to re-simulate in one frame, so the caller
+        should skip simulating until more remote inputs arrive.
+        """
+        return self.frame - self.confirmed_frame <= self.max_rollback
+
+    def add_remote_input(self, frame, inputs, history=()):
+        """Record the opponent's input for frame; history holds frames frame-1, frame-2, ..."""
+        for age, frame_input in enumerate([inputs, *history]):
+            self._add_remote_input(frame - age, frame_input)
+
+    def _add_remote_input(self, frame, inputs):
+        if frame < self.start_frame or frame in self.remote_inputs:
+            return
+        self.remote_inputs[frame] = inputs
+
+        predicted = self.predicted.pop(frame, None)
+        if predicted is not None and _pressed(predicted) != _pressed(inputs):
+            if self.rollback_frame is None or frame < self.rollback_frame:
+                self.rollback_frame = frame
+
+        while self.confirmed_frame + 1 in self.remote_inputs:
+            self.confirmed_frame += 1
+            self.last_remote_input = self.remote_inputs[self.confirmed_frame]
+
+    def resolve(self):
+        """Roll back and re-simulate if any remote input contradicted its prediction"""
+        frame = self.rollback_frame
+        self.rollback_frame = None
+        if frame is not None and frame in self.snapshots:
+            end_frame = self.frame
+            self._load(self.snapshots[frame])
+            self.rollbacks += 1
+            self.resimulated_frames += end_frame - frame
+            self.state.fighter_1.muted = self.state.fighter_2.muted = True
+            try:
+                while self.frame < end_frame:
+                    self._simulate(self.local_inputs.get(self.frame, simulation.NO_INPUT))
+            finally:
+                self.state.fighter_1.muted = self.state.fighter_2.muted = False
+        self._discard_confirmed()
+
+    def advance(self, local_input):
+        """Simulate the next frame with local_input and the known or predicted remote input"""
+        self.local_inputs[self.frame] = local_input
+        self._simulate(local_input)
+
+    def _simulate(self, local_input):
+        frame = self.frame
+        remote_input = self.remote_inputs.get(frame)
+        if remote_input is None:
+            # Predict that the opponent keeps holding what they held last
+            remote_input = self.last_remote_input
+            self.predicted[frame] = remote_input
+        self.snapshots[frame] = self._save()
+
+        if self.local_player == 1:
+            simulation.advance(self.state, local_input, remote_input)
+        else:
+            simulation.advance(self.state, remote_input, local_input)
+
+    def _save(self):
+        state = self.state
+        return (state.frame, state.round_over, state.round_over_frame,
+                state.fighter_1.snapshot(), state.fighter_2.snapshot())
+
+    def _load(self, saved):
+        state = self.state
+        state.frame, state.round_over, state.round_over_frame, fighter_1, fighter_2 = saved
+        state.fighter_1.restore(fighter_1)
+        state.fighter_2.restore(fighter_2)
+
+    def _discard_confirmed(self):
+        """Drop history no future rollback can reach"""
+        for frame in [f for f in self.snapshots if f <= self.confirmed_frame]:
+            del self.snapshots[frame]
+            self.local_inputs.pop(frame, None)
+        for frame in [f for f in self.remote_inputs if f < self.confirmed_frame]:
+            del self.remote_inputs[frame]
@@ -0,0 +1,546 @@
+"""
+Deterministic fixed-step fight simulation.
+
+The game rules live here, free of keyboard, clock, display and mixer access:
+fighters advance one frame at a time from explicit input dicts, and every
+timer counts frames rather than milliseconds. Given the same starting state
+and inputs, step() always produces the same result, which is what server-side
+simulation, replays, fast-forward and rollback need. Fighter (fighter.py)
+subclasses FighterState and only adds sprites, sounds and local key reading.
+
+Per-character numbers (hitbox, attacks, projectiles, frame counts) come
+from the character registry in characters.py; each fighter keeps its
+compiled Character as self.stats.
+
+Only pygame.Rect is used, so nothing here initializes a display or mixer.
+"""
+
+import copy
+import threading
+import pygame
+import characters
+import collision
+import logs
+
+sim_log = logs.get_logger("sim")  # Debug only: rollback resimulates frames and would repeat events
+
+# Simulation rate; all frame-based timers below assume it
+SIM_FPS = 60
+
+# Arena and fighter geometry
+ARENA_WIDTH = 1000
+ARENA_HEIGHT = 600
+FLOOR_OFFSET = 110  # Distance from the bottom of the arena to the floor
+
+# Movement
+SPEED = 10
+GRAVITY = 2
+JUMP_VELOCITY = -30
+
+# Combat (damage, reach, projectiles and the ranged cooldown are per character)
+ATTACK_COOLDOWN = 20  # Frames between the end of an attack and the next one
+HIT_COOLDOWN = 45  # Frames a fighter stays in the hit state
+PROJECTILE_POOL_SIZE = 64  # Spare projectiles kept for reuse
+MAX_PROJECTILE_ID = 0xFFFF  # Projectile ids wrap around to 1; 0 means unknown
+
+# Animation
+ANIMATION_FRAME_TICKS = 3  # Simulation frames per animation frame (50 ms at 60 FPS)
+
+# Actions, used as row indexes into the sprite sheets
+IDLE, RUN, JUMP, ATTACK1, ATTACK2, HIT, DEATH = range(7)
+
+# Input sent when a player presses nothing
+NO_INPUT = {}
+
+class Projectile:
+    __slots__ = ("id", "rect", "direction", "speed", "damage", "active", "owner")
+
+    def __init__(self, x, y, direction, speed, damage, owner, projectile_id=0):
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.reset(x, y, direction, speed, damage, owner, projectile_id)
+
+    def reset(self, x, y, direction, speed, damage, owner, projectile_id=0):
+        """Reinitialize in place, for reuse from the pool"""
+        self.id = projectile_id  # Stable per owner, so synced snapshots update the same projectile
+        self.rect.update((x, y) + owner.stats.projectile_size)
+        self.direction = direction  # 1 for right, -1 for left
+        self.speed = speed
+        self.damage = damage
+        self.active = True
+        self.owner = owner  # The fighter who fired it; None while in the pool
+
+    def copy(self, owner):
+        """Return an independent copy fired by owner"""
+        clone = projectile_pool.acquire(self.rect.x, self.rect.y, self.direction, self.speed, self.damage,
+                                        owner, self.id)
+        clone.active = self.active
+        return clone
+
+    def move(self, arena_width):
+        """Move one frame and return the area covered on the way (see collision.swept_box)"""
+        # Move the projectile
+        dx = self.speed * self.direction
+        self.rect.x += dx
+
+        # Check if out of arena bounds
+        if self.rect.x < 0 or self.rect.x > arena_width:
+            self.active = False
+            return collision.NO_BOX
+        if self.speed <= self.rect.width:
+            return self.rect  # Nothing jumped over; skip building a swept box
+        return collision.swept_box(self.rect, dx)
+
+    def hit(self, target):
+        """Damage target unless it is still recovering from the last hit; returns whether it hit"""
+        if target.hit_cooldown > 0:
+            return False
+        prev_health = target.health
+        target.health -= self.damage
+        target.hit = True
+        target.hit_cooldown = HIT_COOLDOWN
+        self.active = False
+        sim_log.debug("Ranged hit: %s hit %s, health %s -> %s", self.owner.player, target.player, prev_health, target.health)
+        return True
+
+class ProjectilePool:
+    """Recycles Projectile objects across shots, snapshots and rounds.
+
+    Projectiles go back to the pool when they expire or a fighter drops
+    them, so steady play allocates none. At most capacity spares are kept.
+    The network thread syncs remote projectiles while the game loop runs,
+    hence the lock.
+    """
+
+    def __init__(self, capacity=PROJECTILE_POOL_SIZE):
+        self.capacity = capacity
+        self.free = []
+        self.created = 0  # Projectiles allocated because no spare was free
+        self.lock = threading.Lock()
+
+    def acquire(self, x, y, direction, speed, damage, owner, projectile_id=0):
+        """Return a projectile in flight, reusing a spare if there is one"""
+        with self.lock:
+            projectile = self.free.pop() if self.free else None
+        if projectile is None:
+            self.created += 1
+            return Projectile(x, y, direction, speed, damage, owner, projectile_id)
+        projectile.reset(x, y, direction, speed, damage, owner, projectile_id)
+        return projectile
+
+    def release(self, projectile):
+        """Take back a projectile nothing references any more; releasing twice is harmless"""
+        with self.lock:
+            if projectile.owner is None:
+                return
+            projectile.owner = None
+            projectile.active = False
+            if len(self.free) < self.capacity:
+                self.free.append(projectile)
+
+projectile_pool = ProjectilePool()
+
+class FighterState:
+    """Gameplay state and rules for one fighter, advanced one frame at a time.
+
+    is_local marks the fighter whose hits this simulation is authoritative
+    for; a headless simulation owns both fighters and leaves it True.
+    """
+
+    def __init__(self, player, x, y, flip, animation_steps, is_local=True, character=None):
+        self.player = player
+        # Registry id of the character; players default to their roster pick
+        self.character = characters.ROSTER[player - 1] if character is None else character
+        self.stats = characters.CHARACTERS[self.character]
+        self.flip = flip  # Initial flip state
+        self.animation_steps = animation_steps  # Frames per action, one entry per sprite sheet row
+        self.action = IDLE
+        self.frame_index = 0
+        self.anim_ticks = 0  # Simulation frames since frame_index last advanced
+        self.rect = pygame.Rect((x, y) + self.stats.hitbox)
+        self.vel_y = 0
+        self.running = False
+        self.jump = False
+        self.attacking = False
+        self.attack_type = 0
+        self.attack_cooldown = 0
+        self.attack_has_hit = False
+        self.hit = False
+        self.hit_cooldown = 0  # Cooldown for hit state to ensure animation plays
+        self.health = 100
+        self.alive = True
+        self.is_local = is_local
+        # Track if this fighter is currently displaying a remote attack animation
+        self.remote_attacking = False
+        self.remote_attack_action = 0
+
+        # Ranged attacks in flight, from projectile_pool
+        self.projectiles = []
+        self.next_projectile_id = 1
+
+        # Melee hitbox, reused by every attack; only valid during attack()
+        self.melee_box = pygame.Rect(0, 0, 0, 0)
+
+        # Ranged attack cooldown tracking
+        self.ranged_cooldown = 0
+        self.last_ranged_time = 0
+        self.ranged_attack_used = False
+
+        self.muted = False  # Set while re-simulating so hooks don't replay sounds
+
+    def copy(self):
+        """Return an independent copy, e.g. to keep a snapshot for rollback"""
+        clone = copy.copy(self)
+        clone.rect = self.rect.copy()
+        clone.melee_box = self.melee_box.copy()
+        clone.projectiles = [p.copy(clone) for p in self.projectiles]
+        return clone
+
+    def get_state(self):
+        """Return the current state of the fighter for network synchronization"""
+        state = {
+            "x": self.rect.x,
+            "y": self.rect.y,
+            "vel_y": self.vel_y,
+            "running": self.running,
+            "jump": self.jump,
+            "attacking": self.attacking,
+            "attack_type": self.attack_type,
+            "attack_cooldown": self.attack_cooldown,
+            "hit": self.hit,
+            "hit_cooldown": self.hit_cooldown,  # Include hit cooldown in state
+            "health": self.health,
+            "alive": self.alive,
+            "action": self.action,
+            "frame_index": self.frame_index,
+            "flip": self.flip,
+            # Add ranged cooldown data
+            "ranged_cooldown": self.ranged_cooldown,
+            "last_ranged_time": self.last_ranged_time,
+            "ranged_attack_used": self.ranged_attack_used,
+            # Add projectiles data for network sync
+            "projectiles": [
+                {"id": p.id, "x": p.rect.x, "y": p.rect.y, "direction": p.direction, "active": p.active} 
+                for p in self.projectiles
+            ]
+        }
+        return state
+
+    def snapshot(self):
+        """Return get_state() plus the internal timers restore() needs for an exact copy"""
+        state = self.get_state()
+        state["anim_ticks"] = self.anim_ticks
+        state["attack_has_hit"] = self.attack_has_hit
+        state["remote_attacking"] = self.remote_attacking
+        state["remote_attack_action"] = self.remote_attack_action
+        state["next_projectile_id"] = self.next_projectile_id
+        return state
+
+    def restore(self, state):
+        """Put the fighter back exactly into a state taken with snapshot().
+
+        Unlike Fighter.set_state, which merges network updates, nothing
+        is kept from the current state.
+        """
+        self.rect.x = state["x"]
+        self.rect.y = state["y"]
+        self.vel_y = state["vel_y"]
+        self.running = state["running"]
+        self.jump = state["jump"]
+        self.attacking = state["attacking"]
+        self.attack_type = state["attack_type"]
+        self.attack_cooldown = state["attack_cooldown"]
+        self.attack_has_hit = state["attack_has_hit"]
+        self.hit = state["hit"]
+        self.hit_cooldown = state["hit_cooldown"]
+        self.health = state["health"]
+        self.alive = state["alive"]
+        self.action = state["action"]
+        self.frame_index = state["frame_index"]
+        self.anim_ticks = state["anim_ticks"]
+        self.flip = state["flip"]
+        self.remote_attacking = state["remote_attacking"]
+        self.remote_attack_action = state["remote_attack_action"]
+        self.ranged_cooldown = state["ranged_cooldown"]
+        self.last_ranged_time = state["last_ranged_time"]
+        self.ranged_attack_used = state["ranged_attack_used"]
+        self.next_projectile_id = state["next_projectile_id"]
+        self.release_projectiles()
+        for proj_data in state["projectiles"]:
+            projectile = projectile_pool.acquire(proj_data["x"], proj_data["y"], proj_data["direction"],
+                                                 self.stats.projectile_speed, self.stats.projectile_damage,
+                                                 self, proj_data["id"])
+            projectile.active = proj_data["active"]
+            self.projectiles.append(projectile)
+
+    def release_projectiles(self):
+        """Return every projectile to the pool, e.g. before the fighter is discarded"""
+        projectiles, self.projectiles = self.projectiles, []
+        for projectile in projectiles:
+            projectile_pool.release(projectile)
+
+    def fire_projectile(self, x, y, direction):
+        """Launch a projectile from the pool with the next projectile id"""
+        projectile_id = self.next_projectile_id
+        self.next_projectile_id = projectile_id % MAX_PROJECTILE_ID + 1
+        self.projectiles.append(projectile_pool.acquire(x, y, direction, self.stats.projectile_speed,
+                                                        self.stats.projectile_damage, self, projectile_id))
+
+    def apply_input(self, inputs, target, round_over, arena_width=ARENA_WIDTH, arena_height=ARENA_HEIGHT):
+        """Advance movement, attacks and projectiles by one frame.
+
+        inputs has the keys left, right, jump, attack1 and attack2; missing
+        keys count as not pressed.
+        """
+        dx = 0
+        dy = 0
+        self.running = False
+        self.attack_type = 0
+
+        # Only process input if the fighter is alive and round is not over
+        if self.alive and not round_over and inputs and not self.attacking:
+            # Movement
+            if inputs.get("left", False):
+                dx = -SPEED
+                self.running = True
+            if inputs.get("right", False):
+                dx = SPEED
+                self.running = True
+            # Jump
+            if inputs.get("jump", False) and not self.jump:
+                self.vel_y = JUMP_VELOCITY
+                self.jump = True
+            # Attack
+            if inputs.get("attack1", False):
+                self.attack_type = 1
+                self.attack(target)
+            elif inputs.get("attack2", False):
+                # Only allow ranged attack if not on cooldown
+                if self.ranged_cooldown == 0:
+                    self.attack_type = 2
+                    self.attack(target)
+
+        # Update projectiles
+        self.update_projectiles(target, arena_width)
+
+        # Apply gravity
+        self.vel_y += GRAVITY
+        dy += self.vel_y
+
+        # Ensure player stays on screen
+        floor = arena_height - FLOOR_OFFSET
+        if self.rect.left + dx < 0:
+            dx = -self.rect.left
+        if self.rect.right + dx > arena_width:
+            dx = arena_width - self.rect.right
+        if self.rect.bottom + dy > floor:
+            self.vel_y = 0
+            self.jump = False
+            dy = floor - self.rect.bottom
+
+        # Update player position
+        self.rect.x += dx
+        self.rect.y += dy
+
+        # Face the target (flipped faces right); when level, keep the character's default
+        distance = target.rect.centerx - self.rect.centerx
+        self.flip = distance > 0 or (distance == 0 and self.stats.flip_when_level)
+
+        # Apply attack cooldown
+        if self.attack_cooldown > 0:
+            self.attack_cooldown -= 1
+
+    def update_projectiles(self, target, arena_width):
+        """Move all projectiles and hit target with any whose path crossed it"""
+        if not self.projectiles:
+            return
+        paths = [projectile.move(arena_width) for projectile in self.projectiles]
+
+        # Hits count only if this simulation is authoritative for the owner
+        expired = collision.NO_BOX in paths
+        if self.is_local:
+            for projectile, hit_target in collision.projectile_hits(self.projectiles, paths, [target]):
+                expired = projectile.hit(hit_target) or expired
+
+        # Remove inactive projectiles, only when some just expired
+        if expired:
+            for projectile in self.projectiles:
+                if not projectile.active:
+                    projectile_pool.release(projectile)
+            self.projectiles = [p for p in self.projectiles if p.owner is not None]
+
+    def update(self):
+        """Pick the current action and advance its animation by one frame"""
+        # Updated action priorities to handle remote attacks differently
+        if self.health <= 0:
+            self.health = 0
+            self.alive = False
+            self.update_action(DEATH)
+        elif not self.is_local and self.remote_attacking:
+            # For non-local (remote) fighters, prioritize showing attack animations
+            # even if being hit, to ensure attacks are visible to the opponent
+            if self.attack_type == 1:
+                self.update_action(ATTACK1)
+            elif self.attack_type == 2:
+                self.update_action(ATTACK2)
+        elif self.hit:
+            self.update_action(HIT)
+        elif self.attacking:
+            if self.attack_type == 1:
+                self.update_action(ATTACK1)
+            elif self.attack_type == 2:
+                self.update_action(ATTACK2)
+        elif self.jump:
+            self.update_action(JUMP)
+        elif self.running:
+            self.update_action(RUN)
+        else:
+            self.update_action(IDLE)
+
+        # Advance the animation every few simulation frames
+        self.anim_ticks += 1
+        if self.anim_ticks >= ANIMATION_FRAME_TICKS:
+            self.frame_index += 1
+            self.anim_ticks = 0
+        # Check if the animation has finished
+        if self.frame_index >= self.animation_steps[self.action]:
+            # If the player is dead then end the animation
+            if not self.alive:
+                self.frame_index = self.animation_steps[self.action] - 1
+            else:
+                self.frame_index = 0
+                # Check if an attack was executed
+                if self.action == ATTACK1 or self.action == ATTACK2:
+                    self.attacking = False
+                    self.attack_cooldown = ATTACK_COOLDOWN
+                    self.attack_has_hit = False
+
+                    # Clean up remote attack state when animation finishes
+                    if not self.is_local:
+                        self.remote_attacking = False
+                        self.remote_attack_action = 0
+
+                # Check if damage was taken
+                if self.action == HIT:
+                    self.hit = False
+                    # If the player was in the middle of an attack, then the attack is stopped
+                    # Only cancel attack animation for local fighters
+                    # This allows remote fighters to complete their attack animation
+                    if self.is_local:
+                        self.attacking = False
+                        self.attack_cooldown = ATTACK_COOLDOWN
+                        self.attack_has_hit = False  # Otherwise the cancelled attack blocks all later ones
+
+        # Update hit cooldown if active
+        if self.hit_cooldown > 0:
+            self.hit_cooldown -= 1
+
+    def attack(self, target):
+        hit_successful = False
+
+        if self.attack_cooldown == 0 and not self.attack_has_hit:
+            self.attacking = True
+            self.on_attack(self.attack_type)
+
+            # Handle attack based on type
+            if self.attack_type == 1:
+                # Melee attack
+                attack_width = self.stats.melee_reach * self.rect.width
+
+                if self.flip:
+                    self.melee_box.update(self.rect.centerx, self.rect.y, attack_width, self.rect.height)
+                else:
+                    self.melee_box.update(self.rect.centerx - attack_width, self.rect.y, attack_width, self.rect.height)
+
+                if self.is_local and collision.melee_hits(self.melee_box, [target]):
+                    if target.hit_cooldown <= 0:
+                        prev_health = target.health
+                        target.health -= self.stats.melee_damage
+                        target.hit = True
+                        target.hit_cooldown = HIT_COOLDOWN
+                        hit_successful = True
+                        self.attack_has_hit = True  # ✅ Prevent multiple hits
+                        sim_log.debug("Hit: %s hit %s, health %s -> %s", self.player, target.player, prev_health, target.health)
+
+            elif self.attack_type == 2:
+                if self.ranged_cooldown == 0:
+                    # Ranged attack - Create a projectile when animation is halfway through
+                    if self.frame_index == self.animation_steps[ATTACK2] // 2 and self.is_local:
+                        # Calculate projectile starting position
+                        proj_x = self.rect.centerx + (50 if self.flip else -50)
+                        proj_y = self.rect.centery - 30  # Slightly above center
+
+                        # Create projectile with direction based on player facing
+                        direction = 1 if self.flip else -1
+                        self.fire_projectile(proj_x, proj_y, direction)
+                        sim_log.debug("Projectile fired by Player %s", self.player)
+
+                        # Mark that ranged attack was used - the caller starts the cooldown
+                        self.ranged_attack_used = True
+
+        return hit_successful
+
+    def on_attack(self, attack_type):
+        """Hook called when an attack starts; the rendered Fighter plays its sound here"""
+
+    def update_action(self, new_action):
+        # Check if the new action is different to the previous one
+        if new_action != self.action:
+            self.action = new_action
+            # Restart the animation
+            self.frame_index = 0
+            self.anim_ticks = 0
+
+class MatchState:
+    """Both fighters plus the frame counter; the unit step() advances"""
+
+    def __init__(self, animation_steps_1, animation_steps_2, arena_width=ARENA_WIDTH, arena_height=ARENA_HEIGHT):
+        self.frame = 0
+        self.round_over = False
+        self.round_over_frame = 0  # Frame on which the round ended
+        self.arena_width = arena_width
+        self.arena_height = arena_height
+        self.fighter_1 = FighterState(1, 200, 310, True, animation_steps_1)
+        self.fighter_2 = FighterState(2, 700, 310, False, animation_steps_2)
+
+    @classmethod
+    def with_fighters(cls, fighter_1, fighter_2, frame=0, arena_width=ARENA_WIDTH, arena_height=ARENA_HEIGHT):
+        """Wrap existing fighters, e.g. the rendered Fighters of a running game"""
+        state = cls(fighter_1.animation_steps, fighter_2.animation_steps, arena_width, arena_height)
+        state.frame = frame
+        state.fighter_1 = fighter_1
+        state.fighter_2 = fighter_2
+        return state
+
+    def copy(self):
+        clone = copy.copy(self)
+        clone.fighter_1 = self.fighter_1.copy()
+        clone.fighter_2 = self.fighter_2.copy()
+        return clone
+
+def advance(state, inputs_p1, inputs_p2):
+    """Advance state by one frame in place and return it"""
+    fighter_1, fighter_2 = state.fighter_1, state.fighter_2
+    fighter_1.apply_input(inputs_p1, fighter_2, state.round_over, state.arena_width, state.arena_height)
+    fighter_2.apply_input(inputs_p2, fighter_1, state.round_over, state.arena_width, state.arena_height)
+
+    # Start or run down the ranged attack cooldowns
+    for fighter in (fighter_1, fighter_2):
+        if fighter.ranged_attack_used:
+            fighter.ranged_attack_used = False
+            fighter.ranged_cooldown = fighter.stats.ranged_cooldown
+            fighter.last_ranged_time = state.frame
+        elif fighter.ranged_cooldown > 0:
+            fighter.ranged_cooldown -= 1
+
+    fighter_1.update()
+    fighter_2.update()
+
+    if not state.round_over and (not fighter_1.alive or not fighter_2.alive):
+        state.round_over = True
+        state.round_over_frame = state.frame
+    state.frame += 1
+    return state
+
+def step(state, inputs_p1, inputs_p2):
+    """Return the state one frame after state, leaving state untouched"""
+    return advance(state.copy(), inputs_p1, inputs_p2)
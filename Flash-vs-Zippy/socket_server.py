@@ -1,203 +1,211 @@
-import socket
+import asyncio
+import os
+import random
 import threading
-import json
-import logging
 import time
-import select
-import os
+import clocksync
 from game_resources import GameResources
+import logs
+import metrics
+import protocol
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+# Levels and categories come from FVZ_LOG, see logs.py
+logger = logs.get_logger("server")
 
-# Load game resources for constants
-game_res = GameResources()
+# Load game resources for constants (the server never draws or plays sound)
+game_res = GameResources(headless=True)
 
 # Server configuration
 HOST = '0.0.0.0'  # Listen on all available interfaces
 PORT = 5678       # Port to listen on
-BUFFER_SIZE = 4096
-HEADER_SIZE = 10  # Size of message length header
+HEADER_SIZE = protocol.HEADER_SIZE  # Size of message length header
+MAX_WRITE_BUFFER = 256 * 1024  # Drop clients that stop reading once this much is queued
+TICK_RATE = 30  # Room state broadcasts per second
+LOBBY_TIMEOUT = 0.5  # Seconds to wait for a create/join request before quick-matching
+ROOM_CODE_LENGTH = 4
+ROOM_CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # No 0/O or 1/I lookalikes
+METRICS_HOST = '127.0.0.1'  # The metrics endpoint is for local scrapers only
+METRICS_PORT = int(os.environ.get("FVZ_METRICS_PORT", "0"))  # HTTP port serving /metrics; 0 disables it
+METRICS_REQUEST_TIMEOUT = 5.0  # Seconds a metrics client gets to send its request
 
-class GameServer:
-    def __init__(self):
-        self.server_socket = None
-        self.clients = {}  # socket: player_id
-        self.player_count = 0
-        self.player_sockets = {}  # player_id: socket
+# Message types counted by name in the metrics; anything else a client sends is "other"
+METRIC_MESSAGE_TYPES = frozenset(("input", "state_update", "round_over", "round_reset", "create_room", "join_room",
+                                  "codec", "udp_hello", "opponent_input", "game_state", "registration",
+                                  "game_start", "error", "ping", "pong"))
+
+class ServerMetrics:
+    """What the server counts, exposed in the Prometheus text format on the metrics port"""
+
+    def __init__(self, server):
+        self.server = server
+        registry = self.registry = metrics.Registry()
+        self.messages_received = registry.counter(
+            "fvz_messages_received_total", "Messages received, by type and transport", ("type", "transport"))
+        self.messages_sent = registry.counter(
+            "fvz_messages_sent_total", "Messages sent, by type and transport", ("type", "transport"))
+        self.bytes_received = registry.counter(
+            "fvz_bytes_received_total", "Bytes received, headers included", ("transport",))
+        self.stale_datagrams = registry.counter(
+            "fvz_stale_datagrams_total", "Datagrams dropped as stale or duplicate, redundant resends included")
+        self.bytes_sent = registry.counter(
+            "fvz_bytes_sent_total", "Bytes sent, headers included", ("transport",))
+        self.decode_seconds = registry.histogram(
+            "fvz_decode_seconds", "Time to decode one message", ("transport",))
+        self.encode_seconds = registry.histogram(
+            "fvz_encode_seconds", "Time to encode one message", ("codec",))
+        self.broadcasts = registry.counter(
+            "fvz_broadcasts_total", "game_state broadcasts")
+        self.broadcast_recipients = registry.counter(
+            "fvz_broadcast_recipients_total", "Clients game_state broadcasts were sent to (fan-out)")
+        self.rtt_seconds = registry.histogram(
+            "fvz_rtt_seconds", "Round trip times clients report in their pings", buckets=metrics.RTT_BUCKETS)
+        self.broadcast_encodes = registry.counter(
+            "fvz_broadcast_encodes_total", "Encodes game_state broadcasts needed; recipients sharing one count once")
+        registry.gauge("fvz_rooms", "Rooms open", collect=lambda: {(): len(server.rooms)})
+        registry.gauge("fvz_connections", "Open client connections", collect=lambda: {(): len(server.connections)})
+        registry.add(metrics.Counter(
+            "fvz_player_messages_received_total", "Messages received from each player", ("room", "player"),
+            collect=lambda: self.per_player(lambda connection: connection.messages_received)))
+        registry.add(metrics.Counter(
+            "fvz_player_messages_sent_total", "Messages sent to each player", ("room", "player"),
+            collect=lambda: self.per_player(lambda connection: connection.messages_sent)))
+        registry.add(metrics.Counter(
+            "fvz_player_bytes_sent_total", "Bytes sent to each player", ("room", "player"),
+            collect=lambda: self.per_player(lambda connection: connection.bytes_sent)))
+        registry.gauge(
+            "fvz_player_rtt_seconds", "Smoothed round trip time each player last reported", ("room", "player"),
+            collect=lambda: {key: rtt for key, rtt in self.per_player(lambda connection: connection.rtt).items()
+                             if rtt is not None})
+        registry.gauge(
+            "fvz_write_buffer_bytes", "Bytes queued for each player's TCP stream", ("room", "player"),
+            collect=lambda: self.per_player(lambda connection: 0 if connection.is_closing()
+                                            else connection.transport.get_write_buffer_size()))
+
+    def per_player(self, read):
+        """Return {(room, player): read(connection)} for the players in rooms"""
+        return {(room.code, player_id): read(connection)
+                for room in list(self.server.rooms.values())
+                for player_id, connection in list(room.player_clients.items())}
+
+    def message_received(self, connection, message, transport, decode_time):
+        msg_type = message.get("type")
+        self.messages_received.inc(msg_type if msg_type in METRIC_MESSAGE_TYPES else "other", transport)
+        self.decode_seconds.observe(decode_time, transport)
+        connection.messages_received += 1
+
+    def message_sent(self, connection, msg_type, transport):
+        self.messages_sent.inc(msg_type if msg_type in METRIC_MESSAGE_TYPES else "other", transport)
+        connection.messages_sent += 1
+
+class GameRoom:
+    """One independent match: two player slots and their synchronized state"""
+
+    def __init__(self, server, code, private=False):
+        self.server = server  # Owning GameServer, used for encoding and sending
+        self.code = code
+        self.private = private  # Private rooms are only joinable by code
+        self.clients = {}  # ClientConnection: player_id
+        self.player_clients = {}  # player_id: ClientConnection
         self.player_inputs = {"1": {}, "2": {}}  # Store latest input states
         self.player_states = {"1": {}, "2": {}}  # Store latest fighter states
+        self.received_states = {"1": {}, "2": {}}  # Full states rebuilt from each client's (delta) updates
+        self.state_encoders = {}  # ClientConnection: DeltaEncoder for its game_state stream
+        self.pending_inputs = {}  # player_id: latest input not yet forwarded to the opponent
+        self.dirty = False  # State changed since the last game_state went out
+        self.flush_scheduled = False  # A high-priority flush is queued on the event loop
+        self.reliable_flush = False  # The queued flush carries round events and must use TCP
         self.round_over = False
         self.game_started = False
-        self.running = True
 
-    def start(self):
-        """Start the server"""
-        try:
-            # Create socket
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((HOST, PORT))
-            self.server_socket.listen(2)  # Max 2 connections (2 players)
-            
-            logger.info(f"Server started on {HOST}:{PORT}")
-            
-            # Accept connections in a separate thread
-            accept_thread = threading.Thread(target=self.accept_connections)
-            accept_thread.daemon = True
-            accept_thread.start()
-            
-            # Main server loop
-            try:
-                while self.running:
-                    time.sleep(0.1)  # Small sleep to prevent CPU hogging
-            except KeyboardInterrupt:
-                logger.info("Server shutting down...")
-            finally:
-                self.stop()
-        
-        except Exception as e:
-            logger.error(f"Server error: {e}")
-            self.stop()
+    @property
+    def player_count(self):
+        return len(self.player_clients)
 
-    def stop(self):
-        """Stop the server"""
-        self.running = False
-        if self.server_socket:
-            self.server_socket.close()
-        
-        # Close all client connections
-        for socket in list(self.clients.keys()):
-            socket.close()
-        
-        logger.info("Server stopped")
+    def is_full(self):
+        return self.player_count >= 2
 
-    def accept_connections(self):
-        """Accept incoming connections"""
-        while self.running:
-            try:
-                # Use select to allow for timeout
-                readable, _, _ = select.select([self.server_socket], [], [], 1)
-                
-                if self.server_socket in readable:
-                    client_socket, client_address = self.server_socket.accept()
-                    logger.info(f"New connection from {client_address}")
-                    
-                    # Register and handle the new client
-                    self.register_player(client_socket)
-            
-            except Exception as e:
-                logger.error(f"Error accepting connection: {e}")
-                break
-
-    def register_player(self, client_socket):
-        """Register a new player and start a thread to handle them"""
-        if self.player_count >= 2:
-            self.send_message(client_socket, {"type": "error", "message": "Game is full"})
-            client_socket.close()
-            return
-        
-        # Assign player number
-        self.player_count += 1
-        player_id = str(self.player_count)
+    def add_player(self, client):
+        """Register a new player in this room, returning their id or None if it is full"""
+        if self.is_full():
+            self.server.send_message(client, {"type": "error", "message": "Game is full"})
+            return None
+
+        # Assign the first free player slot
+        player_id = "1" if "1" not in self.player_clients else "2"
         
         # Store the connection
-        self.clients[client_socket] = player_id
-        self.player_sockets[player_id] = client_socket
+        self.clients[client] = player_id
+        self.player_clients[player_id] = client
         
         # Notify the player of their ID
-        logger.info(f"Registering Player {player_id}")
-        self.send_message(client_socket, {
+        logger.info("Registering Player %s in room %s", player_id, self.code)
+        # Offer our codecs; clients that don't know about them stay on JSON
+        self.server.send_message(client, {
             "type": "registration", 
-            "player_id": player_id
+            "player_id": player_id,
+            "room": self.code,
+            "codecs": protocol.SUPPORTED_CODECS,
+            "features": protocol.SUPPORTED_FEATURES,
+            "udp_token": client.udp_token,
+            "udp_port": self.server.port
         })
         
-        logger.info(f"Player {player_id} registered")
-        
-        # Start thread to handle this client
-        client_thread = threading.Thread(target=self.handle_client, args=(client_socket, player_id))
-        client_thread.daemon = True
-        client_thread.start()
+        logger.info("Player %s registered in room %s", player_id, self.code)
         
         # If we have 2 players, start the game
         if self.player_count == 2:
             self.game_started = True
             self.notify_game_start()
 
-    def handle_client(self, client_socket, player_id):
-        """Handle communications with a client"""
-        try:
-            while self.running:
-                # Receive data from client
-                try:
-                    message = self.receive_message(client_socket)
-                    if not message:
-                        logger.info(f"No message received from Player {player_id}, breaking connection")
-                        break
+        return player_id
+
+    def remove_player(self, client, player_id):
+        """Forget a disconnected player and reset their slot"""
+        if client in self.clients:
+            del self.clients[client]
                     
-                    # Process the message
-                    self.process_message(client_socket, player_id, message)
+        if self.player_clients.get(player_id) is client:
+            del self.player_clients[player_id]
                 
-                except ConnectionError:
-                    logger.info(f"Connection error with Player {player_id}")
-                    break
-                except Exception as e:
-                    logger.error(f"Error handling client {player_id}: {e}")
-                    break
+        if player_id in self.player_inputs:
+            self.player_inputs[player_id] = {}
         
-        finally:
-            # Clean up when a player disconnects
-            logger.info(f"Player {player_id} disconnected")
-            
-            if client_socket in self.clients:
-                del self.clients[client_socket]
-            
-            if player_id in self.player_sockets:
-                del self.player_sockets[player_id]
-            
-            self.player_count -= 1
-            
-            if player_id in self.player_inputs:
-                self.player_inputs[player_id] = {}
-            
-            if player_id in self.player_states:
-                self.player_states[player_id] = {}
-            
-            if self.player_count == 0:
-                self.game_started = False
-                self.round_over = False
+        if player_id in self.player_states:
+            self.player_states[player_id] = {}
+
+        self.received_states[player_id] = {}
+        self.state_encoders.pop(client, None)
+        self.pending_inputs.pop(player_id, None)
             
-            try:
-                client_socket.close()
-            except:
-                pass
+        if self.player_count == 0:
+            self.game_started = False
+            self.round_over = False
 
-    def process_message(self, client_socket, player_id, data):
-        """Process a message received from a client"""
+    def process_message(self, client, player_id, data):
+        """Process a message received from a client in this room"""
         try:
             # Handle different message types
             msg_type = data.get("type", "")
             
             if msg_type == "input":
-                # Store the input state for this player
-                self.player_inputs[player_id] = data.get("input", {})
-                
-                # Forward input to the other player
-                other_player = "2" if player_id == "1" else "1"
-                if other_player in self.player_sockets:
-                    try:
-                        self.send_message(self.player_sockets[other_player], {
-                            "type": "opponent_input",
-                            "input": data.get("input", {})
-                        })
-                    except:
-                        logger.error(f"Failed to forward input to Player {other_player}")
+                input_data = data.get("input", {})
+                if "frame" in data and protocol.FEATURE_ROLLBACK in client.features:
+                    # Rollback peers need every frame's input as soon as possible,
+                    # so relay it right away instead of on the next tick
+                    self.relay_input(player_id, data)
+                elif input_data != self.player_inputs.get(player_id):
+                    # Otherwise forward it on the next tick if it differs from
+                    # what the opponent last received
+                    self.pending_inputs[player_id] = input_data
+                self.player_inputs[player_id] = input_data
             
             elif msg_type == "state_update":
                 # Player is sending their current state
                 state = data.get("state", {})
                 prev_state = self.player_states.get(player_id, {})
+                if data.get("delta"):
+                    # Rebuild the full state from the last one this client sent
+                    state = protocol.apply_delta(self.received_states.get(player_id, {}), state)
                 target_player_id = data.get("player_id", player_id)
                 priority = data.get("priority", "normal")
                 
@@ -219,147 +227,625 @@ class GameServer:
                             target_prev_state["hit"] = True
                             target_prev_state["hit_cooldown"] = 45
                             
-                            logger.info(f"Player {player_id} reported health change for Player {target_player_id}: {state['health']}")
+                            logger.debug("Player %s reported health change for Player %s: %s", player_id, target_player_id, state['health'])
                             
                             # Update stored state
                             self.player_states[target_player_id] = target_prev_state
                             
                             # Notify immediately
-                            self.broadcast_game_state()
+                            self.request_flush()
                 else:
                     # This is normal state update for the player's own state
                     # Check if health has changed, prioritize health synchronization
                     if "health" in state and "health" in prev_state:
                         if state["health"] < prev_state["health"]:
-                            logger.info(f"Health change detected for Player {player_id}: {prev_state['health']} -> {state['health']}")
+                            logger.debug("Health change detected for Player %s: %s -> %s", player_id, prev_state['health'], state['health'])
                             
-                    # Store the updated state
-                    self.player_states[player_id] = state
+                    # Store the updated state. player_states is edited in place by
+                    # opponent health reports, so keep the client's own copy separate
+                    self.received_states[player_id] = state
+                    self.player_states[player_id] = dict(state)
                     
-                    # Forward state to the other player immediately on health change or high priority
-                    other_player = "2" if player_id == "1" else "1"
+                    # Health changes and high priority updates skip the tick queue
                     if (("health" in state and "health" in prev_state and state["health"] < prev_state["health"]) or 
                         priority == "high"):
-                        if other_player in self.player_sockets:
-                            try:
-                                # Send immediate health update to opponent
-                                self.send_message(self.player_sockets[other_player], {
-                                    "type": "game_state",
-                                    "player_states": self.player_states,
-                                    "round_over": self.round_over
-                                })
-                                logger.info(f"Sent immediate health update to Player {other_player}")
-                            except:
-                                logger.error(f"Failed to send immediate health update to Player {other_player}")
-                    
-                    # Broadcast complete state periodically
-                    if self.player_states.get("1") and self.player_states.get("2"):
-                        self.broadcast_game_state()
+                        self.request_flush()
+                    # Everything else goes out with the next tick once both players have a state
+                    elif self.player_states.get("1") and self.player_states.get("2"):
+                        self.dirty = True
             
             elif msg_type == "round_over":
-                logger.info(f"Round over received from Player {player_id}")
+                logger.info("Round over received from Player %s in room %s", player_id, self.code)
                 self.round_over = True
-                self.broadcast_game_state()
+                self.request_flush(reliable=True)
             
             elif msg_type == "round_reset":
-                logger.info(f"Round reset received from Player {player_id}")
+                logger.info("Round reset received from Player %s in room %s", player_id, self.code)
                 self.round_over = False
                 # Reset player states but keep connections active
                 self.player_states = {"1": {}, "2": {}}
-                self.broadcast_game_state()
+                self.request_flush(reliable=True)
                 
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
+            logger.error("Error processing message: %s", e)
+
+    def relay_input(self, player_id, data):
+        """Forward a frame-numbered input (and its history) to the opponent immediately"""
+        other_player = "2" if player_id == "1" else "1"
+        if other_player in self.player_clients:
+            self.server.send_message(self.player_clients[other_player], {
+                "type": "opponent_input",
+                "input": data.get("input", {}),
+                "frame": data["frame"],
+                "history": data.get("history", [])
+            }, reliable=False)
+
+    def request_flush(self, reliable=False):
+        """Send pending state right away instead of on the next tick.
+
+        Several urgent events handled in the same loop iteration share one
+        flush. Round events pass reliable=True so they never go over UDP.
+        """
+        self.dirty = True
+        self.reliable_flush = self.reliable_flush or reliable
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.server.loop.call_soon(self.flush)
+
+    def flush(self):
+        """Forward changed inputs and send one game_state per client if anything changed"""
+        self.flush_scheduled = False
+        reliable = self.reliable_flush
+        self.reliable_flush = False
 
-    def broadcast_game_state(self):
-        """Broadcast the current game state to all players"""
+        for player_id, input_data in list(self.pending_inputs.items()):
+            other_player = "2" if player_id == "1" else "1"
+            if other_player in self.player_clients:
+                try:
+                    self.server.send_message(self.player_clients[other_player], {
+                        "type": "opponent_input",
+                        "input": input_data
+                    }, reliable=False)
+                except Exception:
+                    logger.error("Failed to forward input to Player %s", other_player)
+        self.pending_inputs.clear()
+
+        if self.dirty:
+            self.dirty = False
+            self.broadcast_game_state(reliable)
+
+    def game_state_message(self, client):
+        """Build the next game_state for one client, as a delta if it supports them.
+
+        Deltas rely on in-order delivery, so clients on UDP always get full states.
+        """
         message = {
             "type": "game_state",
             "player_states": self.player_states,
             "round_over": self.round_over
         }
         
-        for player_id, socket in list(self.player_sockets.items()):
+        if protocol.FEATURE_DELTA in client.features and not client.uses_udp():
+            encoder = self.state_encoders.get(client)
+            if encoder is None:
+                encoder = protocol.DeltaEncoder(self.server.keyframe_interval, nested=True)
+                self.state_encoders[client] = encoder
+            message["player_states"], is_delta = encoder.encode(self.player_states)
+            if is_delta:
+                message["delta"] = True
+
+        return message
+
+    def broadcast_game_state(self, reliable=False):
+        """Broadcast the current game state to all players in the room"""
+        # Encode each distinct message once per codec rather than once per player
+        encoded = []
+        server_metrics = self.server.metrics
+        server_metrics.broadcasts.inc()
+        for player_id, client in list(self.player_clients.items()):
             try:
-                self.send_message(socket, message)
+                message = self.game_state_message(client)
+                server_metrics.broadcast_recipients.inc()
+                if not reliable and client.uses_udp():
+                    server_metrics.broadcast_encodes.inc()
+                    self.server.send_datagram(client, message)
+                    continue
+                codec = client.codec
+                for cached_codec, cached_message, cached_frame in encoded:
+                    if cached_codec == codec and cached_message == message:
+                        frame = cached_frame
+                        break
+                else:
+                    frame = self.server.encode_message(message, codec)
+                    encoded.append((codec, message, frame))
+                    server_metrics.broadcast_encodes.inc()
+                self.server.write_frame(client, frame)
+                server_metrics.message_sent(client, "game_state", "tcp")
             except Exception as e:
-                logger.error(f"Failed to send game state to Player {player_id}: {e}")
-                # Don't remove the player here, let the handle_client thread do it
+                logger.error("Failed to send game state to Player %s: %s", player_id, e)
+                # Don't remove the player here, connection_lost does it
 
     def notify_game_start(self):
-        """Notify all players that the game has started"""
+        """Notify all players in the room that the game has started"""
         message = {"type": "game_start"}
         
-        for player_id, socket in self.player_sockets.items():
-            self.send_message(socket, message)
+        for player_id, client in self.player_clients.items():
+            self.server.send_message(client, message)
         
-        logger.info("Game started, notified all players")
+        logger.info("Game started in room %s, notified all players", self.code)
+
+class ClientConnection(asyncio.BufferedProtocol):
+    """One client TCP connection.
+
+    Incoming bytes are read straight into the connection's FrameReader buffer
+    and complete frames are decoded in place. Rooms write to it much like
+    they would to a StreamWriter.
+    """
 
-    def send_message(self, client_socket, message):
-        """Send a message to a client with length prefix"""
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.frame_reader = protocol.FrameReader()
+        self.codec = protocol.CODEC_JSON  # Negotiated wire codec
+        self.features = []  # Negotiated optional protocol features
+        self.room = None
+        self.player_id = None
+        self.lobby_timer = None
+        # UDP transport state, used once the client enables the udp feature
+        self.udp_token = random.getrandbits(32)  # Identifies our datagrams
+        self.udp_addr = None  # Learned from the client's first datagram
+        self.udp_send_seq = 0
+        self.udp_recv_seq = 0
+        self.last_input_frame = -1  # Newest input frame applied (rollback frames start at 0)
+        self.udp_recent = {}  # message type: last datagram message, repeated for redundancy
+        self.udp_resends = 0  # Ticks left to repeat udp_recent
+        self.udp_sent_this_tick = False
+        # Traffic counters, exported per player by ServerMetrics
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.rtt = None  # Round trip time the client reported in its last ping, in seconds
+
+    def uses_udp(self):
+        """Whether unreliable traffic for this client goes over UDP"""
+        return self.udp_addr is not None and protocol.FEATURE_UDP in self.features
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connection_made(self)
+
+    def get_buffer(self, sizehint):
+        return self.frame_reader.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self.frame_reader.buffer_updated(nbytes)
+        server_metrics = self.server.metrics
+        server_metrics.bytes_received.inc("tcp", amount=nbytes)
         try:
-            # Convert message to JSON
-            json_data = json.dumps(message)
-            
-            # Create message with header (length prefix)
-            msg_length = len(json_data)
-            header = f"{msg_length:<{HEADER_SIZE}}"
-            full_message = header + json_data
-            
-            # Send the message
-            client_socket.sendall(full_message.encode('utf-8'))
-            logger.debug(f"Sent message: {message}")
-            
+            for payload in self.frame_reader.frames():
+                started = time.perf_counter()
+                message = protocol.decode_payload(payload)
+                server_metrics.message_received(self, message, "tcp", time.perf_counter() - started)
+                self.server.handle_message(self, message)
+                if self.is_closing():
+                    break
+        except protocol.ProtocolError as e:
+            logger.error("Invalid message from %s: %s", self.get_extra_info('peername'), e)
+            self.close()
+
+    def connection_lost(self, exc):
+        self.server.connection_lost(self)
+
+    def write(self, data):
+        self.transport.write(data)
+
+    def is_closing(self):
+        return self.transport is None or self.transport.is_closing()
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
+
+class DatagramEndpoint(asyncio.DatagramProtocol):
+    """The server's UDP socket; datagrams are matched to clients by token"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.handle_datagram(data, addr)
+
+class GameServer:
+    def __init__(self, host=HOST, port=PORT, keyframe_interval=protocol.KEYFRAME_INTERVAL,
+                 tick_rate=TICK_RATE, metrics_port=METRICS_PORT):
+        self.host = host
+        self.port = port
+        self.metrics_port = metrics_port  # Serve /metrics on METRICS_HOST at this port; 0 or None disables it
+        self.tick_rate = tick_rate  # Room state broadcasts per second
+        self.keyframe_interval = keyframe_interval  # Full game_state at least every N messages
+        self.server = None
+        self.loop = None
+        self.rooms = {}  # room code: GameRoom
+        self.connections = set()  # Every open ClientConnection, in a room or not
+        self.udp_clients = {}  # udp token: ClientConnection
+        self.udp_transport = None
+        self.metrics = ServerMetrics(self)
+        self.metrics_server = None
+        self.running = True
+        self.ready = threading.Event()  # Set once listening, or once starting failed (see error)
+        self.error = None  # Exception that stopped the server from starting or serving
+
+    def start(self):
+        """Start the server and run its event loop until stopped"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            logger.info("Server shutting down...")
         except Exception as e:
-            logger.error(f"Error sending message: {e}")
-            raise
+            self.error = e
+            logger.error("Server error: %s", e)
+        finally:
+            self.ready.set()  # Never leave start_in_thread waiting
+            logger.info("Server stopped")
 
-    def receive_message(self, client_socket):
-        """Receive a message from a client with length prefix"""
+    def start_in_thread(self, timeout=5.0):
+        """Run the server on a daemon thread and return once it accepts connections
+
+        Raises the startup error (e.g. the port is already in use), or
+        TimeoutError if the server is not listening within timeout seconds.
+        """
+        thread = threading.Thread(target=self.start, name="GameServer", daemon=True)
+        thread.start()
+        if not self.ready.wait(timeout):
+            self.stop()
+            raise TimeoutError(f"Server did not start within {timeout} seconds")
+        if self.error:
+            raise self.error
+        return thread
+
+    async def serve(self):
+        """Accept and serve clients on the running event loop"""
+        self.loop = asyncio.get_running_loop()
+        self.server = await self.loop.create_server(lambda: ClientConnection(self), self.host, self.port,
+                                                    reuse_address=True)
+        self.udp_transport, _ = await self.loop.create_datagram_endpoint(lambda: DatagramEndpoint(self),
+                                                                        local_addr=(self.host, self.port))
+        logger.info("Server started on %s:%s (%s Hz tick, TCP and UDP)", self.host, self.port, self.tick_rate)
+        if self.metrics_port:
+            self.metrics_server = await asyncio.start_server(self.handle_metrics_request, METRICS_HOST,
+                                                             self.metrics_port, reuse_address=True)
+            logger.info("Metrics served on http://%s:%s/metrics", METRICS_HOST, self.metrics_port)
+        self.ready.set()
+
+        tick_task = asyncio.ensure_future(self.tick_loop())
         try:
-            # Receive the header (message length)
-            header = client_socket.recv(HEADER_SIZE)
-            if not header:
-                logger.info("No header received, client likely disconnected")
-                return None
-            
-            try:
-                # Parse the message length
-                message_length = int(header.decode('utf-8').strip())
-                logger.debug(f"Receiving message of length {message_length}")
-            except ValueError:
-                logger.error(f"Invalid header received: {header}")
-                return None
-            
-            # Receive the actual message
-            full_message = b""
-            bytes_received = 0
-            
-            while bytes_received < message_length:
-                chunk = client_socket.recv(min(BUFFER_SIZE, message_length - bytes_received))
-                if not chunk:
-                    logger.info("Connection closed while receiving message")
-                    return None
-                
-                full_message += chunk
-                bytes_received += len(chunk)
-            
-            # Parse the message as JSON
-            try:
-                message = json.loads(full_message.decode('utf-8'))
-                logger.debug(f"Received message: {message}")
-                return message
-            except json.JSONDecodeError:
-                logger.error(f"Invalid JSON received: {full_message}")
-                return None
+            async with self.server:
+                await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            tick_task.cancel()
+            self.udp_transport.close()
+            if self.metrics_server:
+                self.metrics_server.close()
+            self.close_clients()
+
+    async def handle_metrics_request(self, reader, writer):
+        """Answer one HTTP request on the metrics port with the metrics text"""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), METRICS_REQUEST_TIMEOUT)
+            parts = request.split(b" ", 2)
+            path = parts[1].split(b"?")[0] if len(parts) == 3 else b""
+            if path in (b"/", b"/metrics"):
+                status, content_type, body = "200 OK", metrics.CONTENT_TYPE, self.metrics.registry.render().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"Not found\n"
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def tick_loop(self):
+        """Flush every room at a fixed rate"""
+        interval = 1.0 / self.tick_rate
+        next_tick = self.loop.time()
+        while self.running:
+            for room in list(self.rooms.values()):
+                room.flush()
+            self.resend_datagrams()
+
+            # Schedule against the ideal timeline, skipping ticks we fell behind on
+            next_tick += interval
+            delay = next_tick - self.loop.time()
+            if delay < 0:
+                next_tick = self.loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def stop(self):
+        """Stop the server (safe to call from any thread)"""
+        self.running = False
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self.loop:
+            self._close_server()
+        else:
+            self.loop.call_soon_threadsafe(self._close_server)
+
+    def _close_server(self):
+        """Stop listening; serve() then closes the client connections"""
+        if self.server:
+            self.server.close()
+
+    def close_clients(self):
+        """Close all client connections"""
+        for connection in list(self.connections):
+            connection.close()
+
+    def generate_room_code(self):
+        """Return a short, unused, easy-to-read room code"""
+        while True:
+            code = "".join(random.choice(ROOM_CODE_ALPHABET) for _ in range(ROOM_CODE_LENGTH))
+            if code not in self.rooms:
+                return code
+
+    def create_room(self, private=False):
+        """Open a new empty room"""
+        room = GameRoom(self, self.generate_room_code(), private)
+        self.rooms[room.code] = room
+        logger.info("Room %s created (%s), %s rooms open", room.code, 'private' if private else 'public', len(self.rooms))
+        return room
+
+    def find_room(self, request):
+        """Resolve a lobby request to a room, or return an error string"""
+        msg_type = request.get("type", "")
+
+        if msg_type == "create_room":
+            return self.create_room(private=True), None
+
+        code = str(request.get("room") or "").strip().upper()
+        if code:
+            room = self.rooms.get(code)
+            if room is None:
+                return None, f"Room {code} not found"
+            if room.is_full():
+                return None, f"Room {code} is full"
+            return room, None
+
+        # Quick match: fill the oldest public room waiting for an opponent
+        for room in self.rooms.values():
+            if not room.private and not room.is_full():
+                return room, None
+        return self.create_room(), None
+
+    def close_room_if_empty(self, room):
+        """Drop a room once its last player has left"""
+        if room.player_count == 0 and self.rooms.get(room.code) is room:
+            del self.rooms[room.code]
+            logger.info("Room %s closed, %s rooms open", room.code, len(self.rooms))
+
+    def connection_made(self, connection):
+        """Track a new connection and give it a moment to ask for a room.
+
+        Clients that predate rooms send nothing before registration, so a
+        silent connection is quick-matched once LOBBY_TIMEOUT expires.
+        """
+        logger.info("New connection from %s", connection.get_extra_info('peername'))
+        self.connections.add(connection)
+        self.udp_clients[connection.udp_token] = connection
+        connection.lobby_timer = self.loop.call_later(LOBBY_TIMEOUT, self.join_room, connection, {})
+
+    def join_room(self, connection, request):
+        """Place a connection in the room its lobby request asks for"""
+        if connection.lobby_timer:
+            connection.lobby_timer.cancel()
+            connection.lobby_timer = None
+        if connection.room is not None or connection.is_closing():
+            return
+
+        room, error = self.find_room(request)
+        if room is None:
+            self.send_message(connection, {"type": "error", "message": error})
+            connection.close()
+            return
+
+        # Register the new client
+        player_id = room.add_player(connection)
+        if player_id is None:
+            self.close_room_if_empty(room)
+            connection.close()
+            return
+
+        connection.room = room
+        connection.player_id = player_id
+
+    def connection_lost(self, connection):
+        """Clean up when a client disconnects"""
+        self.connections.discard(connection)
+        self.udp_clients.pop(connection.udp_token, None)
+        if connection.lobby_timer:
+            connection.lobby_timer.cancel()
+            connection.lobby_timer = None
+
+        room = connection.room
+        if room is None:
+            logger.info("Connection from %s closed before joining a room", connection.get_extra_info('peername'))
+            return
+
+        logger.info("Player %s disconnected from room %s", connection.player_id, room.code)
+        room.remove_player(connection, connection.player_id)
+        self.close_room_if_empty(room)
+        connection.room = None
+
+    def handle_message(self, connection, data):
+        """Route a decoded message to the lobby, the connection or its room"""
+        if connection.room is None:
+            # Lobby: the first message picks a room
+            if data.get("type") not in ("create_room", "join_room"):
+                logger.error("Unexpected lobby message %r, using quick match", data.get('type'))
+                data = {}
+            self.join_room(connection, data)
+
+        elif data.get("type") == "ping":
+            self.answer_ping(connection, data, clocksync.now())
+
+        elif data.get("type") == "codec":
+            # Client picked one of the codecs offered at registration
+            player_id = connection.player_id
+            codec = data.get("codec", protocol.CODEC_JSON)
+            if codec in protocol.SUPPORTED_CODECS:
+                connection.codec = codec
+                logger.info("Player %s switched to %s codec", player_id, codec)
+            else:
+                logger.error("Player %s requested unknown codec %s", player_id, codec)
+
+            # Optional features picked from the ones offered at registration
+            connection.features = protocol.choose_features(data.get("features"))
+            if connection.features:
+                logger.info("Player %s enabled features: %s", player_id, ', '.join(connection.features))
+
+        else:
+            connection.room.process_message(connection, connection.player_id, data)
+
+    def handle_datagram(self, data, addr):
+        """Apply a datagram from a client that negotiated the udp feature"""
+        received = clocksync.now()
+        self.metrics.bytes_received.inc("udp", amount=len(data))
+        started = time.perf_counter()
+        try:
+            token, seq, message = protocol.decode_datagram(data)
+        except protocol.ProtocolError as e:
+            logger.debug("Dropped invalid datagram from %s: %s", addr, e)
+            return
+        decode_time = time.perf_counter() - started
+
+        connection = self.udp_clients.get(token)
+        if connection is None or connection.room is None or protocol.FEATURE_UDP not in connection.features:
+            return
+        if seq <= connection.udp_recv_seq:
+            self.metrics.stale_datagrams.inc()
+            return  # Stale or duplicate
+        self.metrics.message_received(connection, message, "udp", decode_time)
+        connection.udp_recv_seq = seq
+        connection.udp_addr = addr  # Follows NAT rebinding too
+
+        msg_type = message.get("type")
+        if msg_type not in protocol.UDP_MESSAGE_TYPES or msg_type == "udp_hello":
+            return
+
+        if msg_type == "ping":
+            self.answer_ping(connection, message, received, udp=True)
+        elif msg_type == "input" and protocol.FEATURE_ROLLBACK in connection.features:
+            # Rollback inputs are numbered by simulation frame; relay the newest as is,
+            # again when a stalled client resends it (see GameClient.resend_rollback_inputs)
+            if message.get("frame", 0) >= connection.last_input_frame:
+                connection.last_input_frame = message["frame"]
+                connection.room.process_message(connection, connection.player_id, message)
+        elif msg_type == "input" and "frame" in message:
+            # Apply every frame we have not seen yet, oldest first; the history
+            # covers inputs whose own datagrams were lost
+            frames = [message.get("input", {})] + message.get("history", [])
+            newest_frame = message["frame"]
+            for age in range(len(frames) - 1, -1, -1):
+                if newest_frame - age > connection.last_input_frame:
+                    connection.room.process_message(connection, connection.player_id,
+                                                    {"type": "input", "input": frames[age]})
+            connection.last_input_frame = max(connection.last_input_frame, newest_frame)
+        else:
+            connection.room.process_message(connection, connection.player_id, message)
+
+    def answer_ping(self, connection, ping, received, udp=False):
+        """Answer a clock ping on the transport it came on and note the client's RTT"""
+        rtt = ping.get("rtt")
+        if isinstance(rtt, (int, float)) and rtt >= 0:
+            connection.rtt = rtt
+            self.metrics.rtt_seconds.observe(rtt)
+        message = clocksync.pong(ping, received)
+        if udp:
+            # Not through send_datagram: a repeated pong would carry stale timestamps
+            self._write_datagram(connection, message)
+        else:
+            self.send_message(connection, message)
+
+    def send_datagram(self, client, message):
+        """Send a message over UDP and remember it for redundant resends"""
+        client.udp_recent[message["type"]] = message
+        client.udp_resends = protocol.UDP_REDUNDANCY
+        client.udp_sent_this_tick = True
+        self._write_datagram(client, message)
+
+    def _write_datagram(self, client, message):
+        client.udp_send_seq += 1
+        started = time.perf_counter()
+        data = protocol.encode_datagram(client.udp_token, client.udp_send_seq, message, client.codec)
+        self.metrics.encode_seconds.observe(time.perf_counter() - started, client.codec)
+        self.udp_transport.sendto(data, client.udp_addr)
+        self.metrics.bytes_sent.inc("udp", amount=len(data))
+        self.metrics.message_sent(client, message["type"], "udp")
+        client.bytes_sent += len(data)
+
+    def resend_datagrams(self):
+        """Repeat the latest unreliable messages for a few quiet ticks.
+
+        Room flushes only send on change, so without this a single lost
+        datagram would leave a client stale until the next change.
+        """
+        for connection in list(self.connections):
+            if connection.uses_udp():
+                if not connection.udp_sent_this_tick and connection.udp_resends > 0:
+                    connection.udp_resends -= 1
+                    for message in connection.udp_recent.values():
+                        self._write_datagram(connection, message)
+                connection.udp_sent_this_tick = False
+
+    def write_frame(self, client, data):
+        """Queue an encoded frame on a client stream without blocking the loop"""
+        if client.is_closing():
+            raise ConnectionError("Client stream is closed")
+        client.write(data)
+        self.metrics.bytes_sent.inc("tcp", amount=len(data))
+        client.bytes_sent += len(data)
+
+        # A client that stops reading would otherwise grow our buffers forever
+        if client.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            logger.error("Client %s is not reading, disconnecting", client.get_extra_info('peername'))
+            client.close()
+
+    def encode_message(self, message, codec):
+        """protocol.encode_message, timed for the metrics"""
+        started = time.perf_counter()
+        data = protocol.encode_message(message, codec)
+        self.metrics.encode_seconds.observe(time.perf_counter() - started, codec)
+        return data
+
+    def send_message(self, client, message, reliable=True):
+        """Send a message to a client with length prefix, or over UDP when allowed"""
+        try:
+            if not reliable and client.uses_udp():
+                self.send_datagram(client, message)
+                return
+
+            # Encode with the codec negotiated for this client and add the length prefix
+            self.write_frame(client, self.encode_message(message, client.codec))
+            self.metrics.message_sent(client, message["type"], "tcp")
+            logger.debug("Sent message: %s", message)
             
-        except ConnectionError:
-            raise
         except Exception as e:
-            logger.error(f"Error receiving message: {e}")
-            return None
+            logger.error("Error sending message: %s", e)
+            raise
 
 # Run the server if this script is executed directly
 if __name__ == "__main__":
     server = GameServer()
-    server.start()
\ No newline at end of file
+    server.start()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The game modules are imported as top-level modules, as when run from Flash-vs-Zippy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
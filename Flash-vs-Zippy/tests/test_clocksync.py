@@ -0,0 +1,88 @@
+import pytest
+
+import clocksync
+from clocksync import FILTER_SAMPLES, ClockSync
+
+SERVER_OFFSET = 1000.0  # Server clock minus local clock
+
+class FakeClock:
+    def __init__(self, time=5.0):
+        self.time = time
+
+    def __call__(self):
+        return self.time
+
+def exchange(sync, clock, uplink, downlink, processing=0.001):
+    """One ping/pong with the given one-way delays; returns whether the pong was accepted"""
+    ping = dict(sync.ping(), type="ping")
+    received = clock.time + uplink + SERVER_OFFSET
+    pong = clocksync.pong(ping, received, clock=lambda: received + processing)
+    clock.time += uplink + processing + downlink
+    return sync.on_pong(pong)
+
+def test_first_pong_sets_rtt_and_offset():
+    clock = FakeClock()
+    sync = ClockSync(clock)
+    assert not sync.synced
+    assert exchange(sync, clock, 0.02, 0.02)
+    assert sync.synced
+    assert sync.rtt == pytest.approx(0.04)
+    assert sync.jitter == pytest.approx(0.02)
+    assert sync.offset == pytest.approx(SERVER_OFFSET)
+
+def test_rtt_is_smoothed():
+    clock = FakeClock()
+    sync = ClockSync(clock)
+    exchange(sync, clock, 0.02, 0.02)
+    exchange(sync, clock, 0.06, 0.06)
+    # A 120 ms sample moves the 40 ms estimate an eighth of the way
+    assert sync.rtt == pytest.approx(0.04 + (0.12 - 0.04) / 8)
+    assert sync.jitter == pytest.approx(0.02 + (0.08 - 0.02) / 4)
+
+def test_offset_comes_from_the_lowest_rtt_of_the_last_samples():
+    clock = FakeClock()
+    sync = ClockSync(clock)
+    # Symmetric and fast: exact offset. The rest are queued on the way up, which skews their offset
+    exchange(sync, clock, 0.005, 0.005)
+    for i in range(FILTER_SAMPLES - 1):
+        exchange(sync, clock, 0.05 + i * 0.01, 0.01)
+    assert sync.min_rtt == pytest.approx(0.01)
+    assert sync.offset == pytest.approx(SERVER_OFFSET)
+
+    # The fast sample drops out of the filter: the best of the remaining ones takes over
+    exchange(sync, clock, 0.2, 0.01)
+    assert sync.min_rtt == pytest.approx(0.06)
+    assert sync.offset == pytest.approx(SERVER_OFFSET + (0.05 - 0.01) / 2)
+
+def test_stale_and_malformed_pongs_are_ignored():
+    clock = FakeClock()
+    sync = ClockSync(clock)
+    first = dict(sync.ping(), type="ping")
+    second = dict(sync.ping(), type="ping")
+    assert sync.on_pong(clocksync.pong(second, clock.time + SERVER_OFFSET, clock=lambda: clock.time + SERVER_OFFSET))
+    assert not sync.on_pong(clocksync.pong(first, clock.time + SERVER_OFFSET, clock=lambda: clock.time + SERVER_OFFSET))
+    assert not sync.on_pong({"type": "pong", "seq": 2})
+    assert not sync.on_pong({"type": "pong", "seq": 99, "t0": 0.0, "t1": 0.0, "t2": 0.0})
+
+def test_pings_are_fast_until_the_filter_is_full():
+    clock = FakeClock()
+    sync = ClockSync(clock)
+    between = (clocksync.FAST_PING_INTERVAL + clocksync.PING_INTERVAL) / 2
+    assert sync.ping_due()
+    exchange(sync, clock, 0.01, 0.01)
+    assert not sync.ping_due()
+    clock.time = sync.last_ping + between
+    assert sync.ping_due()
+    for _ in range(FILTER_SAMPLES - 1):
+        exchange(sync, clock, 0.01, 0.01)
+    clock.time = sync.last_ping + between
+    assert not sync.ping_due()
+    clock.time = sync.last_ping + 2 * clocksync.PING_INTERVAL
+    assert sync.ping_due()
+
+def test_clock_conversion():
+    clock = FakeClock()
+    sync = ClockSync(clock)
+    exchange(sync, clock, 0.01, 0.01)
+    assert sync.server_time() == pytest.approx(clock.time + SERVER_OFFSET)
+    assert sync.local_time(sync.server_time(3.0)) == pytest.approx(3.0)
@@ -0,0 +1,25 @@
+import characters
+from fighter import Fighter
+
+def make_fighter(player, is_local):
+    character = characters.for_player(player)
+    return Fighter(player, 200, 310, True, character.data, None, character.animation_steps, None,
+                   is_local, character=character.id)
+
+def test_only_remote_fighters_buffer_snapshots():
+    local, remote = make_fighter(1, True), make_fighter(2, False)
+    assert local.snapshots is None and remote.snapshots is None
+    local.set_state({"x": 300, "y": 310})
+    remote.set_state({"x": 300, "y": 310})
+    assert local.snapshots is None
+    assert len(remote.snapshots.snapshots) == 1
+
+def test_partial_state_keeps_the_last_motion():
+    fighter = make_fighter(2, False)
+    fighter.set_state({"x": 300, "y": 310, "running": True, "jump": False})
+    fighter.set_state({"x": 310})
+    assert fighter.snapshots.snapshots[-1].moving
+
+    fighter.set_state({"x": 320, "running": False})
+    fighter.set_state({"x": 320})
+    assert not fighter.snapshots.snapshots[-1].moving
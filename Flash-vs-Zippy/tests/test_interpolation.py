@@ -0,0 +1,58 @@
+import pytest
+
+from interpolation import SnapshotBuffer
+
+DELAY = 0.1
+MAX_EXTRAPOLATION = 0.1
+
+def buffer_with(*snapshots, moving=True):
+    """A buffer holding (time, x, y) snapshots"""
+    buffer = SnapshotBuffer(DELAY, MAX_EXTRAPOLATION, clock=lambda: 0.0)
+    for received, x, y in snapshots:
+        buffer.push(x, y, moving=moving, received=received)
+    return buffer
+
+def position(sample):
+    x, y, _ = sample
+    return pytest.approx(x), pytest.approx(y)
+
+def test_empty_buffer_has_no_sample():
+    assert buffer_with().sample(at=1.0) is None
+
+def test_interpolates_between_the_snapshots_around_the_render_time():
+    buffer = buffer_with((1.0, 0, 300), (1.1, 100, 250), (1.2, 100, 250))
+    assert position(buffer.sample(at=1.15)) == (50, 275)
+    assert position(buffer.sample(at=1.175)) == (75, 262.5)
+    assert position(buffer.sample(at=1.25)) == (100, 250)
+
+def test_holds_the_oldest_snapshot_before_it():
+    buffer = buffer_with((1.0, 0, 300), (1.1, 100, 300))
+    assert position(buffer.sample(at=1.05)) == (0, 300)
+
+def test_extrapolates_a_moving_fighter_for_at_most_the_limit():
+    buffer = buffer_with((1.0, 0, 300), (1.1, 100, 300))
+    assert position(buffer.sample(at=1.25)) == (150, 300)
+    assert position(buffer.sample(at=1.3)) == (200, 300)
+    assert position(buffer.sample(at=2.0)) == (200, 300)  # Holds once the limit is reached
+
+def test_does_not_extrapolate_a_stationary_fighter():
+    buffer = buffer_with((1.0, 0, 300), (1.1, 100, 300), moving=False)
+    assert position(buffer.sample(at=1.25)) == (100, 300)
+    assert position(buffer.sample(at=2.0)) == (100, 300)
+
+def test_same_instant_snapshot_replaces_the_last():
+    buffer = buffer_with((1.0, 0, 300), (1.1, 100, 300), (1.1, 120, 300))
+    assert len(buffer.snapshots) == 2
+    assert position(buffer.sample(at=1.15)) == (60, 300)
+
+def test_projectiles_are_matched_by_id():
+    buffer = SnapshotBuffer(DELAY, MAX_EXTRAPOLATION, clock=lambda: 0.0)
+    buffer.push(0, 300, [{"id": 1, "x": 0, "y": 350, "direction": 1, "active": True},
+                         {"id": 2, "x": 500, "y": 350, "direction": -1, "active": True}], received=1.0)
+    buffer.push(0, 300, [{"id": 2, "x": 400, "y": 350, "direction": -1, "active": True},
+                         {"id": 1, "x": 100, "y": 350, "direction": 1, "active": True}], received=1.1)
+    _, _, projectiles = buffer.sample(at=1.15)
+    assert [(proj["id"], proj["x"]) for proj in projectiles] == [(1, 50), (2, 450)]
+
+    buffer.push(0, 300, received=1.2)  # No projectiles given: the previous ones carry over
+    assert buffer.snapshots[-1].projectiles == buffer.snapshots[-2].projectiles
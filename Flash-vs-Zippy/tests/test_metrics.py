@@ -0,0 +1,109 @@
+import socket
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import main_socket
+import metrics
+import protocol
+import socket_server
+
+def test_registry_renders_the_prometheus_text_format():
+    registry = metrics.Registry()
+    counter = registry.counter("fvz_things_total", "Things", ("kind",))
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    counter.inc('b"\\')
+    registry.gauge("fvz_open", "Open things", collect=lambda: {(): 4})
+    histogram = registry.histogram("fvz_seconds", "Durations", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+    assert registry.render() == "\n".join([
+        "# HELP fvz_things_total Things",
+        "# TYPE fvz_things_total counter",
+        'fvz_things_total{kind="a"} 3',
+        'fvz_things_total{kind="b\\"\\\\"} 1',
+        "# HELP fvz_open Open things",
+        "# TYPE fvz_open gauge",
+        "fvz_open 4",
+        "# HELP fvz_seconds Durations",
+        "# TYPE fvz_seconds histogram",
+        'fvz_seconds_bucket{le="0.1"} 1',
+        'fvz_seconds_bucket{le="1"} 2',
+        'fvz_seconds_bucket{le="+Inf"} 3',
+        "fvz_seconds_sum 5.55",
+        "fvz_seconds_count 3",
+    ]) + "\n"
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def scrape(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        return response.headers["Content-Type"], response.read().decode()
+
+def value(body, series):
+    """The value of one series in a metrics body, None if absent"""
+    for line in body.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+def wait_for(port, series, ready):
+    """Scrape until ready(value of series) holds, or for at most 5 seconds"""
+    deadline = time.monotonic() + 5
+    while True:
+        _, body = scrape(port)
+        if ready(value(body, series)) or time.monotonic() > deadline:
+            return body
+        time.sleep(0.02)
+
+@pytest.fixture
+def server():
+    server = socket_server.GameServer(port=free_port(), metrics_port=free_port())
+    thread = server.start_in_thread()
+    yield server
+    server.stop()
+    thread.join(5)
+
+def test_duplicate_datagrams_are_counted_apart(server, monkeypatch):
+    tcp_client = main_socket.GameClient()
+    tcp_client.server_port = server.port
+    monkeypatch.setattr(main_socket, "USE_UDP", True)
+    udp_client = main_socket.GameClient()
+    udp_client.server_port = server.port
+    try:
+        assert tcp_client.connect_to_server() and udp_client.connect_to_server()
+        assert udp_client.udp_socket is not None
+        # The server counts the UDP client once one of its hellos gets through
+        hello = 'fvz_messages_received_total{type="udp_hello",transport="udp"}'
+        wait_for(server.metrics_port, hello, lambda hellos: hellos is not None)
+
+        message = {"type": "input", "input": {"left": True}}
+        udp_client.send_datagram(message)
+        duplicate = protocol.encode_datagram(udp_client.udp_token, udp_client.udp_send_seq, message, udp_client.codec)
+        for _ in range(3):
+            udp_client.udp_socket.send(duplicate)
+
+        wait_for(server.metrics_port, "fvz_stale_datagrams_total", lambda stale: stale == 3)
+        content_type, body = scrape(server.metrics_port)
+    finally:
+        tcp_client.stop_network()
+        udp_client.stop_network()
+
+    assert content_type == metrics.CONTENT_TYPE
+    assert "# TYPE fvz_stale_datagrams_total counter" in body
+    assert value(body, "fvz_stale_datagrams_total") == 3
+    assert value(body, 'fvz_messages_received_total{type="input",transport="udp"}') == 1
+    assert value(body, "fvz_connections") == 2
+    assert value(body, "fvz_rooms") == 1
+
+def test_unknown_metrics_path_is_not_found(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"http://127.0.0.1:{server.metrics_port}/other", timeout=5)
+    assert error.value.code == 404
@@ -0,0 +1,39 @@
+import time
+
+from profiler import FRAME, FrameProfiler
+
+def run_frames(profiler, count, toggle_at=None):
+    """Time count frames of one "input" stage, pressing F3 inside it at frame toggle_at"""
+    for frame in range(count):
+        profiler.begin_frame()
+        started = profiler.start()
+        if frame == toggle_at:
+            profiler.toggle()
+        profiler.stop("input", started)
+        profiler.end_frame()
+
+def test_frames_are_filed_per_stage():
+    profiler = FrameProfiler(enabled=True)
+    run_frames(profiler, 5)
+    assert profiler.frames == 5
+    assert len(profiler.samples["input"]) == len(profiler.samples[FRAME]) == 5
+    assert set(profiler.summary()) == set(profiler.samples)
+
+def test_turning_on_mid_frame_files_no_bogus_sample():
+    profiler = FrameProfiler()
+    began = time.perf_counter()
+    run_frames(profiler, 4, toggle_at=1)
+    elapsed_ms = (time.perf_counter() - began) * 1000
+
+    assert profiler.enabled and profiler.show_overlay
+    assert len(profiler.samples[FRAME]) == 2  # The frames after the one F3 was pressed in
+    for stage, samples in profiler.samples.items():
+        assert all(0 <= ms <= elapsed_ms for ms in samples), stage
+    assert profiler.summary()[FRAME]["max"] <= elapsed_ms
+
+def test_turning_off_mid_frame_files_the_whole_frame():
+    profiler = FrameProfiler(enabled=True)
+    run_frames(profiler, 4, toggle_at=1)
+    assert not profiler.enabled
+    assert len(profiler.samples[FRAME]) == 2
+    assert all(ms == 0.0 for ms in profiler.current.values())
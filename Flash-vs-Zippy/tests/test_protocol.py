@@ -0,0 +1,214 @@
+import socket
+
+import pytest
+
+import protocol
+from protocol import CODEC_BINARY, CODEC_JSON, ProtocolError, decode_payload, encode_payload
+
+def keys(*held):
+    return {key: key in held for key in protocol.INPUT_KEYS}
+
+# Every field at a value its binary format holds
+STATE = {"x": 200, "y": 310, "vel_y": -12, "running": True, "jump": False, "attacking": True, "attack_type": 2,
+         "attack_cooldown": 20, "hit": False, "hit_cooldown": 0, "health": 90, "alive": True, "action": 3,
+         "frame_index": 4, "flip": True, "ranged_cooldown": 180, "last_ranged_time": 123456,
+         "ranged_attack_used": True,
+         "projectiles": [{"id": 7, "x": 300, "y": 350, "direction": -1, "active": True},
+                         {"x": -10, "y": 350, "direction": 1, "active": False}]}  # No id: an older peer
+
+MESSAGES = {
+    "input": {"type": "input", "input": keys("left", "jump")},
+    "input with history": {"type": "input", "input": keys("attack2"), "frame": 70000,
+                           "history": [keys(), keys("right", "attack1")]},
+    "opponent_input": {"type": "opponent_input", "input": keys("right"), "frame": 3, "history": [keys("right")]},
+    "state_update": {"type": "state_update", "state": STATE, "player_id": "2", "priority": "high"},
+    "state_update delta": {"type": "state_update", "state": {"x": 5, "hit": True}, "priority": "normal",
+                           "delta": True},
+    "game_state": {"type": "game_state", "player_states": {"1": STATE, "2": {"health": 0, "alive": False}},
+                   "round_over": True},
+    "game_state delta": {"type": "game_state", "player_states": {"1": {"x": -20}}, "round_over": False,
+                         "delta": True},
+}
+
+# Hot-path messages the binary layout cannot carry, so they go as JSON
+FALLBACKS = {
+    "x out of range": {"type": "state_update", "state": {"x": 40000}},
+    "health out of range": {"type": "game_state", "player_states": {"1": {"health": -40000}}, "round_over": False},
+    "cooldown out of range": {"type": "state_update", "state": {"ranged_cooldown": 300}},
+    "unknown state field": {"type": "state_update", "state": {"x": 5, "combo": 3}},
+    "unknown projectile field": {"type": "state_update",
+                                 "state": {"projectiles": [{"x": 1, "y": 2, "direction": 1, "active": True,
+                                                            "owner": 1}]}},
+    "unknown input key": {"type": "input", "input": {"left": True, "dash": True}},
+    "unknown priority": {"type": "state_update", "state": {"x": 5}, "priority": "urgent"},
+    "no binary layout": {"type": "round_over", "winner": "1"},
+}
+
+@pytest.mark.parametrize("message", MESSAGES.values(), ids=MESSAGES.keys())
+def test_binary_round_trip(message):
+    payload = encode_payload(message, CODEC_BINARY)
+    assert payload[0] == protocol.BINARY_MAGIC
+    assert decode_payload(payload) == message
+    assert decode_payload(memoryview(payload)) == message
+    assert len(payload) < len(encode_payload(message, CODEC_JSON))
+
+@pytest.mark.parametrize("message", MESSAGES.values(), ids=MESSAGES.keys())
+def test_json_round_trip(message):
+    payload = encode_payload(message, CODEC_JSON)
+    assert payload[:1] == b"{"
+    assert decode_payload(payload) == message
+
+@pytest.mark.parametrize("message", FALLBACKS.values(), ids=FALLBACKS.keys())
+def test_binary_falls_back_to_json(message):
+    payload = encode_payload(message, CODEC_BINARY)
+    assert payload[:1] == b"{"
+    assert decode_payload(payload) == message
+
+def test_codec_negotiation():
+    assert protocol.choose_codec([CODEC_JSON, CODEC_BINARY]) == CODEC_BINARY
+    assert protocol.choose_codec(["binary-v1", CODEC_JSON]) == CODEC_JSON
+    assert protocol.choose_codec(None) == CODEC_JSON
+
+def test_bad_payloads_raise_protocol_errors():
+    payload = encode_payload(MESSAGES["game_state"], CODEC_BINARY)
+    with pytest.raises(ProtocolError):
+        decode_payload(payload[:-3])
+    with pytest.raises(ProtocolError):
+        decode_payload(payload[:1] + bytes((protocol.PROTOCOL_VERSION + 1,)) + payload[2:])
+    with pytest.raises(ProtocolError):
+        decode_payload(b'{"type": "input"')
+
+def test_frame_header_announces_payload_length():
+    framed = protocol.encode_message(MESSAGES["input"], CODEC_BINARY)
+    assert protocol.parse_header(framed[:protocol.HEADER_SIZE]) == len(framed) - protocol.HEADER_SIZE
+    with pytest.raises(ProtocolError):
+        protocol.parse_header(f"{protocol.MAX_MESSAGE_SIZE + 1:<{protocol.HEADER_SIZE}}".encode())
+
+def test_delta_encoder_sequences_deltas_between_keyframes():
+    encoder = protocol.DeltaEncoder(keyframe_interval=3)
+    states = [{"x": 100 + i, "y": 310, "health": 100} for i in range(9)]
+    kinds = [encoder.encode(state)[1] for state in states]
+    assert kinds == [False, True, True, True, False, True, True, True, False]
+
+def test_delta_carries_only_changed_fields():
+    encoder = protocol.DeltaEncoder()
+    encoder.encode({"x": 100, "y": 310, "health": 100})
+    assert encoder.encode({"x": 110, "y": 310, "health": 100}) == ({"x": 110}, True)
+    assert encoder.encode({"x": 110, "y": 310, "health": 100}) == ({}, True)
+    assert encoder.encode({"x": 110, "y": 310, "health": 90, "hit": True}) == ({"health": 90, "hit": True}, True)
+
+def test_disappearing_field_forces_a_keyframe():
+    encoder = protocol.DeltaEncoder()
+    encoder.encode({"x": 100, "projectiles": []})
+    encoder.encode({"x": 105, "projectiles": []})
+    assert encoder.encode({"x": 110}) == ({"x": 110}, False)
+    assert encoder.encode({"x": 115}) == ({"x": 115}, True)
+
+def test_reset_forces_a_keyframe():
+    encoder = protocol.DeltaEncoder()
+    encoder.encode({"x": 100})
+    encoder.reset()
+    assert encoder.encode({"x": 100}) == ({"x": 100}, False)
+
+def test_receiver_rebuilds_every_snapshot():
+    encoder = protocol.DeltaEncoder(keyframe_interval=4)
+    received = None
+    snapshots = [{"x": i, "health": 100 - i // 3, **({"hit": True} if i % 5 else {})} for i in range(20)]
+    for snapshot in snapshots:
+        payload, is_delta = encoder.encode(snapshot)
+        received = protocol.apply_delta(received, payload) if is_delta else dict(payload)
+        assert received == snapshot
+
+def test_nested_encoder_rebuilds_player_states():
+    encoder = protocol.DeltaEncoder(nested=True)
+    sequence = [
+        ({"1": {"x": 1, "health": 100}, "2": {"x": 9, "health": 100}}, False),
+        ({"1": {"x": 2, "health": 100}, "2": {"x": 9, "health": 100}}, True),
+        ({"1": {"x": 2, "health": 100}, "2": {"x": 9, "health": 80}}, True),
+        ({"1": {"x": 2}, "2": {"x": 9, "health": 80}}, False),  # Player 1's health disappeared
+        ({"1": {"x": 2}}, False),  # Player 2 left
+        ({"1": {"x": 3}}, True),
+    ]
+    received = None
+    for snapshot, expect_delta in sequence:
+        payload, is_delta = encoder.encode(snapshot)
+        assert is_delta == expect_delta
+        received = protocol.apply_player_states_delta(received, payload) if is_delta else payload
+        assert received == snapshot
+    assert encoder.encode({"1": {"x": 3}}) == ({}, True)
+
+def test_encoder_keeps_its_own_baseline():
+    encoder = protocol.DeltaEncoder()
+    state = {"x": 100}
+    encoder.encode(state)
+    state["x"] = 200  # The caller reuses its dict
+    assert encoder.encode(state) == ({"x": 200}, True)
+
+def feed(reader, data):
+    """Write data into the reader the way asyncio.BufferedProtocol does"""
+    view = reader.get_buffer(len(data))
+    view[:len(data)] = data
+    reader.buffer_updated(len(data))
+
+def read_frames(reader):
+    return [bytes(payload) for payload in reader.frames()]
+
+PAYLOADS = [encode_payload(message, codec) for message in MESSAGES.values() for codec in (CODEC_BINARY, CODEC_JSON)]
+STREAM = b"".join(protocol.frame(payload) for payload in PAYLOADS)
+
+def test_several_frames_per_read():
+    reader = protocol.FrameReader()
+    feed(reader, STREAM)
+    assert read_frames(reader) == PAYLOADS
+    assert read_frames(reader) == []
+
+def test_split_header_and_payload():
+    reader = protocol.FrameReader()
+    framed = protocol.frame(PAYLOADS[0])
+    feed(reader, framed[:4])
+    assert read_frames(reader) == []
+    feed(reader, framed[4:protocol.HEADER_SIZE + 2])
+    assert read_frames(reader) == []
+    feed(reader, framed[protocol.HEADER_SIZE + 2:])
+    assert read_frames(reader) == [PAYLOADS[0]]
+
+@pytest.mark.parametrize("chunk_size", [1, 7, protocol.HEADER_SIZE, 100])
+def test_any_split_yields_the_same_frames(chunk_size):
+    reader = protocol.FrameReader(size=256)  # Small, so the tail is moved to the front and the buffer grows
+    frames = []
+    for start in range(0, len(STREAM) * 8, chunk_size):
+        feed(reader, (STREAM * 8)[start:start + chunk_size])
+        frames += read_frames(reader)
+    assert frames == PAYLOADS * 8
+
+def test_buffer_grows_to_the_largest_frame():
+    reader = protocol.FrameReader()
+    payload = bytes(range(256)) * (protocol.MAX_MESSAGE_SIZE // 256)
+    framed = protocol.frame(payload) + protocol.frame(PAYLOADS[0])
+    frames = []
+    chunk_size = protocol.RECV_BUFFER_SIZE // 2
+    for start in range(0, len(framed), chunk_size):
+        feed(reader, framed[start:start + chunk_size])
+        frames += read_frames(reader)
+        if not frames:
+            # Once the header is in, one read can hold the rest of the frame
+            pending = min(start + chunk_size, len(framed))
+            assert len(reader.get_buffer()) >= protocol.HEADER_SIZE + len(payload) - pending
+    assert frames == [payload, PAYLOADS[0]]
+
+def test_oversized_frame_is_a_protocol_error():
+    reader = protocol.FrameReader()
+    feed(reader, f"{protocol.MAX_MESSAGE_SIZE + 1:<{protocol.HEADER_SIZE}}".encode())
+    with pytest.raises(ProtocolError):
+        read_frames(reader)
+
+def test_recv_into_reads_from_a_socket():
+    sender, receiver = socket.socketpair()
+    with sender, receiver:
+        sender.sendall(STREAM)
+        sender.shutdown(socket.SHUT_WR)
+        reader = protocol.FrameReader()
+        frames = []
+        while reader.recv_into(receiver):
+            frames += [decode_payload(payload) for payload in reader.frames()]
+    assert frames == [decode_payload(payload) for payload in PAYLOADS]
@@ -0,0 +1,132 @@
+import random
+
+import characters
+import main_socket
+import simulation
+from rollback import MAX_ROLLBACK_FRAMES, RollbackSession
+from simulation import MatchState
+
+def new_session(local_player):
+    return RollbackSession(MatchState(characters.for_player(1).animation_steps,
+                                      characters.for_player(2).animation_steps), local_player)
+
+def scripted_inputs(rng, frames, hold):
+    """Inputs that change every few frames, as a player's do"""
+    inputs = []
+    current = simulation.NO_INPUT
+    for frame in range(frames):
+        if frame % hold == 0:
+            current = {key: rng.random() < 0.3 for key in ("left", "right", "jump", "attack1", "attack2")}
+        inputs.append(current)
+    return inputs
+
+def signature(state):
+    return (state.frame, state.round_over, state.round_over_frame,
+            state.fighter_1.snapshot(), state.fighter_2.snapshot())
+
+def test_sessions_converge_on_the_lockstep_simulation():
+    rng = random.Random(7)
+    frames = 600
+    inputs = {1: scripted_inputs(rng, frames, 7), 2: scripted_inputs(rng, frames, 5)}
+    reference = new_session(1).state
+    for frame in range(frames):
+        reference = simulation.step(reference, inputs[1][frame], inputs[2][frame])
+
+    sessions = {1: new_session(1), 2: new_session(2)}
+    in_flight = []  # (arrival tick, receiving player, frame, input, history)
+    tick = 0
+    while any(session.frame < frames for session in sessions.values()) or in_flight:
+        # Deliver what has arrived, in arrival order: later frames often come first
+        arrived = sorted((message for message in in_flight if message[0] <= tick), key=lambda m: m[0])
+        in_flight = [message for message in in_flight if message[0] > tick]
+        for _, player, frame, frame_input, history in arrived:
+            sessions[player].add_remote_input(frame, frame_input, history)
+        for player, session in sessions.items():
+            session.resolve()
+            if session.frame < frames and session.can_advance():
+                frame = session.frame
+                session.advance(inputs[player][frame])
+                history = inputs[player][max(0, frame - MAX_ROLLBACK_FRAMES):frame][::-1]
+                in_flight.append((tick + rng.randint(1, 6), 3 - player, frame, inputs[player][frame], history))
+        tick += 1
+        assert tick < 10 * frames, "sessions stalled"
+
+    for session in sessions.values():
+        assert session.rollbacks > 0
+        assert signature(session.state) == signature(reference)
+
+def test_can_advance_stops_max_rollback_frames_ahead():
+    session = new_session(1)
+    for _ in range(MAX_ROLLBACK_FRAMES):
+        assert session.can_advance()
+        session.advance(simulation.NO_INPUT)
+    assert not session.can_advance()
+    assert session.frame - session.confirmed_frame == MAX_ROLLBACK_FRAMES + 1
+
+    session.add_remote_input(0, simulation.NO_INPUT)
+    session.resolve()
+    assert session.can_advance()
+    session.advance(simulation.NO_INPUT)
+    assert not session.can_advance()
+
+    small = RollbackSession(new_session(1).state, 1, max_rollback=2)
+    small.advance(simulation.NO_INPUT)
+    small.advance(simulation.NO_INPUT)
+    assert not small.can_advance()
+
+def stalled_client(player_id):
+    """A UDP client that simulated as far as it may without hearing from the opponent"""
+    client = main_socket.GameClient()
+    client.player_id = player_id
+    client.session = new_session(int(player_id))
+    client.udp_socket = True  # Only checked for being set; sends are captured below
+    client.sent = []
+    client.send_message = lambda message_type, data: client.sent.append(dict(data, type=message_type))
+    simulate_until_stalled(client)
+    return client
+
+def simulate_until_stalled(client):
+    while client.session.can_advance():
+        frame_input = {"left": client.session.frame % 3 == 0}
+        client.session.advance(frame_input)
+        client.rollback_history.appendleft(frame_input)
+
+def test_stalled_client_resends_once_per_tick():
+    client = stalled_client("1")
+    client.advance_rollback()
+    client.advance_rollback()
+    assert len(client.sent) == 1
+    client.rollback_resend_time -= main_socket.ROLLBACK_RESEND_INTERVAL
+    client.advance_rollback()
+    assert len(client.sent) == 2
+
+def test_resend_unstalls_an_opponent_that_lost_every_input():
+    client_1, client_2 = stalled_client("1"), stalled_client("2")
+    client_1.advance_rollback()
+    client_2.advance_rollback()
+    for client, peer in ((client_1, client_2), (client_2, client_1)):
+        resend = client.sent[-1]
+        assert resend["frame"] == client.session.frame - 1 == MAX_ROLLBACK_FRAMES - 1
+        peer.session.add_remote_input(resend["frame"], resend["input"], resend["history"])
+        assert peer.session.confirmed_frame == resend["frame"]
+        assert peer.session.can_advance()
+
+def test_resend_covers_the_widest_gap():
+    client_1, client_2 = stalled_client("1"), stalled_client("2")
+    # Client 2's inputs all reached client 1, but none of client 1's reached client 2
+    for frame, frame_input in enumerate(reversed(client_2.rollback_history)):
+        client_1.session.add_remote_input(frame, frame_input)
+    client_1.session.resolve()
+    simulate_until_stalled(client_1)
+
+    client_1.advance_rollback()
+    resend = client_1.sent[-1]
+    assert resend["frame"] == 2 * MAX_ROLLBACK_FRAMES - 1
+    client_2.session.add_remote_input(resend["frame"], resend["input"], resend["history"])
+    assert client_2.session.confirmed_frame == resend["frame"]
+
+def test_resend_is_tcp_free():
+    client = stalled_client("1")
+    client.udp_socket = None
+    client.advance_rollback()
+    assert client.sent == []
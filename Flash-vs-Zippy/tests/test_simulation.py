@@ -0,0 +1,39 @@
+from simulation import FighterState, HIT_COOLDOWN
+
+ANIMATION_STEPS = [6, 6, 3, 6, 3, 4, 6]
+
+def make_fighters():
+    attacker = FighterState(1, 200, 310, True, ANIMATION_STEPS)
+    target = FighterState(2, 300, 310, False, ANIMATION_STEPS)
+    return attacker, target
+
+def test_melee_attack_lands_once():
+    attacker, target = make_fighters()
+    attacker.attack_type = 1
+    assert attacker.attack(target)
+    assert target.health == 90
+    target.hit_cooldown = 0
+    assert not attacker.attack(target)
+    assert target.health == 90
+
+def test_attack_cancelled_by_a_hit_can_land_again():
+    attacker, target = make_fighters()
+    attacker.attack_type = 1
+    assert attacker.attack(target)
+    assert attacker.attack_has_hit
+
+    # Hit back before the attack animation ends; the hit animation cancels the attack
+    attacker.hit = True
+    attacker.hit_cooldown = HIT_COOLDOWN
+    for _ in range(100):
+        if not attacker.hit:
+            break
+        attacker.update()
+    assert not attacker.hit
+    assert not attacker.attacking
+    assert not attacker.attack_has_hit
+
+    attacker.attack_cooldown = 0
+    target.hit_cooldown = 0
+    assert attacker.attack(target)
+    assert target.health == 80